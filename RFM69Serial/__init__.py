@@ -1,2 +1,8 @@
 from .packet import RFM69Packet
 from .device import Rfm69SerialDevice
+from .receiver import PacketReceiver, PacketRing
+from .aio import AsyncRfm69SerialDevice
+from .fragment import FragmentSender, Reassembler
+from .reliable import ReliableSender, ReliableReceiver
+from .manager import BridgeManager
+from .scheduler import TxScheduler
@@ -0,0 +1,319 @@
+# RFM69 Serial asyncio client
+
+import asyncio
+import os
+from collections import deque
+
+import serial
+
+from RFM69Serial.device import Rfm69Commands
+from RFM69Serial.metrics import CommandMetrics
+from RFM69Serial.protocol import CAP_POLL_PACKET
+
+_READ_SIZE = 4096
+
+
+def _frame_length(reply, buf):
+    """Length of the complete reply frame at the start of @buf, None if more bytes are needed."""
+
+    length = 0
+    while True:
+        missing = reply.need(buf[:length])
+        if not missing:
+            return length
+        length += missing
+        if length > len(buf):
+            return None
+
+
+class AsyncRfm69SerialDevice(Rfm69Commands):
+    """asyncio counterpart of Rfm69SerialDevice.
+    The public command methods are the same as Rfm69SerialDevice's, but each returns an awaitable resolving to
+    the value the blocking method would have returned. The serial port is driven by the event loop (add_reader/
+    add_writer on the port's file descriptor, POSIX only), so no threads are involved. Commands issued by
+    concurrent tasks are written straight away, up to @depth awaiting a reply, and replies are matched in order.
+    A command whose reply times out fails together with those sent after it; further commands are held back until
+    their late replies are in, or another time-out has passed. A serial error (e.g. the bridge is unplugged) fails
+    every pending command and closes the device.
+
+    Example::
+
+        async with AsyncRfm69SerialDevice(2, 101, port="/dev/ttyACM0") as dev:
+            await dev.send_msg(1, b'hello')
+            async for packet in dev.packets():
+                print(packet.sender, packet.payload)
+
+    :param address: device address of the RFM69 module.
+    :param network: network ID of the RFM69 module.
+    :param cs_pin: chip select pin of the bridge board.
+    :param int_pin: interrupt pin of the bridge board.
+    :param port: serial port of the bridge.
+    :param time_out: time (in seconds) to wait for a reply before the command fails.
+    :param depth: maximum number of commands awaiting a reply.
+    :param framed: send framed commands if the firmware supports them.
+    :param metrics: count and time every command per opcode in self.metrics (see RFM69Serial.metrics).
+    """
+
+    def __init__(self, address=1, network=101, cs_pin=0, int_pin=1, port="/dev/ttyACM0", time_out=1, depth=8,
+                 framed=True, metrics=True):
+        self._setup(address, network, cs_pin, int_pin)
+        self.port = port
+        self.framed = framed
+        self.timeout = time_out
+        self.depth = depth
+        self.metrics = CommandMetrics() if metrics else None
+
+        self._serial = None
+        self._fd = None
+        self._loop = None
+        self._rx = bytearray()          # received bytes not yet matched to a reply
+        self._tx = bytearray()          # written bytes not yet accepted by the OS
+        self._in_flight = deque()       # (reply, future, opcode, length, time written) awaiting a reply, oldest first
+        self._abandoned = deque()       # timed out replies which may still arrive, oldest first
+        self._backlog = deque()         # (command, reply, future) waiting for a free slot
+        self._timer = None
+        self.error = None               # serial error which closed the port, if any
+
+    @property
+    def is_open(self):
+        return self._serial is not None
+
+    async def open(self):
+        """Open the serial port and initialize the RFM69 module.
+
+        :return: the device itself.
+        """
+
+        self._loop = asyncio.get_event_loop()
+        self.error = None
+        self._serial = serial.Serial(self.port)
+        try:
+            self._fd = self._serial.fileno()
+            os.set_blocking(self._fd, False)
+            self._serial.reset_input_buffer()
+            self._loop.add_reader(self._fd, self._read_ready)
+
+            # initialize RFM69 module
+            t_start = self._loop.time()
+            while self._loop.time() - t_start < 10:
+                await asyncio.sleep(0.1)    # Hardware deceleration factor
+                if await self._init_rf_module():
+                    break
+            else:
+                raise TimeoutError("Could not connect to RFM69 device!")
+            self._negotiate(await self.get_capabilities(), self.framed)
+        except BaseException:
+            # the port is open: do not leak it, nor its reader in the event loop
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        """Close the serial port, commands still awaiting a reply are cancelled."""
+
+        if self._serial is None:
+            return
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future, *_ in self._in_flight:
+            future.cancel()
+        for _, _, future in self._backlog:
+            future.cancel()
+        self._in_flight.clear()
+        self._abandoned.clear()
+        self._backlog.clear()
+        self._rx.clear()
+        self._tx.clear()
+        self._serial.close()
+        self._serial = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def packets(self, poll_interval=0.002):
+        """Asynchronous stream of received packets.
+        Polls with poll_packet() if the firmware supports it. Otherwise, polls receive_done() and fetches each
+        packet with get_rx_data() before re-arming RX; both commands are issued back to back so that no other
+        task's command can drop the packet in between.
+
+        :param poll_interval: idle time (in seconds) between two polls.
+        :return: asynchronous iterator of RFM69Packet objects, ends when the device is closed. Raises the serial
+            error if the port failed.
+        """
+
+        if self.capabilities & CAP_POLL_PACKET:
+            while self.is_open:
+                packet = await self.poll_packet()
+                if packet is not None:
+                    yield packet
+                else:
+                    await asyncio.sleep(poll_interval)
+            if self.error is not None:
+                raise self.error
+            return
+
+        await self.begin_receive()
+        while self.is_open:
+            done = self.receive_done()
+            fetch = self.get_rx_data()
+            if await done:
+                packet = await fetch
+                await self.begin_receive()
+                if packet is not None:
+                    yield packet
+            else:
+                await fetch
+                await asyncio.sleep(poll_interval)
+        if self.error is not None:
+            raise self.error
+
+    # ***** Event loop driven transport *****
+
+    def _transact(self, command, reply):
+        if self._serial is None:
+            raise serial.SerialException("Attempting to use a port that is not open")
+
+        command = self._encode(command)
+        future = self._loop.create_future()
+        if len(self._in_flight) < self.depth and not (self._backlog or self._abandoned):
+            self._send(command, reply, future)
+        else:
+            # the frame may live in a reusable buffer, keep a copy
+            self._backlog.append((bytes(command), reply, future))
+        return future
+
+    def _completed(self, value):
+        future = self._loop.create_future()
+        future.set_result(value)
+        return future
+
+    def _send(self, command, reply, future):
+        self._in_flight.append((reply, future, command[1], len(command), self._loop.time()))
+        if len(self._in_flight) == 1:
+            self._arm_timer()
+
+        if self._tx:
+            self._tx += command
+            return
+        try:
+            written = os.write(self._fd, command)
+        except BlockingIOError:
+            written = 0
+        if written < len(command):
+            self._tx += command[written:]
+            self._loop.add_writer(self._fd, self._write_ready)
+
+    def _write_ready(self):
+        try:
+            written = os.write(self._fd, self._tx)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            self._fail(serial.SerialException("write failed: %s" % err))
+            return
+        del self._tx[:written]
+        if not self._tx:
+            self._loop.remove_writer(self._fd)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            self._fail(serial.SerialException("read failed: %s" % err))
+            return
+        if not data:
+            # readable but no data: the device is gone (unplugged)
+            self._fail(serial.SerialException("device disconnected"))
+            return
+        self._rx += data
+        self._process()
+
+    def _fail(self, error):
+        # the port is unusable: fail every command and close it, so that the reader does not fire again
+        self.error = error
+        for _, future, *_ in self._in_flight:
+            if not future.done():
+                future.set_exception(error)
+        for _, _, future in self._backlog:
+            if not future.done():
+                future.set_exception(error)
+        self.close()
+
+    def _process(self):
+        while self._abandoned:
+            # the late bytes of a timed out reply are dropped, so that they are not taken for the next one
+            length = _frame_length(self._abandoned[0], self._rx)
+            if length is None:
+                break
+            del self._rx[:length]
+            self._abandoned.popleft()
+            if not self._abandoned:
+                self._arm_timer()
+
+        while self._in_flight and not self._abandoned:
+            reply, future = self._in_flight[0][:2]
+            length = _frame_length(reply, self._rx)
+            if length is None:
+                break
+            frame = bytes(self._rx[:length])
+            del self._rx[:length]
+            self._record(self._in_flight.popleft(), frame)
+            self._resolve(future, reply.decode(frame))
+            self._arm_timer()
+
+        if not (self._in_flight or self._abandoned):
+            # unsolicited bytes, dropped as the blocking device's reset_input_buffer() would
+            self._rx.clear()
+        self._send_backlog()
+
+    def _send_backlog(self):
+        if self._abandoned:
+            return
+        while self._backlog and len(self._in_flight) < self.depth:
+            self._send(*self._backlog.popleft())
+
+    def _arm_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._in_flight:
+            self._timer = self._loop.call_later(self.timeout, self._on_timeout)
+
+    def _on_timeout(self):
+        # the head reply is late, lost or truncated, so later replies cannot be trusted either: fail them all, but
+        # hold the backlog back until their late bytes are in or another time-out has passed, so that these are
+        # not taken for the replies to the next commands
+        partial = bytes(self._rx)
+        while self._in_flight:
+            entry = self._in_flight.popleft()
+            reply, future = entry[:2]
+            self._record(entry, partial)
+            self._resolve(future, reply.decode(partial))
+            self._abandoned.append(reply)
+            partial = b''
+        self._timer = self._loop.call_later(self.timeout, self._on_lost)
+
+    def _on_lost(self):
+        # nothing more arrived: the timed out replies are lost
+        self._timer = None
+        self._abandoned.clear()
+        self._rx.clear()
+        self._send_backlog()
+
+    def _record(self, entry, recv):
+        if self.metrics is not None:
+            reply, _, opcode, length, written = entry
+            self.metrics.record(opcode, length, recv, reply, self._loop.time() - written)
+
+    @staticmethod
+    def _resolve(future, value):
+        if not future.done():
+            future.set_result(value)
@@ -0,0 +1,207 @@
+# RFM69 Serial benchmarks
+
+"""Repeatable benchmarks of the Rfm69SerialDevice hot paths.
+
+Runs against local emulated bridges by default, or against real hardware with --port (and --peer-port, a second
+bridge on the same network, to put packets of every size in the first bridge's receive buffer). Every benchmark
+reports latency percentiles; --output saves machine-readable results and --compare prints the change against an
+earlier result file, e.g. of the previous release.
+
+The serial baud rate is set by the bridge firmware (Serial.begin() in the sketch; native USB boards and the
+emulator ignore it). To compare baud rates, rebuild the sketch at each rate and run the benchmarks once per build
+with --baud set to the rate of the build, which opens both ports at that rate and records it in the results.
+
+Usage::
+
+    python -m RFM69Serial.bench
+    python -m RFM69Serial.bench --legacy --byte-delay 0.002
+    python -m RFM69Serial.bench --port /dev/ttyACM0 --peer-port /dev/ttyACM1 --baud 115200 --output 115200.json
+    python -m RFM69Serial.bench --output v0.1.3.json --compare v0.1.2.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from contextlib import ExitStack
+
+from RFM69Serial.device import Rfm69SerialDevice, MAX_MSG_LEN, _RX_DATA_REPLY
+from RFM69Serial.opcodes import SEND
+from RFM69Serial.protocol import CAP_BURST_REGISTERS
+
+PAYLOAD_SIZES = (1, 8, 16, 32, MAX_MSG_LEN)
+PERCENTILES = (50, 90, 99)
+HOST_BATCH = 100        # calls per sample of host-only benchmarks, too fast to time one by one
+
+DEVICE_ADDRESS = 1
+PEER_ADDRESS = 2
+NETWORK_ID = 101
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile @p (0-100) of sorted @samples."""
+    return samples[min(len(samples) - 1, max(0, -(-p * len(samples) // 100) - 1))]
+
+
+def measure(call, iterations, warmup=10, batch=1):
+    """Time @call.
+
+    :param call: callable without arguments.
+    :param iterations: number of samples.
+    :param warmup: calls made before sampling.
+    :param batch: calls per sample, the sample being their average.
+    :return: dict of statistics, times in seconds.
+    """
+
+    for _ in range(warmup):
+        call()
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        start = clock()
+        for _ in range(batch):
+            call()
+        samples.append((clock() - start) / batch)
+    samples.sort()
+    stats = {'n': len(samples), 'mean': sum(samples) / len(samples), 'min': samples[0], 'max': samples[-1]}
+    for p in PERCENTILES:
+        stats['p%d' % p] = percentile(samples, p)
+    return stats
+
+
+def _payload(size):
+    return bytes(range(size))
+
+
+def _prime_rx(device, peer, size):
+    # have the peer send a @size-byte packet and leave it in the device's receive buffer
+    device.begin_receive()
+    peer.send_msg(DEVICE_ADDRESS, _payload(size))
+    deadline = time.perf_counter() + 1
+    while not device.receive_done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("no packet from the peer bridge, check --peer-port")
+
+
+def benchmarks(device, peer):
+    """Yield (name, parameter, setup, call, batch) for every benchmark applicable to @device; setup is a callable
+    run once before timing @call, or None."""
+
+    yield 'set_transfer', None, None, device.begin_receive, 1
+    for size in PAYLOAD_SIZES:
+        payload = _payload(size)
+        yield 'send_msg', size, None, lambda payload=payload: device.send_msg(PEER_ADDRESS, payload), 1
+        yield 'msg_frame', size, None, \
+            lambda payload=payload: device._msg_frame(SEND, payload, PEER_ADDRESS, 0), HOST_BATCH
+        reply = b'y' + bytes((PEER_ADDRESS, size)) + payload
+        yield 'packet_decode', size, None, lambda reply=reply: _RX_DATA_REPLY.decode(reply).payload, HOST_BATCH
+    if peer is not None:
+        for size in PAYLOAD_SIZES:
+            yield 'get_rx_data', size, lambda size=size: _prime_rx(device, peer, size), device.get_rx_data, 1
+    yield 'read_register', None, None, lambda: device.read_register(b'\x30', cached=False), 1
+    yield 'read_register_cached', None, None, lambda: device.read_register(b'\x30'), HOST_BATCH
+    yield 'read_register_loop', 0x4F, None, \
+        lambda: [device.read_register(bytes((addr,)), cached=False) for addr in range(1, 0x50)], 1
+    if device.capabilities & CAP_BURST_REGISTERS:
+        yield 'read_registers_burst', 0x4F, None, lambda: device.read_registers(1, 0x4F), 1
+
+
+def run(device, peer, iterations):
+    """Run every benchmark.
+
+    :return: list of result dicts.
+    """
+
+    results = []
+    for name, param, setup, call, batch in benchmarks(device, peer):
+        if setup is not None:
+            setup()
+        result = {'name': name, 'param': param}
+        result.update(measure(call, iterations, batch=batch))
+        results.append(result)
+    return results
+
+
+def _key(result):
+    return result['name'], result['param']
+
+
+def report(results, baseline=None, out=None):
+    """Print a result table to @out (default: stdout), with the p50 change against @baseline results if given."""
+
+    out = out if out is not None else sys.stdout
+    previous = {_key(result): result for result in baseline or ()}
+    header = "%-22s %6s %10s %10s %10s %10s" % ('benchmark', 'param', 'p50 (us)', 'p90 (us)', 'p99 (us)',
+                                              'max (us)')
+    print(header + ("  p50 change" if baseline else ""), file=out)
+    for result in results:
+        line = "%-22s %6s %10.1f %10.1f %10.1f %10.1f" % (
+            result['name'], '' if result['param'] is None else result['param'], result['p50'] * 1e6,
+            result['p90'] * 1e6, result['p99'] * 1e6, result['max'] * 1e6)
+        old = previous.get(_key(result))
+        if old is not None and old['p50']:
+            line += "  %+9.1f%%" % ((result['p50'] / old['p50'] - 1) * 100)
+        print(line, file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m RFM69Serial.bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument('--port', help="serial port of the bridge under test (default: emulated bridge)")
+    parser.add_argument('--peer-port', help="serial port of a second bridge, for the get_rx_data benchmarks")
+    parser.add_argument('--baud', type=int, default=9600,
+                        help="baud rate the bridge firmware was built with (UART boards, default: 9600), recorded in "
+                             "the results")
+    parser.add_argument('--iterations', type=int, default=200, help="samples per benchmark")
+    parser.add_argument('--legacy', action='store_true', help="send legacy '$' commands, not framed ones")
+    parser.add_argument('--byte-delay', type=float, default=0.0,
+                        help="per-byte receive delay of the emulated firmware (seconds)")
+    parser.add_argument('--no-metrics', action='store_true', help="turn the device's command metrics off")
+    parser.add_argument('--output', help="save the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results file to compare against")
+    args = parser.parse_args(argv)
+
+    with ExitStack() as stack:
+        port, peer_port = args.port, args.peer_port
+        if port is None:
+            from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+            channel = RadioChannel()
+            port = stack.enter_context(Rfm69SerialEmulator(channel, byte_delay=args.byte_delay)).port
+            peer_port = stack.enter_context(Rfm69SerialEmulator(channel)).port
+
+        device = Rfm69SerialDevice(DEVICE_ADDRESS, NETWORK_ID, port=port, framed=not args.legacy,
+                                   metrics=not args.no_metrics, baudrate=args.baud)
+        stack.callback(device.close)
+        peer = None
+        if peer_port is not None:
+            peer = Rfm69SerialDevice(PEER_ADDRESS, NETWORK_ID, port=peer_port, baudrate=args.baud)
+            stack.callback(peer.close)
+
+        results = run(device, peer, args.iterations)
+        meta = {'library_version': _version(), 'python': platform.python_version(), 'platform': platform.platform(),
+                'port': args.port or 'emulator', 'baud': args.baud, 'framed': device._framed,
+                'capabilities': device.capabilities,
+                'byte_delay': args.byte_delay, 'iterations': args.iterations,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'meta': meta, 'results': results}, file, indent=1)
+    return 0
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version('rfm69-serial')
+    except Exception:
+        return None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
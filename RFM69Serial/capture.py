@@ -0,0 +1,481 @@
+# RFM69 Serial traffic capture
+
+"""Binary log of the serial traffic between the host and a bridge.
+
+Rfm69SerialDevice(capture=path) appends every command frame and every reply to a capture file. Each record is a
+fixed 12-byte header followed by the raw bytes:
+
+    timestamp (float64, time.monotonic() seconds), direction (uint8), opcode (uint8), length (uint16), bytes
+
+all little endian, after a 16-byte file header (magic, format version). Every time a writer opens the file it
+appends a CAPTURE_SESSION record holding the wall-clock time (float64) and the port name, which maps the monotonic
+timestamps of the following records to wall-clock time. Records are buffered and written out with the first reply
+which comes flush_interval seconds after the previous write, so a crash loses at most the records of the last
+flush_interval seconds of traffic; a truncated final record is ignored by the reader.
+
+Captures of received packets (see RFM69Serial.sniffer) hold CAPTURE_PACKET records instead, one per packet, in
+the layout of a pushed packet frame; RotatingCaptureWriter writes them in batches to a series of files.
+
+CaptureReader memory-maps a capture and filters its records by time and opcode without loading it, and replay()
+feeds the commands of a capture to a bridge (by default a local emulated one) with their original timing, or
+faster, comparing the replies with the captured ones.
+
+Usage::
+
+    python -m RFM69Serial.capture field.cap --opcode 0x03 0x04 --start 1760000000
+    python -m RFM69Serial.capture field.cap --replay --speed 10
+"""
+
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from collections import deque, namedtuple
+
+import serial
+
+from RFM69Serial.protocol import PUSH_CODE, PACKET_ACK_REQUESTED, PACKET_ACK_RECEIVED
+from RFM69Serial.stream import _frame_to_packet
+
+CAPTURE_MAGIC = b'RFM69CAP'
+CAPTURE_VERSION = 1
+
+# Record directions
+CAPTURE_COMMAND = 0     # host to bridge
+CAPTURE_REPLY = 1       # bridge to host
+CAPTURE_SESSION = 2     # a writer opened the file
+CAPTURE_PACKET = 3      # packet received over the air
+
+SESSION_OPCODE = 0xFF   # opcode field of session records
+PACKET_OPCODE = PUSH_CODE[0]    # opcode field of packet records
+
+_FILE_HEADER = struct.Struct('<8sH6x')
+_RECORD_HEADER = struct.Struct('<dBBH')
+_SESSION = struct.Struct('<d')
+
+# A capture record; time is the wall-clock time (seconds since the epoch), timestamp the raw monotonic one
+CaptureRecord = namedtuple('CaptureRecord', 'time timestamp direction opcode data')
+
+# Outcome of one replayed command: captured reply versus the reply of the bridge the capture was replayed to
+ReplayResult = namedtuple('ReplayResult', 'time opcode command expected actual')
+
+
+class CaptureWriter:
+    """Append records to a capture file, creating it if needed.
+
+    :param path: capture file path.
+    :param port: name of the serial port, stored in the session record.
+    :param buffering: size of the write buffer in bytes.
+    :param flush_interval: time (in seconds) after which the buffer is written to the file with the next reply
+        record, 0 to write every transaction as soon as its reply is recorded.
+    """
+
+    def __init__(self, path, port=None, buffering=1 << 16, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._flushed = time.monotonic()
+        self._file = open(path, 'ab', buffering=buffering)
+        try:
+            if self._file.tell() == 0:
+                self._file.write(_FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+            else:
+                with open(path, 'rb') as file:
+                    _check_header(file.read(_FILE_HEADER.size))
+        except Exception:
+            self._file.close()
+            raise
+        self.record(CAPTURE_SESSION, SESSION_OPCODE, _session_data(port))
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def record(self, direction, opcode, data, timestamp=None):
+        """Append one record.
+
+        :param direction: CAPTURE_COMMAND, CAPTURE_REPLY or CAPTURE_SESSION.
+        :param opcode: opcode of the command (the command answered, for replies).
+        :param data: raw bytes (bytes-like object, at most 65535 bytes).
+        :param timestamp: time.monotonic() time of the record, now if None.
+        """
+
+        now = time.monotonic()
+        write = self._file.write
+        write(_RECORD_HEADER.pack(now if timestamp is None else timestamp, direction, opcode, len(data)))
+        write(data)
+        if direction == CAPTURE_REPLY and now - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def command(self, opcode, data):
+        """Append a command frame written to the bridge."""
+        self.record(CAPTURE_COMMAND, opcode, data)
+
+    def reply(self, opcode, data):
+        """Append a reply read from the bridge, @opcode being the opcode of the command it answers (None if
+        unknown)."""
+        self.record(CAPTURE_REPLY, SESSION_OPCODE if opcode is None else opcode, data)
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        self._file.flush()
+        self._flushed = time.monotonic()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _session_data(port):
+    return _SESSION.pack(time.time()) + (port or '').encode()
+
+
+def packet_frame(packet):
+    """Data of the CAPTURE_PACKET record of an RFM69Packet: '!', sender, target, flags, -RSSI, payload length,
+    payload."""
+
+    flags = (PACKET_ACK_REQUESTED if packet.ack_requested else 0) | \
+        (PACKET_ACK_RECEIVED if packet.ack_received else 0)
+    payload = packet.payload
+    return bytes((PACKET_OPCODE, packet.sender, packet.target or 0, flags, -(packet.rssi or 0) & 0xFF,
+                  len(payload))) + payload
+
+
+def record_packet(record):
+    """RFM69Packet held by a CAPTURE_PACKET record."""
+    return _frame_to_packet(record.data)
+
+
+class RotatingCaptureWriter:
+    """Write records to a series of capture files, starting a new file once the current one reaches @max_bytes
+    or gets older than @max_age. Records are collected in memory and written in batches, once @batch_size records
+    are pending or the oldest one is @flush_interval seconds old. On a quiet network, call flush(force=False)
+    now and then (a sniffer pipeline does on its idle ticks). File names are <prefix>-<local time>.cap.
+
+    :param directory: directory of the capture files, created if needed.
+    :param prefix: file name prefix.
+    :param max_bytes: size (in bytes) at which a file is closed, None for no limit.
+    :param max_age: time (in seconds) after which a file is closed, None for no limit.
+    :param keep: number of capture files to keep, the oldest ones are deleted; None keeps every file. Files of
+        earlier runs with the same @directory and @prefix count as well.
+    :param batch_size: number of records written together.
+    :param flush_interval: longest time (in seconds) a record is kept in memory, see flush().
+    :param port: name of the serial port, stored in the session record of each file.
+    """
+
+    def __init__(self, directory, prefix="rfm69", max_bytes=64 << 20, max_age=3600.0, keep=None, batch_size=256,
+                 flush_interval=1.0, port=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.port = port
+
+        os.makedirs(directory, exist_ok=True)
+        self.files = self._existing()   # paths of the capture files, earlier runs' included, oldest first
+        self.records = 0        # records written
+        self._file = None
+        self._opened = 0.0
+        self._size = 0
+        self._batch = bytearray()
+        self._pending = 0
+        self._oldest = 0.0      # time of the oldest pending record
+
+    @property
+    def path(self):
+        """Path of the current capture file, None before the first write."""
+        return self.files[-1] if self._file is not None else None
+
+    def record(self, direction, opcode, data, timestamp=None):
+        """Queue one record, see CaptureWriter.record()."""
+
+        now = time.monotonic()
+        if not self._pending:
+            self._oldest = now
+        batch = self._batch
+        batch += _RECORD_HEADER.pack(now if timestamp is None else timestamp, direction, opcode, len(data))
+        batch += data
+        self._pending += 1
+        if self._pending >= self.batch_size or now - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def packet(self, packet, timestamp=None):
+        """Queue a CAPTURE_PACKET record of an RFM69Packet."""
+        self.record(CAPTURE_PACKET, PACKET_OPCODE, packet_frame(packet), timestamp)
+
+    def flush(self, force=True):
+        """Write the pending records in one write, rotating the file first if it is due.
+
+        :param force: if False, only write if the oldest pending record waited for flush_interval seconds.
+        """
+
+        now = time.monotonic()
+        if not self._pending or (not force and now - self._oldest < self.flush_interval):
+            return
+        if self._file is None or (self.max_bytes is not None and self._size >= self.max_bytes) or \
+                (self.max_age is not None and now - self._opened >= self.max_age):
+            self._rotate(now)
+        self._file.write(self._batch)
+        self._file.flush()
+        self._size += len(self._batch)
+        self.records += self._pending
+        self._batch.clear()
+        self._pending = 0
+
+    def close(self):
+        """Write the pending records and close the current file."""
+
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _existing(self):
+        # capture files left in the directory by earlier runs, oldest first
+        pattern = re.compile(re.escape(self.prefix) + r'-\d{8}-\d{6}(-\d+)?\.cap$')
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if pattern.match(name)]
+        return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+    def _rotate(self, now):
+        if self._file is not None:
+            self._file.close()
+        name = "%s-%s" % (self.prefix, time.strftime('%Y%m%d-%H%M%S'))
+        path = os.path.join(self.directory, name + ".cap")
+        count = 1
+        while os.path.exists(path) or path in self.files:
+            path = os.path.join(self.directory, "%s-%d.cap" % (name, count))
+            count += 1
+        self._file = open(path, 'wb')
+        session = _session_data(self.port)
+        header = _FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION) + \
+            _RECORD_HEADER.pack(now, CAPTURE_SESSION, SESSION_OPCODE, len(session)) + session
+        self._file.write(header)
+        self._size = len(header)
+        self._opened = now
+        self.files.append(path)
+        if self.keep is not None:
+            while len(self.files) > self.keep:
+                old = self.files.pop(0)
+                if os.path.exists(old):
+                    os.unlink(old)
+
+
+def _check_header(header):
+    if len(header) < _FILE_HEADER.size:
+        raise ValueError("not an RFM69 Serial capture file")
+    magic, version = _FILE_HEADER.unpack(header)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError("not an RFM69 Serial capture file")
+    if version != CAPTURE_VERSION:
+        raise ValueError("unsupported capture format version %d" % version)
+
+
+class CaptureReader:
+    """Read a capture file through a memory map, so that captures of any size are read without loading them.
+    Filtering by time uses an index of blocks of @index_every records, built by a scan of the record headers the
+    first time it is needed; blocks outside the time range are skipped without reading their records.
+
+    Example::
+
+        with CaptureReader("field.cap") as capture:
+            for record in capture.records(start=t0, end=t0 + 60, opcodes={0x03, 0x04}):
+                print(record.time, record.direction, record.data.hex())
+
+    :param path: capture file path.
+    :param index_every: number of records per index block.
+    """
+
+    def __init__(self, path, index_every=4096):
+        self.path = path
+        self.index_every = index_every
+        self._file = open(path, 'rb')
+        try:
+            _check_header(self._file.read(_FILE_HEADER.size))
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._blocks = None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, start=None, end=None, opcodes=None, directions=None):
+        """Iterate over the records of the capture, in file order.
+
+        :param start: skip records older than this wall-clock time (seconds since the epoch).
+        :param end: skip records newer than this wall-clock time.
+        :param opcodes: only yield records of these opcodes (session records are left out as well).
+        :param directions: only yield records of these directions (CAPTURE_COMMAND, CAPTURE_REPLY,
+            CAPTURE_SESSION).
+        :return: iterator of CaptureRecord.
+        """
+
+        opcodes = frozenset(opcodes) if opcodes is not None else None
+        directions = frozenset(directions) if directions is not None else None
+        if start is None and end is None:
+            spans = ((_FILE_HEADER.size, len(self._map), 0.0),)
+        else:
+            spans = [(first, last, offset) for first, last, offset, low, high in self._index()
+                     if (start is None or high >= start) and (end is None or low <= end)]
+        for first, last, offset in spans:
+            yield from self._scan(first, last, offset, start, end, opcodes, directions)
+
+    def _scan(self, first, last, clock_offset, start, end, opcodes, directions):
+        buf = self._map
+        unpack = _RECORD_HEADER.unpack_from
+        header_size = _RECORD_HEADER.size
+        position = first
+        while position + header_size <= last:
+            timestamp, direction, opcode, length = unpack(buf, position)
+            data_start = position + header_size
+            position = data_start + length
+            if position > last:
+                break   # truncated record at the end of the file
+            if direction == CAPTURE_SESSION:
+                clock_offset = _SESSION.unpack_from(buf, data_start)[0] - timestamp
+            if opcodes is not None and opcode not in opcodes:
+                continue
+            if directions is not None and direction not in directions:
+                continue
+            wall_time = timestamp + clock_offset
+            if (start is not None and wall_time < start) or (end is not None and wall_time > end):
+                continue
+            yield CaptureRecord(wall_time, timestamp, direction, opcode, buf[data_start:position])
+
+    def _index(self):
+        # blocks of index_every records: (first offset, end offset, clock offset at the start, min time, max time)
+        if self._blocks is not None:
+            return self._blocks
+        buf = self._map
+        unpack = _RECORD_HEADER.unpack_from
+        header_size = _RECORD_HEADER.size
+        size = len(buf)
+        blocks = []
+        position, clock_offset, count = _FILE_HEADER.size, 0.0, 0
+        while position + header_size <= size:
+            timestamp, direction, opcode, length = unpack(buf, position)
+            end = position + header_size + length
+            if end > size:
+                break
+            if count % self.index_every == 0:
+                if blocks:
+                    blocks[-1][1] = position
+                blocks.append([position, size, clock_offset, float('inf'), float('-inf')])
+            if direction == CAPTURE_SESSION:
+                clock_offset = _SESSION.unpack_from(buf, position + header_size)[0] - timestamp
+            wall_time = timestamp + clock_offset
+            block = blocks[-1]
+            if wall_time < block[3]:
+                block[3] = wall_time
+            if wall_time > block[4]:
+                block[4] = wall_time
+            position = end
+            count += 1
+        self._blocks = [tuple(block) for block in blocks]
+        return self._blocks
+
+
+def replay(records, port=None, speed=1.0, timeout=1.0):
+    """Feed the commands of a capture to a bridge, with their original timing, and read back its replies.
+    Each reply is read up to the length of the captured one, so pipelined commands are replayed pipelined.
+
+    :param records: iterable of CaptureRecord, e.g. CaptureReader.records().
+    :param port: serial port of the bridge, None to replay to a local Rfm69SerialEmulator.
+    :param speed: replay speed, 1.0 for the original timing, 10.0 for ten times faster, None for no pacing.
+    :param timeout: time (in seconds) to wait for each reply.
+    :return: iterator of ReplayResult, one per captured reply.
+    """
+
+    emulator = None
+    if port is None:
+        from RFM69Serial.emulator import Rfm69SerialEmulator
+        emulator = Rfm69SerialEmulator().start()
+        port = emulator.port
+    try:
+        with serial.Serial(port, timeout=timeout) as link:
+            base = None         # (capture timestamp, local time) the schedule of the session is relative to
+            commands = deque()  # commands written, awaiting their reply
+            for record in records:
+                if record.direction == CAPTURE_SESSION:
+                    base = None
+                elif record.direction == CAPTURE_COMMAND:
+                    if speed:
+                        if base is None:
+                            base = (record.timestamp, time.monotonic())
+                        delay = base[1] + (record.timestamp - base[0]) / speed - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    link.write(record.data)
+                    commands.append(record.data)
+                elif record.direction == CAPTURE_REPLY:
+                    command = commands.popleft() if commands else b''
+                    actual = link.read(len(record.data)) if record.data else b''
+                    yield ReplayResult(record.time, record.opcode, command, record.data, actual)
+    finally:
+        if emulator is not None:
+            emulator.stop()
+
+
+_DIRECTION_NAMES = {CAPTURE_COMMAND: '>', CAPTURE_REPLY: '<', CAPTURE_SESSION: '*', CAPTURE_PACKET: '!'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m RFM69Serial.capture", description=__doc__.split("\n\n")[0])
+    parser.add_argument('path', help="capture file")
+    parser.add_argument('--start', type=float, help="skip records before this time (seconds since the epoch)")
+    parser.add_argument('--end', type=float, help="skip records after this time (seconds since the epoch)")
+    parser.add_argument('--opcode', type=lambda text: int(text, 0), nargs='+', help="only show these opcodes")
+    parser.add_argument('--replay', action='store_true', help="replay the commands to an emulated bridge")
+    parser.add_argument('--port', help="replay to this serial port instead")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor, 0 for no pacing")
+    args = parser.parse_args(argv)
+
+    with CaptureReader(args.path) as capture:
+        if not args.replay:
+            for record in capture.records(args.start, args.end, args.opcode):
+                print("%.6f %s %02X %s" % (record.time, _DIRECTION_NAMES.get(record.direction, '?'), record.opcode,
+                                           record.data.hex()))
+            return 0
+
+        mismatches = total = 0
+        records = capture.records(args.start, args.end, args.opcode, (CAPTURE_COMMAND, CAPTURE_REPLY,
+                                                                      CAPTURE_SESSION))
+        for result in replay(records, args.port, args.speed or None):
+            total += 1
+            if result.actual != result.expected:
+                mismatches += 1
+                print("%.6f %02X %s: expected %s, got %s" % (result.time, result.opcode, bytes(result.command).hex(),
+                                                             result.expected.hex(), result.actual.hex()))
+        print("%d replies, %d mismatches" % (total, mismatches))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
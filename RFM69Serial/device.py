@@ -1,20 +1,98 @@
+import os
+import threading
 import time
+from collections import deque
+from functools import partial
 import serial
 from RFM69Serial import RFM69Packet
+from RFM69Serial.metrics import CommandMetrics
+from RFM69Serial.opcodes import *
+from RFM69Serial.pipeline import CommandPipeline, PendingReply, SERIAL_RX_BUFFER
+from RFM69Serial.protocol import *
+from RFM69Serial.receiver import DROP_OLDEST
+from RFM69Serial.registers import *
+from RFM69Serial.rtt import RttTable
+from RFM69Serial.stream import StreamDemultiplexer, _frame_to_packet
+from RFM69Serial.survey import SpectrumSurvey, _require_numpy
 
 # Constants and globals
 RFM69_FSTEP = 61.03515625
+MAX_MSG_LEN = 60                    # size of the firmware's msg[] buffer
+_MAX_FRAME_LEN = MAX_MSG_LEN + SEND_WITH_RETRY.framed_request.size    # sendWithRetry has the longest header
+_WAIT_MIN_INTERVAL = 0.0005         # s, first poll interval of the wait primitives outside streaming mode
+_WAIT_MAX_INTERVAL = 0.01           # s, poll interval they back off to while nothing arrives
+_HELD_PACKETS = 64                  # packets set aside by wait_for_packet(sender=...) for later calls
 
 
-class Rfm69SerialDevice(serial.Serial):
-    """This class provides serial device objects that represent physical RFM69 module as if it is connected
-    directly to PC/Laptop.
-    Thus, device parameters such as addresses, pin configurations are passed to constructor to create a runnable
-    serial device object.
+def _value_reply(size, convert, length_index=None):
+    """Build a Reply for GET-type commands whose 'y' status is followed by data bytes.
+    The decoded value is convert(reply) for a complete 'y' reply, None otherwise.
+    """
+
+    def decode(buf):
+        if buf[0:1] == OK_CODE and not reply.need(buf):
+            return convert(buf)
+        return None
+
+    reply = Reply(size, length_index, decode)
+    return reply
+
+
+def _payload_view(msg):
+    """Return a flat byte view of an outbound message without copying bytes-like objects.
+    str messages are ASCII-encoded, lists of byte values (0-255) are converted once.
     """
 
-    def __init__(self, address=1, network=101, cs_pin=0, int_pin=1, port="/dev/ttyACM0", time_out=1):
-        super(Rfm69SerialDevice, self).__init__(port=port, timeout=time_out)
+    if type(msg) == str:
+        payload = memoryview(msg.encode('ASCII'))
+    elif type(msg) == list:
+        payload = memoryview(bytes(msg))
+    elif isinstance(msg, (bytes, bytearray, memoryview)):
+        payload = memoryview(msg)
+        if payload.ndim != 1 or payload.itemsize != 1:
+            payload = payload.cast('B')
+    else:
+        raise TypeError("message must be a string, list of byte values or bytes-like object")
+
+    if len(payload) > MAX_MSG_LEN:
+        raise ValueError("message is %d bytes long, the bridge accepts at most %d bytes" % (len(payload), MAX_MSG_LEN))
+    return payload
+
+
+def _to_rx_packet(buf):
+    return RFM69Packet(buf[1], buf[3:])
+
+
+def _survey_result(first, spacing, channels, started, buf):
+    return SpectrumSurvey.from_samples(first, spacing, channels, buf[1:], started, time.time())
+
+
+# Replies of the GET-type commands
+_RSSI_REPLY = _value_reply(READ_RSSI.response.size, lambda buf: -READ_RSSI.decode(buf)[0])
+_RX_DATA_REPLY = _value_reply(GET_RX_DATA.response.size, _to_rx_packet, length_index=GET_RX_DATA.response.size)
+_CAPABILITIES_REPLY = _value_reply(GET_CAPABILITIES.response.size, GET_CAPABILITIES.decode)
+_PACKET_REPLY = _value_reply(POLL_PACKET.response.size, _frame_to_packet, length_index=POLL_PACKET.response.size)
+_POWER_LEVEL_REPLY = _value_reply(GET_POWER_LEVEL.response.size, lambda buf: GET_POWER_LEVEL.decode(buf)[0])
+_TEMPERATURE_REPLY = _value_reply(READ_TEMPERATURE.response.size, lambda buf: READ_TEMPERATURE.decode(buf)[0])
+_LNA_REPLY = _value_reply(SET_LNA.response.size, lambda buf: SET_LNA.decode(buf)[0])
+_TIMED_SEND_SIZE = SEND_WITH_RETRY_TIMED.response.size
+
+# queue drain reply: count, packets left, queue size, overflow count (uint16 LE), then the packet records
+_DRAIN_HEADER_LEN = DRAIN_PACKETS.response.size
+
+# read_register() results, shared to avoid an allocation per cached read
+_BYTE_VALUES = [bytes((value,)) for value in range(256)]
+
+
+class Rfm69Commands:
+    """Command set of the RFM69 Serial bridge, shared by the blocking and the asyncio device classes.
+    Each command method builds its frame from the opcode table (see RFM69Serial.opcodes) and passes it to
+    _transact() together with the layout of the expected reply. Concrete classes implement _transact() on top of
+    their transport and decide what a command returns: the decoded reply, a PendingReply or an awaitable.
+    """
+
+    def _setup(self, address, network, cs_pin, int_pin):
+        """Initialize the device parameters and per-device buffers, called from the concrete constructor."""
 
         self._devAddress = address
         self._networkID = network
@@ -27,14 +105,115 @@ class Rfm69SerialDevice(serial.Serial):
         self._is_encrypted = False
         self._encryption_key = 'samplekey16bytes'
 
-        # initialize RFM69 module
-        t_start = time.perf_counter()
-        while time.perf_counter() - t_start < 10:
-            time.sleep(0.1)     # Hardware deceleration factor
-            if self._init_rf_module():
-                break
-        else:
-            raise TimeoutError("Could not connect to RFM69 device!")
+        # reusable buffer for message frames (send_msg, send_msg_with_retry, send_ACK)
+        self._tx_frame = bytearray(_MAX_FRAME_LEN)
+        self._tx_view = memoryview(self._tx_frame)
+
+        # write-through shadow of the configuration registers, replies record what they read
+        self._registers = RegisterShadow()
+
+        # firmware features, known once negotiated at connect time
+        self.protocol_version = 0
+        self.capabilities = 0
+        self._framed = False
+
+        # state of the firmware's received packet queue, as of the last drain_packets()
+        self.rx_queue_depth = 0         # packets left in the queue
+        self.rx_queue_capacity = 0
+        self.rx_queue_overflow = 0      # packets dropped because the queue was full
+        self._drain_reply = RecordReply(_DRAIN_HEADER_LEN, PUSH_HEADER_LEN - 1, self._record_drain)
+
+        # per-node round-trip time estimates, set the time-out and retries of send_msg_with_retry()
+        self.rtt = RttTable()
+
+    def _transact(self, command, reply):
+        raise NotImplementedError
+
+    def _negotiate(self, capabilities, framed=True):
+        """Record the firmware capabilities and pick the command framing, called from the connect sequence.
+
+        :param capabilities: result of get_capabilities().
+        :param framed: use framed commands if the firmware supports them.
+        """
+
+        self.protocol_version, self.capabilities = capabilities if capabilities is not None else (0, 0)
+        self._framed = framed and bool(self.capabilities & CAP_FRAMED)
+
+    def _encode(self, command):
+        """Return the command frame to write for @command, a '$' command or a frame built by _command()."""
+        return frame_command(command) if self._framed and command[0] == 0x24 else command
+
+    def _command(self, command, *args, extra=0):
+        """Build the frame of a table command in the negotiated framing, with a single pack call.
+
+        :param command: opcodes.Command to send.
+        :param args: values of its fixed arguments.
+        :param extra: number of payload bytes the caller appends to the frame.
+        :return: command frame (bytes).
+        """
+        return command.encode(self._framed, *args, extra=extra)
+
+    def _completed(self, value):
+        """Return @value the way command results are returned, for results served without a transaction."""
+        raise NotImplementedError
+
+    def _record_send(self, target, buf):
+        # timed sendWithRetry reply: 'y', number of the acknowledged attempt, its round-trip time (ms)
+        if buf[0:1] == OK_CODE and len(buf) == 1 + _TIMED_SEND_SIZE:
+            self.rtt.record(target, *SEND_WITH_RETRY_TIMED.decode(buf))
+            return True
+        if buf == KO_CODE:
+            self.rtt.record(target, None, 0)
+        return False
+
+    def _record_register(self, addr, epoch, buf):
+        self._registers.set(addr, buf[1], epoch)
+        return _BYTE_VALUES[buf[1]]
+
+    def _record_registers(self, start, epoch, buf):
+        values = bytes(buf[1:])
+        for offset, value in enumerate(values):
+            self._registers.set(start + offset, value, epoch)
+        return values
+
+    def _record_writes(self, pairs, epoch, buf):
+        if buf == OK_CODE:
+            for addr, value in pairs:
+                self._registers.set(addr, value, epoch)
+            return True
+        return False
+
+    def _record_frequency(self, epoch, buf):
+        frf_msb, frf_mid, frf_lsb = GET_FREQUENCY.decode(buf)
+        self._registers.set(REG_FRFMSB, frf_msb, epoch)
+        self._registers.set(REG_FRFMID, frf_mid, epoch)
+        self._registers.set(REG_FRFLSB, frf_lsb, epoch)
+        return int(round(RFM69_FSTEP * ((frf_msb << 16) + (frf_mid << 8) + frf_lsb)))
+
+    def _record_drain(self, buf):
+        if buf[0:1] != OK_CODE or self._drain_reply.need(buf):
+            return None
+        count, self.rx_queue_depth, self.rx_queue_capacity, self.rx_queue_overflow = DRAIN_PACKETS.decode(buf)
+
+        packets = []
+        start = 1 + _DRAIN_HEADER_LEN
+        for _ in range(count):
+            end = start + PUSH_HEADER_LEN - 1 + buf[start + PUSH_HEADER_LEN - 2]
+            # records are pushed frames without the start code
+            packets.append(_frame_to_packet(buf[start - 1:end]))
+            start = end
+        return packets
+
+    def _record_connected(self, epoch, buf):
+        self._registers.set(REG_PAYLOADLENGTH, buf[1], epoch)
+        return buf[1] == 66
+
+    def invalidate_registers(self, *addrs):
+        """Drop registers from the host-side register shadow, so that the next read goes to the module.
+
+        :param addrs: register addresses (int) to invalidate, all registers if none is given.
+        """
+        self._registers.invalidate(*addrs)
 
     @property
     def device_address(self):
@@ -68,23 +247,31 @@ class Rfm69SerialDevice(serial.Serial):
 
         :param  command: a single or serie of bytes object(s) to transfer to the Arduino device. It should be noted
             that command always start with $ followed by opcode and data arguments.
-        :return: True if the transaction is successful, False otherwise.
+        :return: True if the transaction is successful, False otherwise. While a command pipeline is active,
+            a PendingReply resolving to that value is returned instead.
         """
 
         if type(command) == bytes:
-            self.write(command)
-            recv = self.read()
-            self.reset_input_buffer()
+            return self._transact(command, ACK_REPLY)
         else:
             raise TypeError("Argument command must be of type (bytes)")
 
-        if recv == b'y':
-            return True
-        else:
-            return False
+    def _msg_frame(self, command, msg, *args):
+        """Build a message frame in the reusable transmit buffer: the header in a single pack call, then the
+        payload.
+
+        :param command: opcodes.Command to send, whose last argument is the message length.
+        :param msg: outbound message (str, list of byte values, bytes, bytearray or memoryview).
+        :param args: values of the arguments before the message length.
+        :return: memoryview of the complete frame, valid until the next message frame is built.
+        """
 
-    # def _serial_get(self, command):
-    #     pass
+        payload = _payload_view(msg)
+        length = len(payload)
+        header_len = command.encode_into(self._tx_frame, self._framed, *args, length, extra=length)
+        frame_len = header_len + length
+        self._tx_frame[header_len:frame_len] = payload
+        return self._tx_view[:frame_len]
 
     def _init_rf_module(self):
         """Initialize RFM69 module via Serial port.
@@ -93,13 +280,9 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if the RFM69 module is initialized successfully, False otherwise.
         """
 
-        serial_cmd = b'$\x00'
-        serial_cmd += self._devAddress.to_bytes(1, 'little')
-        serial_cmd += self._networkID.to_bytes(1, 'little')
-        serial_cmd += self._CS_Pin.to_bytes(1, 'little')
-        serial_cmd += self._Int_Pin.to_bytes(1, 'little')
-
-        return self._serial_transfer(serial_cmd)
+        self._registers.invalidate()
+        serial_cmd = self._command(INITIALIZE, self._devAddress, self._networkID, self._CS_Pin, self._Int_Pin)
+        return self._transact(serial_cmd, ACK_REPLY)
 
     def set_dev_address(self, address):
         """Set the address of RFM69 module, default value is 1
@@ -116,8 +299,8 @@ class Rfm69SerialDevice(serial.Serial):
         else:
             self._devAddress = 1
 
-        serial_cmd = b'$\x01' + self._devAddress.to_bytes(1, 'little')
-        return self._serial_transfer(serial_cmd)
+        self._registers.invalidate(REG_NODEADRS)
+        return self._transact(self._command(SET_ADDRESS, self._devAddress), ACK_REPLY)
 
     def set_network_id(self, nid):
         """Set the network ID of RFM69 module, default value is 101
@@ -131,62 +314,57 @@ class Rfm69SerialDevice(serial.Serial):
         else:
             self._networkID = 101
 
-        serial_cmd = b'$\x02' + self._networkID.to_bytes(1, 'little')
-        return self._serial_transfer(serial_cmd)
+        self._registers.invalidate(REG_SYNCVALUE2)
+        return self._transact(self._command(SET_NETWORK, self._networkID), ACK_REPLY)
 
     def send_msg(self, target_addr, msg, ack_request=False):
         """Send a single message to target device specified by target address.
         This method covers the send() function in RFM69 Arduino library.
 
         :param  target_addr: the address of receiving Arduino board.
-        :param  msg: message to send, message must be of type string or a list of byte values (0-255).
+        :param  msg: message to send, message must be of type string, a list of byte values (0-255) or a
+            bytes-like object (bytes, bytearray, memoryview). At most 60 bytes long.
         :param  ack_request: acknowledge request status, if True, the request is embedded in the message.
 
         :return: True if the message is sent, False otherwise.
         """
 
-        ack = b'\x01' if ack_request else b'\x00'
         # check type
         assert type(target_addr) == int
 
-        if type(msg) == str:
-            serial_cmd = b'$\x03' + target_addr.to_bytes(1, 'little') + ack + \
-                        len(msg).to_bytes(1, 'little') + msg.encode('ASCII')
-        elif type(msg) == list:
-            serial_cmd = b'$\x03' + target_addr.to_bytes(1, 'little') + ack + len(msg).to_bytes(1, 'little')
-            for item in msg:
-                serial_cmd += item.to_bytes(1, 'little')
-        else:
-            raise TypeError("message must be a list or string")
-
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._msg_frame(SEND, msg, target_addr, 0x01 if ack_request else 0x00), ACK_REPLY)
 
-    def send_msg_with_retry(self, target_addr, msg, retries=2, time_out=50):
+    def send_msg_with_retry(self, target_addr, msg, retries=None, time_out=None):
         """Send a single message a number (retries) of times to ensure the message deliverance.
         This method covers the sendWithRetry() function in RFM69 Arduino library.
 
+        If the firmware reports CAP_TIMED_RETRY, it measures the round-trip time of the acknowledged attempt and
+        the device keeps per-node estimates in self.rtt (an RttTable). The time-out and retries then default to
+        values computed for @target_addr; otherwise they default to 50 ms and 2 retries.
+
         :param  target_addr: the address of receiving Arduino board.
-        :param  msg: message to send, message must be of type string or a list of byte values (0-255)
-        :param  retries: number of times the sender attempts to send the message to the receiver.
-        :param  time_out: each attempt waits for "time_out" miliseconds before moving to the next attempt.
+        :param  msg: message to send, message must be of type string, a list of byte values (0-255) or a
+            bytes-like object (bytes, bytearray, memoryview). At most 60 bytes long.
+        :param  retries: number of times the sender attempts to send the message to the receiver, None to let
+            the device decide.
+        :param  time_out: each attempt waits for "time_out" miliseconds (at most 255) before moving to the next
+            attempt, None to let the device decide.
 
         :return: True if the message is sent, False otherwise.
         """
 
         assert type(target_addr) == int
 
-        if type(msg) == str:
-            serial_cmd = b'$\x04' + target_addr.to_bytes(1, 'little') + retries.to_bytes(1, 'little') + \
-                          time_out.to_bytes(1, 'little') + len(msg).to_bytes(1, 'little') + msg.encode('ASCII')
-        elif type(msg) == list:
-            serial_cmd = b'$\x04' + target_addr.to_bytes(1, 'little') + retries.to_bytes(1, 'little') + \
-                          time_out.to_bytes(1, 'little') + len(msg).to_bytes(1, 'little')
-            for item in msg:
-                serial_cmd += item.to_bytes(1, 'little')
-        else:
-            raise TypeError("outbound message must be a list or string")
+        timed = self.capabilities & CAP_TIMED_RETRY
+        if retries is None:
+            retries = self.rtt.retries(target_addr) if timed else 2
+        if time_out is None:
+            time_out = self.rtt.timeout(target_addr) if timed else 50
 
-        return self._serial_transfer(serial_cmd)
+        if not timed:
+            return self._transact(self._msg_frame(SEND_WITH_RETRY, msg, target_addr, retries, time_out), ACK_REPLY)
+        return self._transact(self._msg_frame(SEND_WITH_RETRY_TIMED, msg, target_addr, retries, time_out),
+                              Reply(_TIMED_SEND_SIZE, None, partial(self._record_send, target_addr)))
 
     def begin_receive(self):
         """Change RFM69 module from TX to RX and wait for message to arrive.
@@ -195,8 +373,7 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if state changed, False otherwise.
         """
 
-        serial_cmd = b'$\x05'
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(RECEIVE_BEGIN), ACK_REPLY)
 
     def receive_done(self):
         """Check if there is a newly received message in device's memory.
@@ -205,61 +382,51 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if there is a new message, False otherwise.
         """
 
-        serial_cmd = b'$\x06'
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(RECEIVE_DONE), ACK_REPLY)
 
     def ACK_received(self, target_addr=2):
         """Check if an acknowledge is embedded in newly received message from the device at target_addr
         Should be polled immediately after sending a packet with ACK request
         """
 
-        serial_cmd = b'$\x07' + target_addr.to_bytes(1, 'little')
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(ACK_RECEIVED, target_addr), ACK_REPLY)
 
     def ACK_requested(self):
         """Check whether an ACK was requested in the last received packet
         """
 
-        serial_cmd = b'$\x08'
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(ACK_REQUESTED), ACK_REPLY)
 
     def send_ACK(self, msg):
         """Send back an acknowledge message to the sender if ACK_requested is detected.
         Should be called immediately after reception in case sender wants ACK.
 
-        :param msg: some message to be sent along with ACK.
+        :param msg: some message to be sent along with ACK, of type string, a list of byte values (0-255) or a
+            bytes-like object (bytes, bytearray, memoryview). At most 60 bytes long.
 
         :return: True if ACK is sent, False otherwise.
         """
 
-        if type(msg) == str:
-            serial_cmd = b'$\x09' + len(msg).to_bytes(1, 'little') + msg.encode('ASCII')
-        elif type(msg) == list:
-            serial_cmd = b'$\x09' + len(msg).to_bytes(1, 'little')
-            for item in msg:
-                serial_cmd += item.to_bytes(1, 'little')
-        else:
-            raise TypeError("outbound message must be a list or string")
-
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._msg_frame(SEND_ACK, msg), ACK_REPLY)
 
     def get_frequency(self):
         """Read the current frequency setting from RFM69 module.
         This method covers getFrequency() function in RFM69 Arduino library.
 
+        The frequency is computed from the register shadow if REG_FRFMSB/MID/LSB are known.
+
         :return: current set carrier frequency (in decimal) if read command succeeded. None if failed.
         """
 
-        serial_cmd = b'$\x0A'
-        self.write(serial_cmd)
-        if self.read() == b'y':
-            frf_MSB = ord(self.read())
-            frf_MID = ord(self.read())
-            frf_LSB = ord(self.read())
-            frequency = (frf_MSB << 16) + (frf_MID << 8) + frf_LSB
-            return int(round(RFM69_FSTEP * frequency))
-        else:
-            return None
+        frf_msb = self._registers.get(REG_FRFMSB)
+        frf_mid = self._registers.get(REG_FRFMID)
+        frf_lsb = self._registers.get(REG_FRFLSB)
+        if frf_msb is not None and frf_mid is not None and frf_lsb is not None:
+            return self._completed(int(round(RFM69_FSTEP * ((frf_msb << 16) + (frf_mid << 8) + frf_lsb))))
+
+        return self._transact(self._command(GET_FREQUENCY),
+                              _value_reply(GET_FREQUENCY.response.size,
+                                           partial(self._record_frequency, self._registers.epoch)))
 
     def set_frequency(self, freq=915000000):
         """Set the carrier frequency of RFM69 module to a specific value/
@@ -270,12 +437,8 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if set, False otherwise.
         """
 
-        serial_cmd = b'$\x0B'
-        bitmask = 0xFF
-        for i in range(0, 4):
-            nibble = (freq >> (i * 8)) & bitmask
-            serial_cmd += (nibble.to_bytes(1, 'little'))
-        return self._serial_transfer(serial_cmd)
+        self._registers.invalidate(REG_FRFMSB, REG_FRFMID, REG_FRFLSB)
+        return self._transact(self._command(SET_FREQUENCY, freq & 0xFFFFFFFF), ACK_REPLY)
 
     def encrypt(self, key='samplekey16bytes'):
         """Enable/Disable encryption feature on RFM69 module.
@@ -288,23 +451,17 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if the command was acknowledge, False otherwie.
         """
 
-        serial_cmd = b'$\x0C'
-        if len(key) == 0:
-            self._is_encrypted = False
-            serial_cmd += b'\x00'
-        elif len(key) == 16:
+        self._registers.invalidate(REG_PACKETCONFIG2, *range(REG_AESKEY1, REG_AESKEY1 + 16))
+        if len(key) == 16:
             self._is_encrypted = True
             self._encryption_key = key
-
-            serial_cmd += b'\x01'
-            for i in range(0, 16):
-                serial_cmd += key[i].encode('ascii')
+            serial_cmd = self._command(ENCRYPT, 0x01, key.encode('ascii'))
         else:
-            # invalid key, disable encryption feature
+            # no key or invalid key, disable encryption feature
             self._is_encrypted = False
-            serial_cmd += b'\x00'
+            serial_cmd = self._command(ENCRYPT_OFF, 0x00)
 
-        return self._serial_transfer(serial_cmd)
+        return self._transact(serial_cmd, ACK_REPLY)
 
     def set_chip_select(self, pin=0):
         """Set chip select pin on the serial device.
@@ -316,11 +473,10 @@ class Rfm69SerialDevice(serial.Serial):
         """
 
         if type(pin) == int and 0 <= pin < 255:
-            serial_cmd = b'$\x0D' + pin.to_bytes(1, 'little')
             self._CS_Pin = pin
         else:
             raise ValueError("pin must be a number typed int")
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(SET_CS, pin), ACK_REPLY)
 
     def set_interrupt_pin(self, pin=0):
         """Set interrupt pin on the serial device.
@@ -332,11 +488,10 @@ class Rfm69SerialDevice(serial.Serial):
         """
 
         if type(pin) == int and 0 <= pin < 255:
-            serial_cmd = b'$\x0E' + pin.to_bytes(1, 'little')
             self._Int_Pin = pin
         else:
             raise ValueError("pin must be a number typed int")
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(SET_IRQ, pin), ACK_REPLY)
 
     def get_rssi(self, force=False):
         """Get signal strength value from RFM69 module.
@@ -347,13 +502,7 @@ class Rfm69SerialDevice(serial.Serial):
         :return: RSSI value in decimal if read command is successful. None otherwise.
         """
 
-        forceTrigger = b'\x01' if force else b'\x00'
-        serial_cmd = b'$\x0F' + forceTrigger
-        self.write(serial_cmd)
-        if self.read() == b'y':
-            return -ord(self.read())
-        else:
-            return None
+        return self._transact(self._command(READ_RSSI, 0x01 if force else 0x00), _RSSI_REPLY)
 
     def set_spy(self, enable=False):
         """Enable RFM69 module promiscuous mode to listen to any packet in the network.
@@ -364,21 +513,41 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if the command is successful. False otherwise.
         """
 
-        enabled = b'\x01' if enable else b'\x00'
-        serial_cmd = b'$\x10' + enabled
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(SPY_MODE, 0x01 if enable else 0x00), ACK_REPLY)
 
     def set_high_power(self, enable=True):
-        enabled = b'\x01' if enable else b'\x00'
-        serial_cmd = b'$\x11' + enabled
-        return self._serial_transfer(serial_cmd)
+        """Select the PA configuration of the high power RFM69HW/HCW modules.
+        This method covers setHighPower() function in RFM69 Arduino library.
+
+        :param enable: True for an RFM69HW/HCW module, False for an RFM69W/CW module.
+
+        :return: True if the command is successful. False otherwise.
+        """
+
+        self._registers.invalidate(REG_OCP)
+        return self._transact(self._command(SET_HIGH_POWER, 0x01 if enable else 0x00), ACK_REPLY)
 
     def set_power_level(self, level=100):
-        serial_cmd = b'$\x11' + level.to_bytes(1, 'little')
-        return self._serial_transfer(serial_cmd)
+        """Set the output power level of RFM69 module.
+        This method covers setPowerLevel() function in RFM69 Arduino library.
+
+        :param level: power level (0 - 255), the firmware clamps it to the module's maximum (31).
+
+        :return: True if the command is successful. False otherwise.
+        """
+
+        if type(level) != int or not 0 <= level <= 0xFF:
+            raise ValueError("level must be an int between 0 and 255")
+        return self._transact(self._command(SET_POWER_LEVEL, level), ACK_REPLY)
 
     def get_power_level(self):
-        pass
+        """Read the output power level of RFM69 module.
+        This method covers getPowerLevel() function in RFM69 Arduino library.
+
+        :return: power level (0 - 31) if read command is successful. None otherwise.
+        """
+
+        return self._transact(self._command(GET_POWER_LEVEL), _POWER_LEVEL_REPLY)
 
     def sleep(self):
         """Put the RFM69 module into sleep mode.
@@ -386,38 +555,85 @@ class Rfm69SerialDevice(serial.Serial):
         :return: True if the module is set to sleep. False otherwise.
         """
 
-        serial_cmd = b'$\x15'
-        return self._serial_transfer(serial_cmd)
+        return self._transact(self._command(SLEEP), ACK_REPLY)
+
+    def read_temperature(self, cal_factor=0):
+        """Read the die temperature of RFM69 module. The module leaves RX to take the measurement, call
+        begin_receive() afterwards to receive again.
+        This method covers readTemperature() function in RFM69 Arduino library.
+
+        :param cal_factor: calibration offset (in degrees, -128 - 127) added to the raw measurement.
 
-    def read_temperature(self):
-        pass
+        :return: temperature in degrees Celsius if read command is successful. None otherwise.
+        """
+
+        if type(cal_factor) != int or not -0x80 <= cal_factor < 0x80:
+            raise ValueError("cal_factor must be an int between -128 and 127")
+        return self._transact(self._command(READ_TEMPERATURE, cal_factor), _TEMPERATURE_REPLY)
 
     def rc_calibration(self):
-        serial_cmd = b'$\x17'
-        return self._serial_transfer(serial_cmd)
+        """Calibrate the internal RC oscillator of RFM69 module.
+        This method covers rcCalibration() function in RFM69 Arduino library.
+
+        :return: True if the command is successful. False otherwise.
+        """
+
+        return self._transact(self._command(RC_CALIBRATION), ACK_REPLY)
+
+    def set_300kbps(self):
+        """Switch RFM69 module to the 300 kbps bit rate (modulation, bit rate, frequency deviation, RX and AFC
+        bandwidths and packet configuration registers).
+        This method covers set300KBPS() function in RFM69 Arduino library.
+
+        :return: True if the command is successful. False otherwise.
+        """
+
+        self._registers.invalidate(REG_DATAMODUL, REG_BITRATEMSB, REG_BITRATELSB, REG_FDEVMSB, REG_FDEVLSB,
+                                   REG_RXBW, REG_AFCBW, REG_PACKETCONFIG1)
+        return self._transact(self._command(SET_300KBPS), ACK_REPLY)
+
+    def set_lna(self, new_reg):
+        """Set the LNA gain of RFM69 module (bits 2-0 of REG_LNA, 0 selecting the AGC).
+        This method covers setLNA() function in RFM69 Arduino library.
+
+        :param new_reg: LNA gain select value (0 - 7).
+
+        :return: the previous value of REG_LNA if the command is successful. None otherwise.
+        """
+
+        if type(new_reg) != int or not 0 <= new_reg <= 0xFF:
+            raise ValueError("new_reg must be an int between 0 and 255")
+        self._registers.invalidate(REG_LNA)
+        return self._transact(self._command(SET_LNA, new_reg), _LNA_REPLY)
 
-    def read_register(self, reg_addr):
+    def read_register(self, reg_addr, cached=True):
         """Read value from configuraton and status registers built-in RFM69 module.
         This method covers readReg() function in RFM69 Arduino library.
+        Configuration registers are served from the host-side register shadow once known; volatile status
+        registers (IRQ flags, RSSI value, FIFO, ...) are always read from the module.
 
         :param reg_addr: Register address, it must be of type bytes
+        :param cached: if False, always read the register from the module (and refresh the shadow).
 
         :return: the current value of the register @reg_addr if successful. None if failed.
         """
 
         if type(reg_addr) == bytes:
-            serial_cmd = b'$\x1A' + reg_addr
-            self.write(serial_cmd)
-            if self.read() == b'y':
-                return self.read()
-            else:
-                return None
+            addr = reg_addr[0]
+            value = self._registers.get(addr) if cached else None
+            if value is not None:
+                return self._completed(_BYTE_VALUES[value])
+
+            return self._transact(self._command(READ_REG, addr),
+                                  _value_reply(READ_REG.response.size,
+                                               partial(self._record_register, addr, self._registers.epoch)))
         else:
             raise TypeError("Target register address must be of type bytes")
 
     def write_register(self, reg_addr, value):
         """Write value to specific configuraton and status registers built-in RFM69 module.
         This method covers writeReg() function in RFM69 Arduino library.
+        The register shadow is updated once the module acknowledges the write.
 
         :param reg_addr: Register address, it must be of type bytes
         :param value: specific value to write to register @reg_addr, must be of type bytes
@@ -426,45 +642,660 @@ class Rfm69SerialDevice(serial.Serial):
         """
 
         if type(reg_addr) == bytes and type(value) == bytes:
-            serial_cmd = b'$\x1B' + reg_addr + value
-            return self._serial_transfer(serial_cmd)
+            addr = reg_addr[0]
+            self._registers.invalidate(addr)
+            serial_cmd = self._command(WRITE_REG, addr, value[0])
+            return self._transact(serial_cmd, Reply(decode=partial(self._record_writes, ((addr, value[0]),),
+                                                                   self._registers.epoch)))
         else:
             raise TypeError("Target register address and value must be of type bytes")
 
+    def read_registers(self, start, count):
+        """Read @count consecutive registers in a single transaction, starting at address @start.
+        The registers are always read from the module; the values refresh the register shadow.
+
+        :param start: address of the first register (int).
+        :param count: number of registers to read (int), start + count must not exceed REG_MAP_SIZE (0x80).
+
+        :return: bytes holding the register values if successful. None if failed.
+        """
+
+        if type(start) != int or type(count) != int:
+            raise TypeError("Register address and count must be of type int")
+        if start < 0 or count < 1 or start + count > REG_MAP_SIZE:
+            raise ValueError("Register range must lie within 0x00 - 0x7F")
+
+        serial_cmd = self._command(READ_REGS, start, count)
+        return self._transact(serial_cmd, _value_reply(count, partial(self._record_registers, start,
+                                                                      self._registers.epoch)))
+
+    def write_registers(self, start, data=None):
+        """Write several registers in a single transaction.
+        write_registers(start, data) writes data[i] to register start + i. write_registers(pairs) writes a sparse
+        set of registers given as a dict or an iterable of (address, value) pairs, in order.
+        The register shadow is updated once the module acknowledges the write.
+
+        :param start: address of the first register (int), or the (address, value) pairs.
+        :param data: bytes-like register values, start + len(data) must not exceed REG_MAP_SIZE (0x80).
+
+        :return True if write command is successful, False otherwise.
+        """
+
+        if data is None:
+            pairs = tuple((addr, value) for addr, value in (start.items() if isinstance(start, dict) else start))
+            if not 0 < len(pairs) <= MAX_REGISTER_PAIRS:
+                raise ValueError("Sparse register write takes 1 to %d pairs" % MAX_REGISTER_PAIRS)
+            for addr, value in pairs:
+                if type(addr) != int or type(value) != int:
+                    raise TypeError("Register address and value must be of type int")
+                if not 0 <= addr < REG_MAP_SIZE or not 0 <= value <= 0xFF:
+                    raise ValueError("Register address or value out of range")
+            values = bytes(item for pair in pairs for item in pair)
+            serial_cmd = self._command(WRITE_REG_PAIRS, len(pairs), extra=len(values)) + values
+        else:
+            if type(start) != int:
+                raise TypeError("Register address must be of type int")
+            if not isinstance(data, (bytes, bytearray, memoryview)):
+                raise TypeError("Register values must be a bytes-like object")
+            data = bytes(data)
+            if start < 0 or not data or start + len(data) > REG_MAP_SIZE:
+                raise ValueError("Register range must lie within 0x00 - 0x7F")
+            pairs = tuple(enumerate(data, start))
+            serial_cmd = self._command(WRITE_REGS, start, len(data), extra=len(data)) + data
+
+        self._registers.invalidate(*(addr for addr, _ in pairs))
+        return self._transact(serial_cmd, Reply(decode=partial(self._record_writes, pairs, self._registers.epoch)))
+
     def get_rx_data(self):
         """Request received data from RFM69 device.
         This method assumes that the caller already checked for message received status.
 
+        The reply is fetched with three sized reads: status byte, header (sender and length), then the whole
+        payload at once.
+
         :return: If success, returns a RFM69Packet object containing sender address and the received message.
         Else, None.
-        Also note that received message is a list of bytes object, use appropriate methods to convert it to
-        other type.
+        Also note that received message is stored as bytes object (RFM69Packet.payload), use appropriate
+        methods to convert it to other type.
         """
 
-        rx_packet = RFM69Packet()
+        return self._transact(self._command(GET_RX_DATA), _RX_DATA_REPLY)
 
-        serial_cmd = b'$\x1E'
-        self.write(serial_cmd)
+    def poll_packet(self, ack_payload=None):
+        """Fetch the next received packet, if any, in a single transaction.
+        This replaces the receive_done(), get_rx_data(), get_rssi(), ACK_requested() and begin_receive() sequence
+        (plus send_ACK() with @ack_payload): RX is re-armed by the firmware right after the packet is fetched.
+        The first call arms RX as receive_done() does.
 
-        ack_byte = self.read()
-        rx_packet.sender = ord(self.read())
-        msg_len = ord(self.read())
-        for _ in range(0, msg_len):
-            rx_packet.message.append(self.read())
+        :param ack_payload: if given, ACK requests are answered right away with this payload (str, list or
+            bytes-like object, max 60 bytes; '' for an empty ACK).
+        :return: RFM69Packet with sender, target, RSSI and ACK-requested flag if a packet was received, None
+            otherwise.
+        """
 
-        if ack_byte == b'y':
-            return rx_packet
+        if not self.capabilities & CAP_POLL_PACKET:
+            raise RuntimeError("the bridge firmware does not support poll_packet(), please update it")
+        if ack_payload is None:
+            serial_cmd = self._command(POLL_PACKET, 0x00, 0)
         else:
-            return None
+            serial_cmd = self._msg_frame(POLL_PACKET, ack_payload, POLL_AUTO_ACK)
+        return self._transact(serial_cmd, _PACKET_REPLY)
+
+    def enable_rx_queue(self, enable=True, auto_ack=False):
+        """Let the bridge receive in the background, keeping packets in its queue until drain_packets() fetches
+        them; packets no longer overwrite each other while the host is busy. A packet arriving while the queue is
+        full is dropped (and not acknowledged, so that a retrying sender tries again) and counted in
+        rx_queue_overflow. Switching the queue on or off empties it and resets the overflow count.
+
+        :param enable: True to queue received packets, False to stop background receiving.
+        :param auto_ack: let the firmware answer ACK requests of queued packets with an empty ACK.
+        :return: True if successful, False otherwise.
+        """
+
+        if enable and not self.capabilities & CAP_RX_QUEUE:
+            raise RuntimeError("the bridge firmware does not support the RX queue, please update it")
+        mode = STREAM_QUEUE | (STREAM_AUTO_ACK if auto_ack else 0) if enable else 0
+        return self._transact(self._command(SET_RX_MODE, mode), ACK_REPLY)
+
+    def drain_packets(self, max_n=16):
+        """Fetch up to @max_n packets from the bridge's receive queue in a single transaction, oldest first.
+        The rx_queue_depth, rx_queue_capacity and rx_queue_overflow attributes are updated as well.
+
+        :param max_n: maximum number of packets to fetch (1 - 255).
+        :return: list of RFM69Packet (with sender, target, RSSI and ACK-requested flag), possibly empty. None if
+            failed.
+        """
+
+        if type(max_n) != int or not 0 < max_n < 256:
+            raise ValueError("max_n must be an int between 1 and 255")
+        return self._transact(self._command(DRAIN_PACKETS, max_n), self._drain_reply)
+
+    def set_rx_filter(self, senders=None, targets=None, min_rssi=None):
+        """Let the bridge drop received packets the host is not interested in, before they cross the serial link.
+        The filter applies to streamed, queued and polled packets (see start_streaming(), enable_rx_queue() and
+        poll_packet()); dropped packets are not acknowledged. Combined with set_spy(True), the bridge forwards the
+        matching traffic of the whole network. Calling it without criteria lets every packet through again.
+
+        :param senders: iterable of sender addresses (0-255) to keep, None for any sender.
+        :param targets: iterable of target addresses (0-255, 0 being broadcast) to keep, None for any target.
+        :param min_rssi: weakest signal strength (dBm, -255 - 0) to keep, None for any.
+        :return: True if successful, False otherwise.
+        """
+
+        if not self.capabilities & CAP_RX_FILTER:
+            raise RuntimeError("the bridge firmware does not support receive filters, please update it")
+        flags = 0
+        sets = []
+        for flag, addresses in ((FILTER_SENDERS, senders), (FILTER_TARGETS, targets)):
+            bitmap = bytearray(ADDRESS_SET_LEN)
+            if addresses is not None:
+                flags |= flag
+                for address in addresses:
+                    if type(address) != int or not 0 <= address <= 0xFF:
+                        raise ValueError("addresses must be ints between 0 and 255")
+                    bitmap[address >> 3] |= 1 << (address & 7)
+            sets.append(bytes(bitmap))
+        if min_rssi is not None:
+            if type(min_rssi) != int or not -0xFF <= min_rssi <= 0:
+                raise ValueError("min_rssi must be an int between -255 and 0")
+            flags |= FILTER_RSSI
+        return self._transact(self._command(SET_RX_FILTER, flags, -(min_rssi or 0), *sets), ACK_REPLY)
+
+    def survey(self, first, spacing, channels, dwell=1000, sweeps=1):
+        """Measure the signal strength of @channels evenly spaced channels, @sweeps times over, in one transaction.
+        The bridge runs the sweeps itself and streams the samples back (see RFM69Serial.survey). The carrier
+        frequency is restored afterwards and the module is left in receive mode, as after begin_receive().
+        In streaming mode, the whole survey must complete within the port's time-out.
+
+        :param first: frequency of the first channel (Hz).
+        :param spacing: channel spacing (Hz).
+        :param channels: number of channels (1 - 65535).
+        :param dwell: time (in microseconds, 0 - 65535) spent on each channel before sampling its RSSI.
+        :param sweeps: number of sweeps (1 - 255).
+        :return: SpectrumSurvey of the samples (needs NumPy) if successful, None otherwise.
+        """
+
+        if not self.capabilities & CAP_SURVEY:
+            raise RuntimeError("the bridge firmware does not support spectrum surveys, please update it")
+        for value in (first, spacing, channels, dwell, sweeps):
+            if type(value) != int:
+                raise TypeError("Survey parameters must be of type int")
+        if not 0 < channels <= 0xFFFF or not 0 < sweeps <= 0xFF or not 0 <= dwell <= 0xFFFF:
+            raise ValueError("channels must be 1 - 65535, sweeps 1 - 255 and dwell 0 - 65535 us")
+        if first <= 0 or spacing < 0 or first + spacing * (channels - 1) > 0xFFFFFFFF:
+            raise ValueError("Survey frequencies must lie within 1 - 4294967295 Hz")
+        _require_numpy()
+
+        serial_cmd = self._command(SURVEY, first, spacing, channels, dwell, sweeps)
+        return self._transact(serial_cmd, _value_reply(channels * sweeps,
+                                                       partial(_survey_result, first, spacing, channels,
+                                                               time.time())))
+
+    def get_capabilities(self):
+        """Query the protocol version and the optional features (CAP_* flags) of the bridge firmware.
+
+        :return: tuple (protocol version, capability flags) if successful. None if the firmware predates the query.
+        """
+
+        return self._transact(self._command(GET_CAPABILITIES), _CAPABILITIES_REPLY)
 
     def is_device_connected(self):
         """Check if serial device is online and connected.
         The strategy is to use read_register() method to figure out payload length (which is 66).
         If the number 66 is returned, we know that both SPI and UART connection are good.
 
+        The register is always read from the module, as a connection check must not be served from the shadow.
+
         :return: True if the serial device is present and connected to PC, False otherwise
         """
-        if ord(self.read_register(b'\x38')) == 66:
-            return True
+        return self._transact(self._command(READ_REG, REG_PAYLOADLENGTH),
+                              _value_reply(READ_REG.response.size,
+                                           partial(self._record_connected, self._registers.epoch)))
+
+
+class Rfm69SerialDevice(Rfm69Commands, serial.Serial):
+    """This class provides serial device objects that represent physical RFM69 module as if it is connected
+    directly to PC/Laptop.
+    Thus, device parameters such as addresses, pin configurations are passed to constructor to create a runnable
+    serial device object.
+    Commands are sent framed (with an explicit length, read by the firmware at full UART speed) whenever the
+    firmware reports support for it at connect time; @framed=False forces the legacy '$' commands.
+    Every command is counted and timed per opcode in self.metrics (see RFM69Serial.metrics); @metrics=False turns
+    the instrumentation off.
+    With @capture, every command frame and reply is appended to a binary capture file (see RFM69Serial.capture):
+    pass a file path, or a CaptureWriter shared with other devices.
+    @baudrate must match the rate the firmware was built with on UART bridges; native USB bridges ignore it.
+    """
+
+    def __init__(self, address=1, network=101, cs_pin=0, int_pin=1, port="/dev/ttyACM0", time_out=1, framed=True,
+                 metrics=True, capture=None, baudrate=9600):
+        super(Rfm69SerialDevice, self).__init__(port=port, baudrate=baudrate, timeout=time_out)
+        self._setup(address, network, cs_pin, int_pin)
+
+        # per-opcode counters and latency histograms, None when instrumentation is off
+        self.metrics = CommandMetrics() if metrics else None
+
+        # serializes transactions of threads sharing the port (e.g. a PacketReceiver)
+        self._lock = threading.RLock()
+
+        # active CommandPipeline, if any
+        self._pipeline = None
+
+        # capture of the serial traffic, None when off; opcodes of the captured commands awaiting their reply
+        self._own_capture = isinstance(capture, (str, os.PathLike))
+        if self._own_capture:
+            from RFM69Serial.capture import CaptureWriter
+            capture = CaptureWriter(capture, port)
+        self.capture = capture
+        self._captured = deque()
+
+        # reader of the port in streaming mode, and the ring of pushed packets
+        self._demux = None
+        self.stream_packets = None
+
+        # packets set aside by the wait primitives, oldest first
+        self._held = deque(maxlen=_HELD_PACKETS)
+
+        # initialize RFM69 module
+        t_start = time.perf_counter()
+        while time.perf_counter() - t_start < 10:
+            time.sleep(0.1)     # Hardware deceleration factor
+            if self._init_rf_module():
+                break
+        else:
+            raise TimeoutError("Could not connect to RFM69 device!")
+        self._negotiate(self.get_capabilities(), framed)
+
+    def _transact(self, command, reply):
+        """Send a command frame and decode its reply, for both SET-type and GET-type functions.
+        Outside a pipeline, the transaction is stop-and-wait and the input buffer is flushed afterwards.
+
+        :param command: complete command frame (bytes).
+        :param reply: Reply describing the reply frame of the command.
+        :return: the decoded reply, or a PendingReply while a command pipeline is active.
+        """
+
+        command = self._encode(command)
+        with self._lock:
+            if self._pipeline is not None:
+                return self._pipeline.submit(command, reply)
+
+            metrics = self.metrics
+            if metrics is not None:
+                started = time.perf_counter()
+            self._write_command(command, reply)
+            recv = self._read_reply(reply)
+            if metrics is not None:
+                metrics.record(command[1], len(command), recv, reply, time.perf_counter() - started)
+            if self._demux is None:
+                self.reset_input_buffer()
+            elif reply.need(recv):
+                self._discard_input()
+        return reply.decode(recv)
+
+    def _completed(self, value):
+        with self._lock:
+            if self._pipeline is not None:
+                return PendingReply.resolved(value)
+        return value
+
+    def _write_command(self, command, reply):
+        """Write a command frame whose reply will be read with _read_reply()."""
+
+        if self._demux is not None:
+            self._demux.expect(reply)
+        if self.capture is not None:
+            self.capture.command(command[1], command)
+            self._captured.append(command[1])
+        self.write(command)
+
+    def _read_reply(self, reply):
+        """Read exactly one reply frame from the serial port, or from the demultiplexer in streaming mode.
+
+        :param reply: Reply describing the expected frame.
+        :return: the raw reply bytes, which are incomplete if the port timed out.
+        """
+
+        if self._demux is not None:
+            recv = self._demux.read_reply(self.timeout)
+        else:
+            recv = b''
+            missing = reply.need(recv)
+            while missing:
+                chunk = self.read(missing)
+                if not chunk:
+                    break
+                recv += chunk
+                missing = reply.need(recv)
+        if self.capture is not None:
+            self._capture_reply(recv)
+        return recv
+
+    def _capture_reply(self, recv):
+        # a reply answers the oldest captured command
+        self.capture.reply(self._captured.popleft() if self._captured else None, recv)
+
+    def _discard_input(self):
+        """Drop received bytes after a reply time-out, so that the next reply starts afresh."""
+
+        self._captured.clear()
+        if self._demux is not None:
+            self._demux.discard()
         else:
+            self.reset_input_buffer()
+
+    def close(self):
+        if getattr(self, '_demux', None) is not None:
+            self._demux.stop()
+            self._demux = None
+        if getattr(self, '_own_capture', False) and not self.capture.closed:
+            self.capture.close()
+        super(Rfm69SerialDevice, self).close()
+
+    @property
+    def streaming(self):
+        """True while the bridge is in streaming mode"""
+        return self._demux is not None
+
+    def start_streaming(self, auto_ack=False, capacity=64, overflow=DROP_OLDEST):
+        """Switch the bridge to streaming mode, in which received packets are pushed to the host as they arrive.
+        The firmware re-arms RX after every packet by itself, so receive_done()/get_rx_data()/begin_receive()
+        polling is no longer needed; take packets with recv_packet() instead. A reader thread owns the serial port
+        while streaming: it queues pushed packets in stream_packets (a PacketRing) and hands replies over to the
+        other commands, which keep working as usual.
+
+        :param auto_ack: let the firmware answer ACK requests with an empty ACK. The host cannot send_ACK() a
+            pushed packet, RX has been re-armed by the time it is delivered.
+        :param capacity: size of the packet ring.
+        :param overflow: overflow policy of the ring, DROP_OLDEST or DROP_NEWEST.
+        :return: True if streaming mode is on, False if the firmware does not support it.
+        """
+
+        with self._lock:
+            if self._pipeline is not None:
+                raise RuntimeError("streaming mode cannot be switched inside a command pipeline")
+            if self._demux is not None:
+                return True
+            if not self.capabilities & CAP_STREAMING:
+                return False
+
+            self.reset_input_buffer()
+            self.stream_packets = None
+            self._demux = StreamDemultiplexer(self, capacity, overflow).start()
+            mode = STREAM_ENABLE | (STREAM_AUTO_ACK if auto_ack else 0)
+            if self._transact(self._command(SET_RX_MODE, mode), ACK_REPLY):
+                self.stream_packets = self._demux.packets
+                return True
+            self._demux.stop()
+            self._demux = None
             return False
+
+    def stop_streaming(self):
+        """Leave streaming mode. Packets already pushed can still be taken with recv_packet().
+
+        :return: True if the bridge acknowledged, False otherwise.
+        """
+
+        with self._lock:
+            if self._pipeline is not None:
+                raise RuntimeError("streaming mode cannot be switched inside a command pipeline")
+            if self._demux is None:
+                return True
+            stopped = self._transact(self._command(SET_RX_MODE, 0x00), ACK_REPLY)
+            self._demux.stop()
+            self._demux = None
+            self.reset_input_buffer()
+        return stopped
+
+    def _reap_stream(self):
+        """Leave streaming mode if the reader thread stopped by itself, e.g. on a serial error, which is raised.
+        Packets already pushed can still be taken with recv_packet()."""
+
+        with self._lock:
+            demux = self._demux
+            if demux is None or demux.is_running:
+                return
+            self._demux = None
+        if demux.error is not None:
+            raise demux.error
+
+    def recv_packet(self, timeout=None):
+        """Wait for the next packet pushed in streaming mode. Packets set aside by wait_for_packet() and
+        wait_for_ack() are returned first.
+
+        :param timeout: maximum waiting time in seconds, None waits until a packet arrives or streaming stops.
+        :return: RFM69Packet carrying sender, target, RSSI and ACK-requested flag, or None on time-out.
+        """
+
+        if self._held:
+            return self._held.popleft()
+        if self.stream_packets is None:
+            raise RuntimeError("streaming mode is not active")
+        return self.stream_packets.get(timeout)
+
+    def wait_for_packet(self, timeout=None, sender=None):
+        """Wait for the next received packet without busy-polling the bridge.
+        In streaming mode, the wait blocks on the packets the bridge pushes (the reader thread sleeps in select() on
+        the port until the bridge writes), so an idle wait costs neither CPU nor serial traffic and a packet is
+        returned as soon as it arrives. Otherwise the bridge is polled (poll_packet(), or receive_done() and
+        get_rx_data() on older firmware) at intervals doubling from 0.5 ms to 10 ms while nothing arrives; polling
+        arms RX, there is no need to call begin_receive() first.
+        Packets of other senders are set aside, later wait_for_packet() and recv_packet() calls return them first.
+
+        :param timeout: maximum waiting time in seconds, None waits forever.
+        :param sender: only return a packet sent by this address, None for any sender.
+        :return: RFM69Packet, None on time-out.
+        """
+        return self._wait(timeout, lambda packet: sender is None or packet.sender == sender)
+
+    def wait_for_ack(self, addr, timeout):
+        """Wait for the ACK of node @addr to a packet sent with an ACK request (send_msg(..., ack_request=True)).
+        In streaming mode the bridge pushes ACKs like packets and the wait blocks on them as wait_for_packet() does
+        (firmware older than protocol version 2 does not flag ACKs, any packet of @addr is taken for one).
+        Otherwise ACK_received() is polled at intervals doubling from 0.5 ms to 10 ms.
+
+        :param addr: address of the node expected to acknowledge.
+        :param timeout: maximum waiting time in seconds.
+        :return: True if the ACK arrived in time, False otherwise.
+        """
+
+        if self._demux is None:
+            return bool(self._poll_until(lambda: self.ACK_received(addr), timeout))
+        if self.protocol_version >= 2:
+            return self._wait(timeout, lambda packet: packet.sender == addr and packet.ack_received) is not None
+        return self._wait(timeout, lambda packet: packet.sender == addr) is not None
+
+    def send_and_wait_reply(self, target_addr, msg, timeout=1.0, reliable=False):
+        """Send a request and wait for the reply of its target, e.g. to ping a node or query a sensor.
+
+        :param target_addr: address of the node to query.
+        :param msg: request message, see send_msg().
+        :param timeout: maximum time (in seconds) to wait for the reply once the request is sent.
+        :param reliable: send the request with send_msg_with_retry() instead of send_msg().
+        :return: RFM69Packet of the reply, None if the request could not be sent or no reply came in time.
+        """
+
+        sent = self.send_msg_with_retry(target_addr, msg) if reliable else self.send_msg(target_addr, msg)
+        if not sent:
+            return None
+        return self.wait_for_packet(timeout, sender=target_addr)
+
+    def _wait(self, timeout, match):
+        """Return the first packet satisfying @match: a packet set aside by an earlier wait, a pushed packet in
+        streaming mode, or a polled one. Other packets received meanwhile are set aside."""
+
+        if self._pipeline is not None:
+            raise RuntimeError("cannot wait for packets inside a command pipeline")
+        for packet in self._held:
+            if match(packet):
+                self._held.remove(packet)
+                return packet
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ring = self.stream_packets if self._demux is not None else None
+            if ring is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                return self._poll_until(partial(self._poll_matching, match), remaining)
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            packet = ring.get(remaining)
+            if packet is None:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                self._reap_stream()
+                continue        # streaming stopped, poll from now on
+            if match(packet):
+                return packet
+            self._held.append(packet)
+
+    def _poll_matching(self, match):
+        # fetch every packet the bridge holds, the first one satisfying @match ends the poll
+        while True:
+            if self.capabilities & CAP_POLL_PACKET:
+                packet = self.poll_packet()
+            else:
+                with self._lock:
+                    packet = self.get_rx_data() if self.receive_done() else None
+                    if packet is not None:
+                        self.begin_receive()
+            if packet is None or match(packet):
+                return packet
+            self._held.append(packet)
+
+    def _poll_until(self, attempt, timeout):
+        """Call @attempt until it returns a true value or @timeout (seconds, None for no limit) elapses, sleeping
+        between two attempts for intervals doubling from _WAIT_MIN_INTERVAL to _WAIT_MAX_INTERVAL.
+
+        :return: the last result of @attempt.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = _WAIT_MIN_INTERVAL
+        while True:
+            result = attempt()
+            if result:
+                return result
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return result
+            time.sleep(interval if remaining is None else min(interval, remaining))
+            interval = min(interval * 2, _WAIT_MAX_INTERVAL)
+
+    def pipeline(self, depth=8, window=SERIAL_RX_BUFFER):
+        """Create a command pipeline which keeps up to @depth commands, and up to @window bytes of them, in flight.
+        Use the returned object as a context manager: inside the with-block every command method returns a
+        PendingReply instead of blocking for its reply, and all replies are collected when the block exits.
+
+        Example::
+
+            with dev.pipeline(depth=16):
+                freq = dev.get_frequency()
+                sent = [dev.send_msg(2, "hello") for _ in range(10)]
+            print(freq.result(), all(s.result() for s in sent))
+
+        :param depth: maximum number of commands awaiting a reply.
+        :param window: maximum number of command bytes awaiting a reply; the default suits the 64-byte serial
+            receive buffer of AVR boards, boards with larger buffers can take more.
+        :return: CommandPipeline bound to this device.
+        """
+
+        return CommandPipeline(self, depth, window)
+
+    def dump_registers(self, refresh=False):
+        """Take a snapshot of the whole RFM69 register map (0x01 - 0x71, the FIFO is left alone).
+        The map is read from the module in a single burst read, which also refreshes the register shadow.
+        With bridge firmware lacking burst reads, shadowed configuration registers are taken from memory and the
+        others are read one by one in a command pipeline.
+
+        :param refresh: if True, drop the shadow first so that every register is read from the module.
+        :return: dict {register address: value}; registers that could not be read are missing.
+        """
+
+        with self._lock:
+            if self._pipeline is not None:
+                raise RuntimeError("dump_registers() cannot be used inside a command pipeline")
+            if refresh:
+                self._registers.invalidate()
+            values = self.read_registers(1, REG_TESTAFC)
+            if values is not None:
+                return dict(enumerate(values, 1))
+            with self.pipeline():
+                pending = [(addr, self.read_register(_BYTE_VALUES[addr])) for addr in range(1, REG_TESTAFC + 1)]
+        return {addr: value.result()[0] for addr, value in pending if value.result() is not None}
+
+    def load_registers(self, registers, include_volatile=False):
+        """Restore a register snapshot taken by dump_registers(), e.g. to apply a saved radio profile.
+        Consecutive registers are written in burst writes, in ascending address order. Status and mode registers
+        (see VOLATILE_REGISTERS) and reserved addresses (RESERVED_REGISTERS) are skipped: writing them back could
+        switch the mode, clear the FIFO or start a measurement.
+
+        :param registers: dict {register address: value}.
+        :param include_volatile: write the volatile and reserved registers of @registers as well.
+        :return: True if every register was written, False otherwise.
+        """
+
+        addrs = sorted(addr for addr in registers if include_volatile or
+                       (addr not in VOLATILE_REGISTERS and addr not in RESERVED_REGISTERS))
+        runs = []
+        for addr in addrs:
+            if runs and runs[-1][0] + len(runs[-1][1]) == addr:
+                runs[-1][1].append(registers[addr])
+            else:
+                runs.append((addr, bytearray((registers[addr],))))
+        with self.pipeline():
+            pending = [self.write_registers(start, data) for start, data in runs]
+        return all(written.result() for written in pending)
+
+    def refresh_registers(self):
+        """Re-read the whole register map from the module, see dump_registers()."""
+        return self.dump_registers(refresh=True)
+
+    def get_rx_data_into(self, buffer):
+        """Request received data from RFM69 device and store the payload in a caller-owned buffer.
+        Allocation-free alternative to get_rx_data() for receive loops. This call always blocks; an active
+        command pipeline is drained first.
+
+        :param buffer: writable bytes-like object (e.g. bytearray(61)) receiving the payload from offset 0.
+        :return: tuple (sender address, payload length) if success, None otherwise.
+        """
+
+        view = memoryview(buffer)
+        with self._lock:
+            if self._demux is not None:
+                raise RuntimeError("get_rx_data_into() is not available in streaming mode")
+            if self._pipeline is not None:
+                self._pipeline.flush()
+
+            metrics = self.metrics
+            if metrics is not None:
+                started = time.perf_counter()
+            command = self._command(GET_RX_DATA)
+            self._write_command(command, _RX_DATA_REPLY)
+            header = self.read(3)     # status, sender, length
+            if len(header) < 3 or header[0:1] != OK_CODE:
+                if metrics is not None:
+                    metrics.record_outcome(command[1], len(command), len(header),
+                                           None if _RX_DATA_REPLY.need(header) else False,
+                                           time.perf_counter() - started)
+                if self.capture is not None:
+                    self._capture_reply(header)
+                self.reset_input_buffer()
+                return None
+
+            msg_len = header[2]
+            if msg_len > len(view):
+                if metrics is not None:
+                    metrics.record_outcome(command[1], len(command), len(header), True, time.perf_counter() - started)
+                if self.capture is not None:
+                    self._capture_reply(header)
+                self.reset_input_buffer()
+                raise ValueError("buffer too small for a %d-byte payload" % msg_len)
+            received = self.readinto(view[:msg_len]) if msg_len else 0
+            if metrics is not None:
+                metrics.record_outcome(command[1], len(command), len(header) + received,
+                                       True if received == msg_len else None, time.perf_counter() - started)
+            if self.capture is not None:
+                self._capture_reply(header + view[:received])
+            if received < msg_len:
+                return None
+        return header[1], msg_len
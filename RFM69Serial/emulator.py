@@ -0,0 +1,862 @@
+# RFM69 Serial bridge emulator
+
+"""Pure-Python stand-in for the RFM69_Serial bridge firmware.
+
+The emulator answers the same opcode table as firmware/RFM69_Serial/RFM69_Serial.ino over a pseudo terminal, so
+an unmodified Rfm69SerialDevice can be opened on Rfm69SerialEmulator.port exactly like a real /dev/ttyACM* port.
+Emulated radios attached to the same RadioChannel can exchange packets with each other.
+
+Typical usage::
+
+    with Rfm69SerialEmulator() as bridge:
+        dev = Rfm69SerialDevice(port=bridge.port)
+        dev.is_device_connected()
+"""
+
+import os
+import random
+import select
+import threading
+import time
+import tty
+from collections import deque, namedtuple
+
+from RFM69Serial.protocol import *
+from RFM69Serial.registers import *
+
+# Constants and globals
+RFM69_FSTEP = 61.03515625
+RF69_BROADCAST_ADDR = 0
+RF69_915MHZ = 91
+SERIAL_MSG_SIZE = MAX_COMMAND_LEN    # size of SERIAL_MSG[] in the firmware
+FRAME_TIMEOUT = 0.05    # Serial.setTimeout() of the firmware, bounds the wait for the rest of a framed command
+MAX_DATA_LEN = 61       # RF69_MAX_DATA_LEN in the Arduino library
+
+# A frame on the air, as seen by every radio attached to the channel
+AirFrame = namedtuple('AirFrame', 'frf network sender target payload ack_requested ack_sent key')
+
+
+class RadioChannel:
+    """Shared air interface between emulated radios.
+    A frame transmitted by one radio is offered to every other radio attached to the same channel. Radios decide
+    themselves whether the frame is accepted (mode, frequency, network ID, encryption key and address filtering).
+
+    :param rssi: signal strength (dBm) reported by receivers for every delivered frame.
+    :param latency: time (in seconds) a transmission spends on the air before it is delivered.
+    :param loss: probability (0.0-1.0) that a receiver misses a transmitted frame.
+    :param interference: callable taking a frequency (Hz) and returning the signal strength (dBm) a receiver tuned
+        there measures between frames, None for a quiet band.
+    :param seed: seed of the channel's own random generator which draws the losses, for repeatable runs; None
+        seeds it from the system.
+    """
+
+    def __init__(self, rssi=-40, latency=0.0, loss=0.0, interference=None, seed=None):
+        self.rssi = rssi
+        self.latency = latency
+        self.loss = loss
+        self.interference = interference
+        self._random = random.Random(seed)
+        self._radios = []
+        self._lock = threading.Lock()
+
+    def attach(self, radio):
+        with self._lock:
+            if radio not in self._radios:
+                self._radios.append(radio)
+
+    def detach(self, radio):
+        with self._lock:
+            if radio in self._radios:
+                self._radios.remove(radio)
+
+    def transmit(self, source, frame):
+        """Deliver a frame from radio @source to every other attached radio."""
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            receivers = [radio for radio in self._radios if radio is not source]
+        for radio in receivers:
+            if not self.loss or self._random.random() >= self.loss:
+                radio.on_air(frame, self.rssi)
+
+
+class EmulatedRadio:
+    """Behavioural model of an RFM69HCW module driven by LowPowerLab's RFM69 library.
+    Method names follow the Arduino library (in snake case) so that the emulated request handler reads like
+    the firmware's switch statement. Received frame state uses the library's public member names.
+
+    :param channel: RadioChannel the radio transmits on and listens to, None for a radio on its own.
+    """
+
+    def __init__(self, channel=None):
+        self.channel = channel
+        self.present = True         # set to False to emulate a bridge whose SPI radio does not answer
+        self.noise_floor = -100     # RSSI (dBm) reported while no frame is being received
+        self.temperature = 25       # die temperature (degC) reported by readTemperature()
+
+        self.regs = reset_register_map()
+        self.address = 1
+        self.cs_pin = 0
+        self.int_pin = 1
+        self.power_level = 31
+        self.is_rfm69hw = False
+        self.promiscuous = False
+
+        # received frame state
+        self.DATA = bytearray(MAX_DATA_LEN + 1)
+        self.DATALEN = 0
+        self.SENDERID = 0
+        self.TARGETID = 0
+        self.PAYLOADLEN = 0
+        self.ACK_REQUESTED = 0
+        self.ACK_RECEIVED = 0
+        self.RSSI = 0
+
+        self._lock = threading.RLock()
+        self._rx_event = threading.Condition(self._lock)
+        self.regs[REG_RSSIVALUE] = (-2 * self.noise_floor) & 0xFF
+
+        if channel is not None:
+            channel.attach(self)
+
+    @property
+    def mode(self):
+        return self.regs[REG_OPMODE] & RF_OPMODE_MASK
+
+    @property
+    def network_id(self):
+        return self.regs[REG_SYNCVALUE2]
+
+    @property
+    def frf(self):
+        return (self.regs[REG_FRFMSB] << 16) | (self.regs[REG_FRFMID] << 8) | self.regs[REG_FRFLSB]
+
+    @property
+    def aes_key(self):
+        if self.regs[REG_PACKETCONFIG2] & 0x01:
+            return bytes(self.regs[REG_AESKEY1:REG_AESKEY1 + 16])
+        return None
+
+    def set_mode(self, mode):
+        with self._lock:
+            self.regs[REG_OPMODE] = (self.regs[REG_OPMODE] & ~RF_OPMODE_MASK & 0xFF) | mode
+
+    # ***** RFM69 library API *****
+
+    def initialize(self, freq_band, node_id, network_id):
+        with self._lock:
+            self.regs[:] = reset_register_map()
+            self.regs[REG_RSSIVALUE] = (-2 * self.noise_floor) & 0xFF
+            self.regs[REG_SYNCVALUE2] = network_id & 0xFF
+            self.address = node_id
+            self.encrypt(None)
+            self.set_high_power(self.is_rfm69hw)
+            self.set_mode(RF_OPMODE_STANDBY)
+            return self.present
+
+    def set_address(self, addr):
+        self.address = addr
+
+    def set_network(self, network_id):
+        self.write_reg(REG_SYNCVALUE2, network_id)
+
+    def receive_begin(self):
+        with self._lock:
+            self.DATALEN = 0
+            self.SENDERID = 0
+            self.TARGETID = 0
+            self.PAYLOADLEN = 0
+            self.ACK_REQUESTED = 0
+            self.ACK_RECEIVED = 0
+            self.RSSI = 0
+            self.regs[REG_IRQFLAGS2] &= ~0x04 & 0xFF
+            self.set_mode(RF_OPMODE_RECEIVER)
+
+    def receive_done(self):
+        with self._lock:
+            if self.mode == RF_OPMODE_RECEIVER and self.PAYLOADLEN > 0:
+                self.set_mode(RF_OPMODE_STANDBY)
+                return True
+            elif self.mode == RF_OPMODE_RECEIVER:
+                return False
+            self.receive_begin()
+            return False
+
+    def send(self, to_address, buffer, request_ack=False):
+        # canSend() only succeeds from an idle RX state, any pending frame is dropped by receiveBegin()
+        with self._lock:
+            self.receive_begin()
+            self.set_mode(RF_OPMODE_STANDBY)
+        self._send_frame(to_address, buffer, request_ack, False)
+
+    def send_with_retry(self, to_address, buffer, retries=2, retry_wait_time=40):
+        for _ in range(retries + 1):
+            self.send(to_address, buffer, True)
+            deadline = time.perf_counter() + retry_wait_time / 1000
+            with self._lock:
+                while True:
+                    if self.ack_received(to_address):
+                        return True
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._rx_event.wait(remaining)
+        return False
+
+    def ack_received(self, from_node_id):
+        with self._lock:
+            if self.receive_done():
+                return (self.SENDERID == from_node_id or from_node_id == RF69_BROADCAST_ADDR) and \
+                       bool(self.ACK_RECEIVED)
+            return False
+
+    def ack_requested(self):
+        with self._lock:
+            return bool(self.ACK_REQUESTED) and self.TARGETID == self.address
+
+    def send_ack(self, buffer=b''):
+        with self._lock:
+            self.ACK_REQUESTED = 0
+            sender = self.SENDERID
+            rssi = self.RSSI
+            self.set_mode(RF_OPMODE_STANDBY)
+        self._send_frame(sender, buffer, False, True)
+        with self._lock:
+            self.SENDERID = sender
+            self.RSSI = rssi
+
+    def get_frequency(self):
+        return int(RFM69_FSTEP * self.frf)
+
+    def set_frequency(self, freq_hz):
+        frf = int(freq_hz / RFM69_FSTEP)
+        with self._lock:
+            self.regs[REG_FRFMSB] = (frf >> 16) & 0xFF
+            self.regs[REG_FRFMID] = (frf >> 8) & 0xFF
+            self.regs[REG_FRFLSB] = frf & 0xFF
+
+    def encrypt(self, key):
+        with self._lock:
+            self.set_mode(RF_OPMODE_STANDBY)
+            if key is not None:
+                self.regs[REG_AESKEY1:REG_AESKEY1 + 16] = bytes(key[:16]).ljust(16, b'\x00')
+            self.regs[REG_PACKETCONFIG2] = (self.regs[REG_PACKETCONFIG2] & 0xFE) | (0x01 if key is not None else 0x00)
+
+    def set_cs(self, pin):
+        self.cs_pin = pin
+
+    def set_irq(self, pin):
+        self.int_pin = pin
+        return True
+
+    def read_rssi(self, force_trigger=False):
+        return -(self.regs[REG_RSSIVALUE] >> 1)
+
+    def spy_mode(self, on_off=True):
+        self.promiscuous = bool(on_off)
+
+    def set_high_power(self, on_off=True):
+        with self._lock:
+            self.is_rfm69hw = bool(on_off)
+            self.regs[REG_OCP] = 0x0F if self.is_rfm69hw else 0x1A
+            self.set_power_level(self.power_level)
+
+    def set_power_level(self, level):
+        with self._lock:
+            self.power_level = min(level, 31)
+            self.regs[REG_PALEVEL] = (self.regs[REG_PALEVEL] & 0xE0) | self.power_level
+
+    def get_power_level(self):
+        return self.power_level
+
+    def sleep(self):
+        self.set_mode(RF_OPMODE_SLEEP)
+
+    def read_temperature(self, cal_factor=0):
+        self.set_mode(RF_OPMODE_STANDBY)
+        self.regs[REG_TEMP2] = ~(self.temperature + 90) & 0xFF
+        return (self.temperature + cal_factor) & 0xFF
+
+    def rc_calibration(self):
+        self.regs[REG_OSC1] = 0x41
+
+    def set_300kbps(self):
+        with self._lock:
+            for addr, value in ((REG_DATAMODUL, 0x00), (REG_BITRATEMSB, 0x00), (REG_BITRATELSB, 0x6B),
+                                (REG_FDEVMSB, 0x13), (REG_FDEVLSB, 0x33), (REG_RXBW, 0xE0), (REG_AFCBW, 0xE0),
+                                (REG_PACKETCONFIG1, 0xD0)):
+                self.regs[addr] = value
+
+    def set_lna(self, new_reg):
+        with self._lock:
+            old_reg = self.regs[REG_LNA]
+            self.regs[REG_LNA] = (new_reg & 0x07) | (old_reg & 0xF8)
+            return old_reg
+
+    def read_reg(self, addr):
+        if not self.present:
+            return 0x00
+        return self.regs[addr & 0x7F]
+
+    def write_reg(self, addr, value):
+        with self._lock:
+            self.regs[addr & 0x7F] = value & 0xFF
+
+    def sample_rssi(self):
+        """Measure the signal strength on the current frequency into REG_RSSIVALUE, as continuous RSSI sampling in
+        receive mode does: the noise floor, or the channel's interference if stronger.
+
+        :return: REG_RSSIVALUE (-2 * RSSI).
+        """
+
+        rssi = self.noise_floor
+        interference = self.channel.interference if self.channel is not None else None
+        if interference is not None:
+            rssi = max(rssi, interference(self.get_frequency()))
+        value = min(max(int(round(-2 * rssi)), 0), 0xFF)
+        with self._lock:
+            self.regs[REG_RSSIVALUE] = value
+        return value
+
+    # ***** Air interface *****
+
+    def _send_frame(self, to_address, buffer, request_ack, send_ack):
+        payload = bytes(buffer[:MAX_DATA_LEN])
+        self.set_mode(RF_OPMODE_STANDBY)
+        if self.channel is not None and self.present:
+            frame = AirFrame(self.frf, self.network_id, self.address, to_address, payload,
+                             bool(request_ack), bool(send_ack), self.aes_key)
+            self.channel.transmit(self, frame)
+
+    def on_air(self, frame, rssi):
+        """Offer a frame to this radio, mirroring the library's interrupt handler.
+
+        :return: True if the frame was accepted into DATA, False otherwise.
+        """
+
+        with self._lock:
+            if not self.present or self.mode != RF_OPMODE_RECEIVER:
+                return False
+            if frame.frf != self.frf or frame.network != self.network_id or frame.key != self.aes_key:
+                return False
+            if not (self.promiscuous or frame.target == self.address or frame.target == RF69_BROADCAST_ADDR):
+                return False
+
+            self.DATA[:len(frame.payload)] = frame.payload
+            self.DATA[len(frame.payload)] = 0
+            self.DATALEN = len(frame.payload)
+            self.PAYLOADLEN = self.DATALEN + 3
+            self.SENDERID = frame.sender
+            self.TARGETID = frame.target
+            self.ACK_RECEIVED = int(frame.ack_sent)
+            self.ACK_REQUESTED = int(frame.ack_requested)
+            self.RSSI = rssi
+            self.regs[REG_RSSIVALUE] = (-2 * rssi) & 0xFF
+            self.regs[REG_IRQFLAGS2] |= 0x04
+            self._rx_event.notify_all()
+            return True
+
+
+class Rfm69SerialEmulator:
+    """Emulated RFM69 Serial bridge device (Arduino/Teensy board plus RFM69HCW module).
+    The emulator serves the firmware's command protocol on the slave side of a pseudo terminal. Commands are
+    delimited the same way as the firmware does: framed commands by their length field, '$' commands by the
+    opcode's length or, for opcodes of unknown length, by the receive buffer running empty.
+
+    :param channel: RadioChannel shared with other emulated bridges, None for an isolated radio.
+    :param byte_delay: time (in seconds) spent per received byte of a '$' command, 0.002 matches the firmware's
+        receive loop. Framed commands are read without delay.
+    :param command_delay: processing time (in seconds) added before every reply.
+    :param radio: EmulatedRadio to drive, a new radio on @channel is created if omitted.
+    :param capabilities: capability flags reported to the host, None to emulate firmware predating the
+        capabilities query (and framed commands).
+    :param rx_queue_len: size of the received packet queue (RX_QUEUE_LEN, 4 on UNO boards).
+    """
+
+    def __init__(self, channel=None, byte_delay=0.0, command_delay=0.0, radio=None,
+                 capabilities=CAP_FRAMED | CAP_BURST_REGISTERS | CAP_STREAMING | CAP_POLL_PACKET | CAP_RX_QUEUE |
+                 CAP_TIMED_RETRY | CAP_RX_FILTER | CAP_SURVEY, rx_queue_len=16):
+        self.radio = radio if radio is not None else EmulatedRadio(channel)
+        self.byte_delay = byte_delay
+        self.command_delay = command_delay
+        self.capabilities = capabilities
+        self.stream_mode = 0
+        self.rx_queue_len = rx_queue_len
+        self.rx_overflow = 0
+        self._rx_queue = deque()
+
+        # receive filter: FILTER_* flags, minimum RSSI (as -RSSI), sender and target address sets
+        self.filter_flags = 0
+        self.filter_rssi = 0
+        self.filter_senders = bytes(ADDRESS_SET_LEN)
+        self.filter_targets = bytes(ADDRESS_SET_LEN)
+
+        self._serial_msg = bytearray(SERIAL_MSG_SIZE)
+        self._rx_buffer = bytearray()
+        self._master_fd = None
+        self._slave_fd = None
+        self._port = None
+        self._thread = None
+        self._running = threading.Event()
+
+        self._handlers = {
+            0x00: self._cmd_initialize,
+            0x01: self._cmd_set_address,
+            0x02: self._cmd_set_network,
+            0x03: self._cmd_send,
+            0x04: self._cmd_send_with_retry,
+            0x05: self._cmd_begin_receive,
+            0x06: self._cmd_receive_done,
+            0x07: self._cmd_ack_received,
+            0x08: self._cmd_ack_requested,
+            0x09: self._cmd_send_ack,
+            0x0A: self._cmd_get_frequency,
+            0x0B: self._cmd_set_frequency,
+            0x0C: self._cmd_encrypt,
+            0x0D: self._cmd_set_cs,
+            0x0E: self._cmd_set_irq,
+            0x0F: self._cmd_read_rssi,
+            0x10: self._cmd_spy_mode,
+            0x11: self._cmd_set_high_power,
+            0x12: self._cmd_set_power_level,
+            0x13: self._cmd_reserved,
+            0x14: self._cmd_get_power_level,
+            0x15: self._cmd_sleep,
+            0x16: self._cmd_read_temperature,
+            0x17: self._cmd_rc_calibration,
+            0x18: self._cmd_set_300kbps,
+            0x19: self._cmd_set_lna,
+            0x1A: self._cmd_read_reg,
+            0x1B: self._cmd_write_reg,
+            0x1C: self._cmd_read_regs,
+            0x1D: self._cmd_write_regs,
+            0x1E: self._cmd_get_rx_data,
+            0x1F: self._cmd_is_connected,
+            0x20: self._cmd_write_reg_pairs,
+            0x21: self._cmd_poll_packet,
+            0x22: self._cmd_stream,
+            0x23: self._cmd_drain,
+            0x24: self._cmd_capabilities,
+            0x25: self._cmd_send_with_retry_timed,
+            0x26: self._cmd_set_rx_filter,
+            0x27: self._cmd_survey,
+            0x74: self._cmd_echo,
+        }
+
+    @property
+    def port(self):
+        """Device path of the emulated serial port, pass it to Rfm69SerialDevice(port=...)"""
+        return self._port
+
+    @property
+    def is_running(self):
+        return self._running.is_set()
+
+    def start(self):
+        """Open the pseudo terminal and start serving commands on a background thread."""
+
+        if self.is_running:
+            return self
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        self._port = os.ttyname(self._slave_fd)
+        self._running.set()
+        self._thread = threading.Thread(target=self._serve, name="rfm69-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the pseudo terminal."""
+
+        if not self.is_running:
+            return
+        self._running.clear()
+        self._thread.join()
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+        self._master_fd = self._slave_fd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def handle(self, command):
+        """Execute one raw command frame as the firmware's requestHandler() would.
+
+        :param command: bytes received from the host for a single command, starting with '$'.
+        :return: reply bytes to be written back to the host (may be empty).
+        """
+
+        length = min(len(command), SERIAL_MSG_SIZE)
+        self._serial_msg[:length] = command[:length]
+        if self.command_delay:
+            time.sleep(self.command_delay)
+        handler = self._handlers.get(self._serial_msg[1])
+        if handler is None or (self._serial_msg[1] == 0x24 and self.capabilities is None):
+            return KO_CODE
+        return handler(self._serial_msg, length)
+
+    # ***** Serial port loop *****
+
+    def _readable(self, timeout):
+        try:
+            return bool(select.select([self._master_fd], [], [], timeout)[0])
+        except (OSError, ValueError):
+            return False
+
+    def _available(self):
+        # Serial.available(): move whatever the host has written into the UART receive buffer
+        if not self._rx_buffer:
+            while self._readable(0):
+                chunk = os.read(self._master_fd, 4096)
+                if not chunk:
+                    break
+                self._rx_buffer += chunk
+        return len(self._rx_buffer)
+
+    def _read_command(self):
+        # Same delimiting rule as loop(): read up to the command length, or while bytes are available
+        command = bytearray()
+        expected = 0
+        while (expected == 0 or len(command) < expected) and len(command) < SERIAL_MSG_SIZE and self._available():
+            if self.byte_delay:
+                time.sleep(self.byte_delay)
+            command.append(self._rx_buffer.pop(0))
+            if expected == 0:
+                expected = command_length(command, len(command))
+        return bytes(command)
+
+    def _read_frame(self):
+        # Same as readFrame(): header, then arguments, each read with a time-out rather than a per-byte delay
+        frame = bytearray()
+        expected = 3
+        while len(frame) < expected:
+            if not self._rx_buffer and not self._readable(FRAME_TIMEOUT):
+                return None
+            self._available()
+            missing = expected - len(frame)
+            frame += self._rx_buffer[:missing]
+            del self._rx_buffer[:missing]
+            if len(frame) == 3:
+                if frame[2] > SERIAL_MSG_SIZE - 2:
+                    return None
+                expected += frame[2]
+        return unframe_command(frame)
+
+    def _framing(self):
+        return self.capabilities is not None and self.capabilities & CAP_FRAMED
+
+    def _packet_flags(self, auto_ack):
+        # Same as packetFlags()
+        flags = PACKET_ACK_RECEIVED if self.radio.ACK_RECEIVED else 0
+        if not self.radio.ack_requested():
+            return flags
+        return flags | (PACKET_ACK_REQUESTED | PACKET_ACK_SENT if auto_ack else PACKET_ACK_REQUESTED)
+
+    def _packet_record(self, flags):
+        # sender, target, flags, -RSSI, payload length, payload of the received packet
+        radio = self.radio
+        return bytes((radio.SENDERID & 0xFF, radio.TARGETID & 0xFF, flags, -radio.RSSI & 0xFF, radio.DATALEN)) + \
+            bytes(radio.DATA[:radio.DATALEN])
+
+    def _accept_packet(self):
+        # Same as acceptPacket()
+        radio = self.radio
+        sender, target = radio.SENDERID & 0xFF, radio.TARGETID & 0xFF
+        if self.filter_flags & FILTER_SENDERS and not self.filter_senders[sender >> 3] & (1 << (sender & 7)):
+            return False
+        if self.filter_flags & FILTER_TARGETS and not self.filter_targets[target >> 3] & (1 << (target & 7)):
+            return False
+        if self.filter_flags & FILTER_RSSI and radio.RSSI < -self.filter_rssi:
+            return False
+        return True
+
+    def _release_packet(self, flags, ack_payload=b''):
+        # Same as releasePacket()
+        if flags & PACKET_ACK_SENT:
+            self.radio.send_ack(ack_payload)
+        self.radio.receive_begin()
+
+    def _background_receive(self):
+        # Same as pushPacket()/queuePacket(), run from the loop in streaming and queue mode
+        radio = self.radio
+        with radio._lock:
+            if not radio.receive_done():
+                return
+            if not self._accept_packet():
+                flags = 0
+            elif self.stream_mode & STREAM_ENABLE:
+                flags = self._packet_flags(self.stream_mode & STREAM_AUTO_ACK)
+                os.write(self._master_fd, PUSH_CODE + self._packet_record(flags))
+            elif len(self._rx_queue) == self.rx_queue_len:
+                flags = 0
+                self.rx_overflow = min(self.rx_overflow + 1, 0xFFFF)
+            else:
+                flags = self._packet_flags(self.stream_mode & STREAM_AUTO_ACK)
+                self._rx_queue.append(self._packet_record(flags))
+        self._release_packet(flags)
+
+    def _serve(self):
+        while self._running.is_set():
+            streaming = self.stream_mode & (STREAM_ENABLE | STREAM_QUEUE)
+            if streaming:
+                self._background_receive()
+            # the firmware polls receiveDone() continuously in streaming and queue mode, poll every millisecond
+            if not self._rx_buffer and not self._readable(0.001 if streaming else 0.05):
+                continue
+            try:
+                if self._available() and self._rx_buffer[0] == FRAME_CODE[0] and self._framing():
+                    command = self._read_frame()
+                    if command is None:
+                        os.write(self._master_fd, KO_CODE)
+                        continue
+                else:
+                    command = self._read_command()
+            except OSError:
+                continue
+            if not command:
+                continue
+            reply = self.handle(command)
+            if reply:
+                os.write(self._master_fd, reply)
+
+    # ***** Request handlers, one per firmware opcode *****
+
+    def _cmd_initialize(self, msg, length):
+        self.radio.set_cs(msg[4])
+        self.radio.set_irq(msg[5])
+        if self.radio.initialize(RF69_915MHZ, msg[2], msg[3]):
+            self.radio.set_high_power()
+            return OK_CODE
+        return KO_CODE
+
+    def _cmd_set_address(self, msg, length):
+        self.radio.set_address(msg[2])
+        return OK_CODE
+
+    def _cmd_set_network(self, msg, length):
+        self.radio.set_network(msg[2])
+        return OK_CODE
+
+    def _cmd_send(self, msg, length):
+        if length > 5:
+            self.radio.send(msg[2], msg[5:5 + msg[4]], msg[3] != 0)
+            return OK_CODE
+        return KO_CODE
+
+    def _cmd_send_with_retry(self, msg, length):
+        if length > 6:
+            if self.radio.send_with_retry(msg[2], msg[6:6 + msg[5]], msg[3], msg[4]):
+                return OK_CODE
+        return KO_CODE
+
+    def _cmd_send_with_retry_timed(self, msg, length):
+        # sendWithRetry() loop of the library, reporting which attempt got acknowledged and its round-trip time
+        if length <= 6:
+            return KO_CODE
+        radio = self.radio
+        for attempt in range(msg[3] + 1):
+            radio.send(msg[2], msg[6:6 + msg[5]], True)
+            sent_time = time.perf_counter()
+            deadline = sent_time + msg[4] / 1000
+            with radio._lock:
+                while True:
+                    if radio.ack_received(msg[2]):
+                        rtt = int((time.perf_counter() - sent_time) * 1000)
+                        return OK_CODE + bytes((attempt, min(rtt, 255)))
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    radio._rx_event.wait(remaining)
+        return KO_CODE
+
+    def _cmd_begin_receive(self, msg, length):
+        self.radio.receive_begin()
+        return OK_CODE
+
+    def _cmd_receive_done(self, msg, length):
+        return OK_CODE if self.radio.receive_done() else KO_CODE
+
+    def _cmd_ack_received(self, msg, length):
+        return OK_CODE if self.radio.ack_received(msg[2]) else KO_CODE
+
+    def _cmd_ack_requested(self, msg, length):
+        return OK_CODE if self.radio.ack_requested() else KO_CODE
+
+    def _cmd_send_ack(self, msg, length):
+        if length > 3:
+            self.radio.send_ack(msg[3:3 + msg[2]])
+            return OK_CODE
+        return KO_CODE
+
+    def _cmd_get_frequency(self, msg, length):
+        return OK_CODE + bytes([self.radio.read_reg(REG_FRFMSB),
+                                self.radio.read_reg(REG_FRFMID),
+                                self.radio.read_reg(REG_FRFLSB)])
+
+    def _cmd_set_frequency(self, msg, length):
+        self.radio.set_frequency(int.from_bytes(msg[2:6], 'little'))
+        return OK_CODE
+
+    def _cmd_encrypt(self, msg, length):
+        self.radio.encrypt(bytes(msg[3:19]) if msg[2] else None)
+        return OK_CODE
+
+    def _cmd_set_cs(self, msg, length):
+        self.radio.set_cs(msg[2])
+        return OK_CODE
+
+    def _cmd_set_irq(self, msg, length):
+        self.radio.set_irq(msg[2])
+        return OK_CODE
+
+    def _cmd_read_rssi(self, msg, length):
+        return OK_CODE + bytes([-self.radio.read_rssi(msg[2]) & 0xFF])
+
+    def _cmd_spy_mode(self, msg, length):
+        self.radio.spy_mode(msg[2])
+        return OK_CODE
+
+    def _cmd_set_high_power(self, msg, length):
+        self.radio.set_high_power(msg[2])
+        return OK_CODE
+
+    def _cmd_set_power_level(self, msg, length):
+        self.radio.set_power_level(msg[2])
+        return OK_CODE
+
+    def _cmd_reserved(self, msg, length):
+        # opcode 0x13 is a placeholder in the firmware and sends no reply at all
+        return b''
+
+    def _cmd_get_power_level(self, msg, length):
+        return OK_CODE + bytes([self.radio.get_power_level() & 0xFF])
+
+    def _cmd_sleep(self, msg, length):
+        self.radio.sleep()
+        return OK_CODE
+
+    def _cmd_read_temperature(self, msg, length):
+        return OK_CODE + bytes([self.radio.read_temperature(msg[2])])
+
+    def _cmd_rc_calibration(self, msg, length):
+        self.radio.rc_calibration()
+        return OK_CODE
+
+    def _cmd_set_300kbps(self, msg, length):
+        self.radio.set_300kbps()
+        return OK_CODE
+
+    def _cmd_set_lna(self, msg, length):
+        return OK_CODE + bytes([self.radio.set_lna(msg[2])])
+
+    def _cmd_read_reg(self, msg, length):
+        return OK_CODE + bytes([self.radio.read_reg(msg[2])])
+
+    def _cmd_write_reg(self, msg, length):
+        self.radio.write_reg(msg[2], msg[3])
+        return OK_CODE
+
+    def _cmd_read_regs(self, msg, length):
+        start, count = msg[2], msg[3]
+        if count == 0 or start + count > REG_MAP_SIZE:
+            return KO_CODE
+        return OK_CODE + bytes(self.radio.read_reg(start + i) for i in range(count))
+
+    def _cmd_write_regs(self, msg, length):
+        start, count = msg[2], msg[3]
+        if count == 0 or start + count > REG_MAP_SIZE or length != 4 + count:
+            return KO_CODE
+        for i in range(count):
+            self.radio.write_reg(start + i, msg[4 + i])
+        return OK_CODE
+
+    def _cmd_write_reg_pairs(self, msg, length):
+        count = msg[2]
+        if count == 0 or count > MAX_REGISTER_PAIRS or length != 3 + 2 * count:
+            return KO_CODE
+        for i in range(count):
+            self.radio.write_reg(msg[3 + 2 * i], msg[4 + 2 * i])
+        return OK_CODE
+
+    def _cmd_get_rx_data(self, msg, length):
+        radio = self.radio
+        with radio._lock:
+            return OK_CODE + bytes([radio.SENDERID & 0xFF, radio.DATALEN]) + bytes(radio.DATA[:radio.DATALEN])
+
+    def _cmd_is_connected(self, msg, length):
+        return OK_CODE
+
+    def _cmd_poll_packet(self, msg, length):
+        radio = self.radio
+        with radio._lock:
+            if length < 4 or length != 4 + msg[3] or not radio.receive_done():
+                return KO_CODE
+            if not self._accept_packet():
+                radio.receive_begin()
+                return KO_CODE
+            flags = self._packet_flags(msg[2] & POLL_AUTO_ACK)
+            reply = OK_CODE + self._packet_record(flags)
+        self._release_packet(flags, msg[4:4 + msg[3]])
+        return reply
+
+    def _cmd_capabilities(self, msg, length):
+        return OK_CODE + bytes((PROTOCOL_VERSION, self.capabilities))
+
+    def _cmd_stream(self, msg, length):
+        self.stream_mode = msg[2]
+        self._rx_queue.clear()
+        self.rx_overflow = 0
+        if self.stream_mode & (STREAM_ENABLE | STREAM_QUEUE):
+            self.radio.receive_begin()
+        return OK_CODE
+
+    def _cmd_drain(self, msg, length):
+        count = min(msg[2], len(self._rx_queue))
+        records = [self._rx_queue.popleft() for _ in range(count)]
+        return OK_CODE + bytes((count, len(self._rx_queue), self.rx_queue_len)) + \
+            self.rx_overflow.to_bytes(2, 'little') + b''.join(records)
+
+    def _cmd_set_rx_filter(self, msg, length):
+        if length != 4 + 2 * ADDRESS_SET_LEN:
+            return KO_CODE
+        self.filter_flags = msg[2]
+        self.filter_rssi = msg[3]
+        self.filter_senders = bytes(msg[4:4 + ADDRESS_SET_LEN])
+        self.filter_targets = bytes(msg[4 + ADDRESS_SET_LEN:4 + 2 * ADDRESS_SET_LEN])
+        return OK_CODE
+
+    def _cmd_survey(self, msg, length):
+        # samples are written sweep by sweep, so that long surveys keep the host's reads going
+        if length != SURVEY_COMMAND_LEN:
+            return KO_CODE
+        first = int.from_bytes(msg[2:6], 'little')
+        spacing = int.from_bytes(msg[6:10], 'little')
+        channels = int.from_bytes(msg[10:12], 'little')
+        dwell = int.from_bytes(msg[12:14], 'little') / 1000000
+        if not channels or not msg[14]:
+            return KO_CODE
+        radio = self.radio
+        frf = bytes(radio.regs[REG_FRFMSB:REG_FRFLSB + 1])
+        radio.receive_begin()
+        reply = bytearray(OK_CODE)
+        for _ in range(msg[14]):
+            for i in range(channels):
+                radio.set_frequency((first + spacing * i) & 0xFFFFFFFF)
+                reply.append(radio.sample_rssi())
+            time.sleep(dwell * channels)
+            if self._master_fd is not None:
+                os.write(self._master_fd, reply)
+                reply.clear()
+        with radio._lock:
+            radio.set_mode(RF_OPMODE_STANDBY)
+            radio.regs[REG_FRFMSB:REG_FRFLSB + 1] = frf
+            radio.sample_rssi()
+        radio.receive_begin()
+        return bytes(reply)
+
+    def _cmd_echo(self, msg, length):
+        return OK_CODE + bytes(msg[2:length])
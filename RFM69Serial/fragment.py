@@ -0,0 +1,319 @@
+# RFM69 Serial fragmentation and reassembly
+
+"""Transfers of messages larger than a single radio packet.
+
+A message is split into numbered fragments which fit in one send_msg() payload. Every fragment starts with a
+4-byte header: transfer ID, fragment index (uint16, big endian) and flags (FRAGMENT_LAST on the final fragment),
+followed by up to FRAGMENT_DATA_LEN data bytes. Fragments of a transfer are sent in order; the receiver rebuilds
+the message in a preallocated per-sender buffer, or streams the data to a sink as fragments arrive.
+"""
+
+import time
+
+from RFM69Serial.device import MAX_MSG_LEN
+
+FRAGMENT_HEADER_LEN = 4
+FRAGMENT_DATA_LEN = MAX_MSG_LEN - FRAGMENT_HEADER_LEN
+FRAGMENT_LAST = 0x01
+MAX_FRAGMENTS = 0x10000
+
+
+def parse_fragment(payload):
+    """Split a fragment packet payload into its header fields and data.
+
+    :param payload: payload of the received packet (bytes).
+    :return: tuple (transfer ID, fragment index, flags, data as a memoryview), None if the payload is too short.
+    """
+
+    if len(payload) < FRAGMENT_HEADER_LEN:
+        return None
+    return payload[0], (payload[1] << 8) | payload[2], payload[3], memoryview(payload)[FRAGMENT_HEADER_LEN:]
+
+
+class FragmentSender:
+    """Send messages of any size to a node as a sequence of fragments.
+
+    Example::
+
+        sender = FragmentSender(dev)
+        sender.send(2, firmware_image)
+        with open("config.bin", "rb") as blob:
+            sender.send_stream(2, blob)
+
+    :param device: Rfm69SerialDevice object the fragments are sent through.
+    :param reliable: send every fragment with send_msg_with_retry() (the receiving bridge must acknowledge), or
+        with plain send_msg() otherwise.
+    :param retries: number of retries per fragment in reliable mode, None to let send_msg_with_retry() pick it
+        for the target (from its round-trip time estimate with current firmware).
+    :param time_out: time (in ms) to wait for each ACK in reliable mode, None to let send_msg_with_retry() pick it.
+    :param interval: pause (in seconds) after every fragment, to let a slow receiver keep up.
+    """
+
+    def __init__(self, device, reliable=True, retries=None, time_out=None, interval=0.0):
+        self._device = device
+        self.reliable = reliable
+        self.retries = retries
+        self.time_out = time_out
+        self.interval = interval
+
+        self._transfer_ids = {}     # next transfer ID per target
+        self._frame = bytearray(MAX_MSG_LEN)
+        self._view = memoryview(self._frame)
+
+    def send(self, target, data):
+        """Send a whole message.
+
+        :param target: address of the receiving node.
+        :param data: message, bytes-like object of at most 65536 * FRAGMENT_DATA_LEN bytes.
+        :return: True if every fragment was sent (and acknowledged in reliable mode), False otherwise.
+        """
+
+        view = memoryview(data).cast('B')
+        count = max(1, -(-len(view) // FRAGMENT_DATA_LEN))
+        if count > MAX_FRAGMENTS:
+            raise ValueError("message too long for a single transfer")
+        transfer = self._next_transfer(target)
+        for index in range(count):
+            chunk = view[index * FRAGMENT_DATA_LEN:(index + 1) * FRAGMENT_DATA_LEN]
+            if not self._send_fragment(target, transfer, index, chunk, index == count - 1):
+                return False
+        return True
+
+    def send_stream(self, target, source):
+        """Send a message read piecewise from @source, without holding the whole message in memory.
+
+        :param target: address of the receiving node.
+        :param source: binary file-like object (read with readinto() or read()), or an iterable of bytes-like
+            chunks of any size.
+        :return: True if every fragment was sent (and acknowledged in reliable mode), False otherwise.
+        """
+
+        transfer = self._next_transfer(target)
+        chunks = _fixed_chunks(source)
+        current = next(chunks, b'')
+        index = 0
+        while True:
+            # one fragment of lookahead tells whether the current fragment is the last one
+            following = next(chunks, None)
+            if index == MAX_FRAGMENTS:
+                raise ValueError("message too long for a single transfer")
+            if not self._send_fragment(target, transfer, index, current, following is None):
+                return False
+            if following is None:
+                return True
+            current = following
+            index += 1
+
+    def _next_transfer(self, target):
+        transfer = self._transfer_ids.get(target, 0)
+        self._transfer_ids[target] = (transfer + 1) & 0xFF
+        return transfer
+
+    def _send_fragment(self, target, transfer, index, chunk, last):
+        frame = self._frame
+        frame[0] = transfer
+        frame[1] = index >> 8
+        frame[2] = index & 0xFF
+        frame[3] = FRAGMENT_LAST if last else 0
+        end = FRAGMENT_HEADER_LEN + len(chunk)
+        frame[FRAGMENT_HEADER_LEN:end] = chunk
+
+        if self.reliable:
+            sent = self._device.send_msg_with_retry(target, self._view[:end], self.retries, self.time_out)
+        else:
+            sent = self._device.send_msg(target, self._view[:end])
+        if self.interval:
+            time.sleep(self.interval)
+        return sent
+
+
+def _fixed_chunks(source):
+    # yield the data of @source in FRAGMENT_DATA_LEN pieces (the last one may be shorter)
+    if hasattr(source, 'readinto'):
+        while True:
+            chunk = bytearray(FRAGMENT_DATA_LEN)
+            length = 0
+            while length < FRAGMENT_DATA_LEN:
+                read = source.readinto(memoryview(chunk)[length:])
+                if not read:
+                    break
+                length += read
+            if not length:
+                return
+            yield memoryview(chunk)[:length]
+            if length < FRAGMENT_DATA_LEN:
+                return
+    else:
+        pieces = iter(source.read, b'') if hasattr(source, 'read') else source
+        pending = bytearray()
+        for piece in pieces:
+            pending += piece
+            while len(pending) >= FRAGMENT_DATA_LEN:
+                yield bytes(pending[:FRAGMENT_DATA_LEN])
+                del pending[:FRAGMENT_DATA_LEN]
+        if pending:
+            yield bytes(pending)
+
+
+class _Slot:
+    """Reassembly buffer of one sender"""
+
+    __slots__ = 'sender', 'transfer', 'next_index', 'length', 'deadline', 'buffer'
+
+    def __init__(self, size):
+        self.sender = None
+        self.transfer = 0
+        self.next_index = 0
+        self.length = 0
+        self.deadline = 0.0
+        self.buffer = bytearray(size)
+
+
+class Reassembler:
+    """Rebuild fragmented messages from the received packets, one transfer per sender at a time.
+    All memory is allocated up front: @max_senders buffers of @max_size bytes. A transfer is abandoned when a
+    fragment is missing, when it outgrows its buffer, or when no fragment arrived for @timeout seconds; its
+    buffer is then reused. Duplicated fragments (e.g. retransmitted after a lost ACK) are ignored.
+
+    Example::
+
+        reassembler = Reassembler(max_size=8192)
+        for packet in rx:
+            message = reassembler.feed(packet)
+            if message is not None:
+                handle(packet.sender, message)
+
+    :param max_size: largest message that can be rebuilt (bytes).
+    :param max_senders: number of transfers which can be rebuilt concurrently.
+    :param timeout: time (in seconds) after which an idle transfer is abandoned.
+    """
+
+    def __init__(self, max_size=4096, max_senders=4, timeout=2.0):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._slots = [_Slot(max_size) for _ in range(max_senders)]
+        self._active = {}       # sender address -> _Slot
+
+        # statistics
+        self.completed = 0      # messages rebuilt
+        self.abandoned = 0      # transfers given up (missing fragment, too large, timed out)
+        self.rejected = 0       # fragments which could not be used (malformed, no transfer, no free buffer)
+
+    def feed(self, packet, now=None):
+        """Take a received fragment packet into account.
+
+        :param packet: RFM69Packet holding a fragment.
+        :param now: current time.monotonic() value, to share one clock reading between several calls.
+        :return: the complete message (bytes) once its last fragment arrived, None otherwise.
+        """
+
+        fragment = parse_fragment(packet.payload)
+        if fragment is None:
+            self.rejected += 1
+            return None
+        transfer, index, flags, data = fragment
+        now = time.monotonic() if now is None else now
+
+        slot = self._active.get(packet.sender)
+        if slot is not None and (slot.transfer != transfer or now > slot.deadline):
+            if index == 0 or now > slot.deadline:
+                self._abandon(slot)
+                slot = None
+            else:
+                self.rejected += 1
+                return None
+        if slot is None:
+            if index != 0:
+                self.rejected += 1
+                return None
+            slot = self._acquire(packet.sender, transfer, now)
+            if slot is None:
+                self.rejected += 1
+                return None
+
+        if index < slot.next_index:
+            return None     # duplicate
+        if index > slot.next_index or slot.length + len(data) > self.max_size:
+            self._abandon(slot)
+            return None
+
+        slot.buffer[slot.length:slot.length + len(data)] = data
+        slot.length += len(data)
+        slot.next_index += 1
+        slot.deadline = now + self.timeout
+        if flags & FRAGMENT_LAST:
+            message = bytes(slot.buffer[:slot.length])
+            self._release(slot)
+            self.completed += 1
+            return message
+        return None
+
+    def expire(self, now=None):
+        """Abandon the transfers which timed out, freeing their buffers."""
+
+        now = time.monotonic() if now is None else now
+        for slot in list(self._active.values()):
+            if now > slot.deadline:
+                self._abandon(slot)
+
+    def _acquire(self, sender, transfer, now):
+        for slot in self._slots:
+            if slot.sender is not None and now > slot.deadline:
+                self._abandon(slot)
+            if slot.sender is None:
+                slot.sender = sender
+                slot.transfer = transfer
+                slot.next_index = 0
+                slot.length = 0
+                self._active[sender] = slot
+                return slot
+        return None
+
+    def _abandon(self, slot):
+        self.abandoned += 1
+        self._release(slot)
+
+    def _release(self, slot):
+        del self._active[slot.sender]
+        slot.sender = None
+
+
+def receive_stream(recv, sink, sender=None, timeout=2.0):
+    """Receive a single fragmented transfer and write its data to @sink as the fragments arrive, so that only one
+    fragment is held in memory at a time.
+
+    :param recv: callable taking a timeout (in seconds) and returning the next RFM69Packet or None, e.g.
+        PacketReceiver.recv or Rfm69SerialDevice.recv_packet.
+    :param sink: object with a write() method (binary file, socket file, ...).
+    :param sender: only accept fragments from this address, None to follow the first sender seen. Packets from
+        other nodes are discarded.
+    :param timeout: maximum time (in seconds) to wait for each fragment.
+    :return: number of bytes written if the transfer completed, None if it timed out or a fragment was missing.
+    """
+
+    transfer = None
+    next_index = 0
+    written = 0
+    while True:
+        packet = recv(timeout)
+        if packet is None:
+            return None
+        fragment = parse_fragment(packet.payload)
+        if fragment is None or (sender is not None and packet.sender != sender):
+            continue
+        fragment_transfer, index, flags, data = fragment
+        if transfer is None:
+            if index != 0:
+                continue
+            transfer = fragment_transfer
+            sender = packet.sender
+        elif fragment_transfer != transfer or index < next_index:
+            continue
+        if index > next_index:
+            return None
+
+        sink.write(data)
+        written += len(data)
+        next_index += 1
+        if flags & FRAGMENT_LAST:
+            return written
@@ -0,0 +1,815 @@
+# RFM69 Serial gateway daemon
+
+"""Share bridges between local processes.
+
+Only one process can open a serial port. The gateway owns the bridges (Rfm69SerialDevice objects) and serves any
+number of client processes over a Unix domain socket:
+
+- received packets are written once into a ring buffer in shared memory (a memory-mapped file next to the socket)
+  which every client reads directly. Client filters (senders, targets, networks) are evaluated by the gateway as
+  a packet is published: each slot carries the bit mask of the clients it is meant for, so clients skip the other
+  packets without decoding them;
+- sends are queued per client and served round-robin, so that a client flooding the radio delays each other
+  client by at most one send;
+- a client which runs out of packets asks to be woken up (ARM); the gateway answers with a single notification
+  for the next matching packet, so a burst of packets costs one socket message rather than one per packet.
+
+Run the daemon with::
+
+    python -m RFM69Serial.gateway --port /dev/ttyACM0 --network 101 --socket /run/rfm69/gateway.sock
+
+and share the bridge from any number of processes::
+
+    with GatewayClient("/run/rfm69/gateway.sock") as client:
+        client.subscribe(senders=[2, 3])
+        client.send_msg(2, b'hello')
+        network, packet = client.recv(timeout=5)[1:]
+"""
+
+import argparse
+import mmap
+import os
+import selectors
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+from RFM69Serial import RFM69Packet
+from RFM69Serial.device import Rfm69SerialDevice, _payload_view
+from RFM69Serial.protocol import CAP_STREAMING, FILTER_SENDERS, FILTER_TARGETS, ADDRESS_SET_LEN
+from RFM69Serial.receiver import PacketReceiver
+
+# Constants and globals
+MAX_CLIENTS = 64        # bits of the client mask of a ring slot
+FILTER_NETWORKS = 0x08  # SUBSCRIBE flag next to FILTER_SENDERS/FILTER_TARGETS: network must be in the network set
+
+# Shared ring file: header, then the slots. The write sequence is the number of packets published so far.
+RING_MAGIC = b'RFM69GWR'
+RING_VERSION = 1
+RING_HEADER_SIZE = 64
+_RING_HEADER = struct.Struct('<8sHHI')      # magic, version, slot size, number of slots
+_RING_SEQUENCE_OFFSET = 24
+_RING_SEQUENCE = struct.Struct('<Q')
+
+# Slot: stamp (sequence number + 1 of the packet held, 0 while it is being written), client mask, reception time,
+# network, sender, target, flags, RSSI (dBm), payload length, payload
+_SLOT_STAMP = struct.Struct('<Q')
+_SLOT_RECORD = struct.Struct('<QQdBBBBhB')
+SLOT_SIZE = 96
+MAX_PAYLOAD = SLOT_SIZE - _SLOT_RECORD.size
+_SLOT_ACK_REQUESTED = 0x01
+_SLOT_ACK_RECEIVED = 0x02
+
+# Socket messages: body length, type, body
+_MESSAGE = struct.Struct('<HB')
+MSG_WELCOME = 1         # gateway -> client: client ID, slots, slot size; ring file path follows
+MSG_REFUSED = 2         # gateway -> client: every client ID is taken
+MSG_SUBSCRIBE = 3       # client -> gateway: FILTER_* flags, sender, target and network sets
+MSG_UNSUBSCRIBE = 4     # client -> gateway
+MSG_ARM = 5             # client -> gateway: sequence number of the next packet the client reads
+MSG_NOTIFY = 6          # gateway -> client: write sequence
+MSG_SEND = 7            # client -> gateway: request ID, SEND_* flags, target, network, retries, time-out; payload
+MSG_RESULT = 8          # gateway -> client: request ID, RESULT_* status
+_WELCOME = struct.Struct('<BIH')
+_SUBSCRIBE = struct.Struct('<B%ds%ds%ds' % (ADDRESS_SET_LEN, ADDRESS_SET_LEN, ADDRESS_SET_LEN))
+_SEQUENCE = struct.Struct('<Q')
+_SEND = struct.Struct('<IBBBBB')
+_RESULT = struct.Struct('<IB')
+
+# MSG_SEND flags
+SEND_ACK_REQUEST = 0x01     # send_msg() with an ACK request
+SEND_RETRY = 0x02           # send_msg_with_retry()
+SEND_NETWORK = 0x04         # send through the bridge on the given network
+SEND_RETRIES = 0x08         # retries given, the bridge's RTT estimate picks them otherwise
+SEND_TIMEOUT = 0x10         # time-out given
+
+# MSG_RESULT status
+RESULT_FAILED = 0       # not sent, or not acknowledged
+RESULT_OK = 1
+RESULT_REJECTED = 2     # no bridge on the network, or the client's send queue is full
+RESULT_ERROR = 3        # the bridge raised an exception
+
+# A packet delivered to a client: reception time (seconds since the epoch), network ID of the bridge, RFM69Packet
+GatewayPacket = namedtuple('GatewayPacket', 'time network packet')
+
+
+def _address_set(addresses):
+    # bitmap of an address set, as the firmware's receive filter takes it
+    bitmap = bytearray(ADDRESS_SET_LEN)
+    for address in addresses:
+        if type(address) != int or not 0 <= address <= 0xFF:
+            raise ValueError("addresses must be ints between 0 and 255")
+        bitmap[address >> 3] |= 1 << (address & 7)
+    return bytes(bitmap)
+
+
+def _in_set(bitmap, address):
+    return bitmap[address >> 3] & (1 << (address & 7))
+
+
+class SharedRing:
+    """Ring buffer of received packets in a memory-mapped file, written by the gateway and read by the clients.
+    There is a single writer; readers never lock. A slot is stamped 0 while being written and with its sequence
+    number + 1 once complete, so a reader which fell more than a ring behind (or raced the writer) notices that
+    the slot no longer holds the packet it was after.
+
+    :param path: path of the ring file.
+    :param slots: number of slots to create the ring with (writer); None opens an existing ring (reader).
+    """
+
+    def __init__(self, path, slots=None):
+        self.path = path
+        self.writer = slots is not None
+        if self.writer:
+            if type(slots) != int or slots < 1:
+                raise ValueError("slots must be a positive int")
+            size = RING_HEADER_SIZE + slots * SLOT_SIZE
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            _RING_HEADER.pack_into(self._map, 0, RING_MAGIC, RING_VERSION, SLOT_SIZE, slots)
+            self.slots = slots
+        else:
+            with open(path, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, slot_size, self.slots = _RING_HEADER.unpack_from(self._map, 0)
+            if magic != RING_MAGIC or version != RING_VERSION or slot_size != SLOT_SIZE:
+                self._map.close()
+                raise ValueError("%s is not a gateway packet ring" % path)
+        self._sequence = self.sequence
+
+    @property
+    def sequence(self):
+        """Number of packets published so far"""
+        return _RING_SEQUENCE.unpack_from(self._map, _RING_SEQUENCE_OFFSET)[0]
+
+    def publish(self, mask, network, packet, timestamp=None):
+        """Write a packet into the next slot (writer only).
+
+        :param mask: bit mask of the client IDs the packet is meant for.
+        :param network: network ID of the bridge which received it.
+        :param packet: RFM69Packet.
+        :param timestamp: reception time, now if omitted.
+        :return: sequence number of the packet.
+        """
+
+        sequence = self._sequence
+        offset = RING_HEADER_SIZE + (sequence % self.slots) * SLOT_SIZE
+        payload = packet.payload[:MAX_PAYLOAD]
+        _SLOT_STAMP.pack_into(self._map, offset, 0)
+        _SLOT_RECORD.pack_into(self._map, offset, 0, mask, time.time() if timestamp is None else timestamp,
+                               network & 0xFF, packet.sender & 0xFF, (packet.target or 0) & 0xFF,
+                               (_SLOT_ACK_REQUESTED if packet.ack_requested else 0) |
+                               (_SLOT_ACK_RECEIVED if packet.ack_received else 0), packet.rssi or 0, len(payload))
+        self._map[offset + _SLOT_RECORD.size:offset + _SLOT_RECORD.size + len(payload)] = payload
+        _SLOT_STAMP.pack_into(self._map, offset, sequence + 1)
+        self._sequence = sequence + 1
+        _RING_SEQUENCE.pack_into(self._map, _RING_SEQUENCE_OFFSET, self._sequence)
+        return sequence
+
+    def read(self, sequence, bit=None):
+        """Read the packet with sequence number @sequence.
+
+        :param sequence: sequence number, lower than the write sequence.
+        :param bit: client mask bit of the reader, None to read every packet.
+        :return: GatewayPacket; None if the packet is not meant for @bit; False if its slot has been overwritten.
+        """
+
+        offset = RING_HEADER_SIZE + (sequence % self.slots) * SLOT_SIZE
+        stamp, mask, timestamp, network, sender, target, flags, rssi, length = \
+            _SLOT_RECORD.unpack_from(self._map, offset)
+        if stamp != sequence + 1:
+            return False
+        if bit is not None and not mask & bit:
+            return None
+        start = offset + _SLOT_RECORD.size
+        payload = self._map[start:start + length]
+        if _SLOT_STAMP.unpack_from(self._map, offset)[0] != stamp:
+            return False
+        return GatewayPacket(timestamp, network, RFM69Packet(sender, payload, target=target, rssi=rssi,
+                                                             ack_requested=bool(flags & _SLOT_ACK_REQUESTED),
+                                                             ack_received=bool(flags & _SLOT_ACK_RECEIVED)))
+
+    def close(self):
+        """Unmap the ring; the writer also deletes the ring file."""
+
+        if not self._map.closed:
+            self._map.close()
+            if self.writer and os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+class FairQueue:
+    """Queue of requests from several owners, served round-robin: one request of each owner with pending requests
+    in turn, whatever the number of requests each one queued.
+
+    :param limit: maximum number of pending requests per owner.
+    """
+
+    def __init__(self, limit=64):
+        self.limit = limit
+        self._queues = {}       # owner -> deque of requests
+        self._turns = deque()   # owners with pending requests, next to be served first
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def put(self, owner, request):
+        """Queue a request of @owner.
+
+        :return: True if queued, False if the owner's queue is full or the queue is closed.
+        """
+
+        with self._cond:
+            if self._closed:
+                return False
+            queue = self._queues.get(owner)
+            if queue is None:
+                queue = self._queues[owner] = deque()
+            elif len(queue) >= self.limit:
+                return False
+            if not queue:
+                self._turns.append(owner)
+            queue.append(request)
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Take the request of the owner whose turn it is.
+
+        :param timeout: maximum waiting time in seconds, None waits until a request comes or the queue is closed.
+        :return: (owner, request), or None on time-out or once closed.
+        """
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._turns or self._closed, timeout) or not self._turns:
+                return None
+            owner = self._turns.popleft()
+            queue = self._queues[owner]
+            request = queue.popleft()
+            if queue:
+                self._turns.append(owner)
+            return owner, request
+
+    def remove(self, owner):
+        """Drop every pending request of @owner.
+
+        :return: list of the dropped requests.
+        """
+
+        with self._cond:
+            queue = self._queues.pop(owner, None)
+            if not queue:
+                return []
+            self._turns.remove(owner)
+            return list(queue)
+
+    def close(self):
+        """Wake up every waiting get(); later put() calls fail."""
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _Client:
+    # connection of one client process
+
+    def __init__(self, sock, client_id):
+        self.sock = sock
+        self.id = client_id
+        self.bit = 1 << client_id
+        self.buffer = bytearray()
+        self.subscribed = False
+        self.flags = 0
+        self.senders = self.targets = self.networks = None
+        self.armed = None           # sequence number the client waits for, None when not armed
+        self.last_match = -1        # sequence number of the latest packet meant for the client
+        self._send_lock = threading.Lock()
+
+    def match(self, network, packet):
+        flags = self.flags
+        return (not flags & FILTER_SENDERS or _in_set(self.senders, packet.sender)) and \
+               (not flags & FILTER_TARGETS or _in_set(self.targets, packet.target or 0)) and \
+               (not flags & FILTER_NETWORKS or _in_set(self.networks, network))
+
+    def send(self, kind, body=b''):
+        try:
+            with self._send_lock:
+                self.sock.sendall(_MESSAGE.pack(len(body), kind) + body)
+            return True
+        except OSError:
+            return False
+
+
+class _Bridge:
+    # one device served by the gateway: its packet source and its send queue
+
+    def __init__(self, device, capacity, queue_limit):
+        self.device = device
+        self.capacity = capacity
+        self.sends = FairQueue(queue_limit)
+        self.receiver = None
+        self.packets = None
+        self.threads = []
+
+    @property
+    def network(self):
+        return self.device.network_id
+
+    def start_receiving(self):
+        if self.device.capabilities & CAP_STREAMING and self.device.start_streaming(capacity=self.capacity):
+            self.packets = self.device.stream_packets
+        else:
+            self.receiver = PacketReceiver(self.device, self.capacity).start()
+            self.packets = self.receiver.packets
+
+    def stop_receiving(self):
+        if self.receiver is not None:
+            self.receiver.stop()
+            self.receiver = None
+        elif self.device.streaming:
+            self.device.stop_streaming()
+        self.sends.close()
+
+
+class Gateway:
+    """Daemon sharing one or more bridges with local client processes, see the module documentation.
+    Every bridge is received from in streaming mode if its firmware supports it, by a PacketReceiver otherwise;
+    each bridge has its own send queue, so a slow bridge delays none of the others.
+
+    Example::
+
+        with Gateway(Rfm69SerialDevice(1, 101, port="/dev/ttyACM0"), "/run/rfm69/gateway.sock") as gateway:
+            signal.pause()
+
+    :param devices: Rfm69SerialDevice, or list of them (on different networks, sends are routed by network ID).
+    :param path: path of the Unix domain socket.
+    :param slots: number of packets the shared ring holds; a client falling further behind loses packets.
+    :param ring_path: path of the shared ring file, <path>.ring if omitted. Put both on a tmpfs (e.g. /run).
+    :param capacity: size of the packet ring of each bridge, which absorbs bursts while packets are published.
+    :param queue_limit: maximum number of pending sends per client and bridge.
+    :param mode: permissions of the socket and ring files, which decide who may use the gateway.
+    """
+
+    def __init__(self, devices, path, slots=4096, ring_path=None, capacity=256, queue_limit=64, mode=0o660):
+        if not isinstance(devices, (list, tuple)):
+            devices = [devices]
+        self.path = path
+        self.ring_path = ring_path if ring_path is not None else path + ".ring"
+        self.slots = slots
+        self.mode = mode
+        self.bridges = [_Bridge(device, capacity, queue_limit) for device in devices]
+        self.ring = None
+        self.published = 0
+
+        self._clients = {}          # socket -> _Client
+        self._free_ids = list(range(MAX_CLIENTS))
+        self._lock = threading.Lock()   # client filters, arming and the ring writer
+        self._selector = None
+        self._server = None
+        self._running = threading.Event()
+        self._threads = []
+
+    @property
+    def is_running(self):
+        return self._running.is_set()
+
+    @property
+    def clients(self):
+        """Number of connected clients"""
+        return len(self._clients)
+
+    def start(self):
+        """Create the shared ring and the socket, then start receiving and serving clients."""
+
+        if self.is_running:
+            return self
+        self.ring = SharedRing(self.ring_path, self.slots)
+        os.chmod(self.ring_path, self.mode)
+        if os.path.exists(self.path):
+            os.unlink(self.path)    # left over by a gateway which did not shut down
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, self.mode)
+        self._server.listen(MAX_CLIENTS)
+        self._server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+
+        self._running.set()
+        self._spawn(self._serve, "rfm69-gateway")
+        for bridge in self.bridges:
+            bridge.start_receiving()
+            self._spawn(self._publish, "rfm69-gateway-rx", bridge)
+            self._spawn(self._send, "rfm69-gateway-tx", bridge)
+        return self
+
+    def stop(self):
+        """Stop serving, disconnect every client and remove the socket and ring files. The devices stay open."""
+
+        if self._server is None:
+            return
+        self._running.clear()
+        for bridge in self.bridges:
+            bridge.stop_receiving()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        for client in list(self._clients.values()):
+            self._drop(client)
+        self._selector.close()
+        self._server.close()
+        self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.ring.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def route(self, network=None):
+        """Pick the bridge on @network, the first bridge if None.
+
+        :return: Rfm69SerialDevice, None if no bridge is on the network.
+        """
+
+        if network is None:
+            return self.bridges[0].device
+        return next((bridge.device for bridge in self.bridges if bridge.network == network), None)
+
+    def _spawn(self, target, name, *args):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    # ***** Receiving *****
+
+    def _publish(self, bridge):
+        packets = bridge.packets
+        while self._running.is_set():
+            packet = packets.get(0.1)
+            if packet is None:
+                if packets.closed and not len(packets):
+                    break
+                continue
+            network = bridge.network
+            notify = []
+            with self._lock:
+                mask = 0
+                matched = [client for client in self._clients.values()
+                           if client.subscribed and client.match(network, packet)]
+                for client in matched:
+                    mask |= client.bit
+                sequence = self.ring.publish(mask, network, packet)
+                self.published += 1
+                for client in matched:
+                    client.last_match = sequence
+                    if client.armed is not None:
+                        client.armed = None
+                        notify.append(client)
+            for client in notify:
+                client.send(MSG_NOTIFY, _SEQUENCE.pack(sequence + 1))
+
+    # ***** Sending *****
+
+    def _send(self, bridge):
+        device = bridge.device
+        while self._running.is_set():
+            item = bridge.sends.get(0.1)
+            if item is None:
+                continue
+            client, (request_id, flags, target, retries, time_out, payload) = item
+            try:
+                if flags & SEND_RETRY:
+                    done = device.send_msg_with_retry(target, payload, retries, time_out)
+                else:
+                    done = device.send_msg(target, payload, bool(flags & SEND_ACK_REQUEST))
+                status = RESULT_OK if done else RESULT_FAILED
+            except Exception:
+                status = RESULT_ERROR
+            client.send(MSG_RESULT, _RESULT.pack(request_id, status))
+
+    # ***** Client connections *****
+
+    def _serve(self):
+        selector = self._selector
+        while self._running.is_set():
+            for key, _ in selector.select(0.1):
+                if key.fileobj is self._server:
+                    self._accept()
+                else:
+                    self._receive(key.data)
+
+    def _accept(self):
+        try:
+            sock, _ = self._server.accept()
+        except OSError:
+            return
+        with self._lock:
+            client_id = self._free_ids.pop(0) if self._free_ids else None
+        if client_id is None:
+            _Client(sock, 0).send(MSG_REFUSED)
+            sock.close()
+            return
+        client = _Client(sock, client_id)
+        with self._lock:
+            self._clients[sock] = client
+        self._selector.register(sock, selectors.EVENT_READ, client)
+        client.send(MSG_WELCOME, _WELCOME.pack(client_id, self.ring.slots, SLOT_SIZE) +
+                    os.path.abspath(self.ring_path).encode())
+
+    def _drop(self, client):
+        with self._lock:
+            if self._clients.pop(client.sock, None) is None:
+                return
+            self._free_ids.append(client.id)
+        for bridge in self.bridges:
+            bridge.sends.remove(client)
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+    def _receive(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(client)
+            return
+        buffer = client.buffer
+        buffer += data
+        while len(buffer) >= _MESSAGE.size:
+            length, kind = _MESSAGE.unpack_from(buffer)
+            if len(buffer) < _MESSAGE.size + length:
+                break
+            body = bytes(buffer[_MESSAGE.size:_MESSAGE.size + length])
+            del buffer[:_MESSAGE.size + length]
+            if not self._handle(client, kind, body):
+                self._drop(client)
+                return
+
+    def _handle(self, client, kind, body):
+        # one client message, False drops the client
+        if kind == MSG_ARM and len(body) == _SEQUENCE.size:
+            wanted = _SEQUENCE.unpack(body)[0]
+            with self._lock:
+                ready = client.last_match >= wanted
+                client.armed = None if ready else wanted
+            if ready:
+                client.send(MSG_NOTIFY, _SEQUENCE.pack(self.ring.sequence))
+        elif kind == MSG_SEND and len(body) >= _SEND.size:
+            request_id, flags, target, network, retries, time_out = _SEND.unpack_from(body)
+            payload = body[_SEND.size:]
+            device = self.route(network if flags & SEND_NETWORK else None)
+            bridge = next((bridge for bridge in self.bridges if bridge.device is device), None)
+            request = (request_id, flags, target, retries if flags & SEND_RETRIES else None,
+                       time_out if flags & SEND_TIMEOUT else None, payload)
+            if bridge is None or not bridge.sends.put(client, request):
+                client.send(MSG_RESULT, _RESULT.pack(request_id, RESULT_REJECTED))
+        elif kind == MSG_SUBSCRIBE and len(body) == _SUBSCRIBE.size:
+            flags, senders, targets, networks = _SUBSCRIBE.unpack(body)
+            with self._lock:
+                client.flags = flags
+                client.senders, client.targets, client.networks = senders, targets, networks
+                client.subscribed = True
+        elif kind == MSG_UNSUBSCRIBE:
+            with self._lock:
+                client.subscribed = False
+                client.armed = None
+        else:
+            return False
+        return True
+
+
+class GatewayClient:
+    """Client of a Gateway, to be used from a single thread.
+    Packets are read straight from the shared ring, starting with the first packet published after the client
+    connected; sends go through the gateway's fair queue.
+
+    :param path: path of the gateway's Unix domain socket.
+    :param timeout: time (in seconds) to wait for the result of a send, None waits as long as it takes.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.timeout = timeout
+        self.dropped = 0            # packets overwritten in the ring before this client read them
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._buffer = bytearray()
+        self._results = {}          # request ID -> RESULT_* status
+        self._request_id = 0
+        self._armed = False
+        self._notified = False
+
+        kind, body = self._read_message(None)
+        if kind != MSG_WELCOME:
+            self._sock.close()
+            raise ConnectionRefusedError("the gateway serves %d clients already" % MAX_CLIENTS)
+        self.id, _, _ = _WELCOME.unpack_from(body)
+        self._bit = 1 << self.id
+        self.ring = SharedRing(body[_WELCOME.size:].decode())
+        self._next = self.ring.sequence
+
+    def close(self):
+        self._sock.close()
+        self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def subscribe(self, senders=None, targets=None, networks=None):
+        """Receive the packets matching every given criterion (replacing the previous subscription).
+
+        :param senders: iterable of sender addresses to receive from, None for any.
+        :param targets: iterable of target addresses (0 being broadcast), None for any.
+        :param networks: iterable of network IDs of the bridges to receive from, None for any.
+        """
+
+        flags = 0
+        sets = []
+        for flag, addresses in ((FILTER_SENDERS, senders), (FILTER_TARGETS, targets), (FILTER_NETWORKS, networks)):
+            if addresses is not None:
+                flags |= flag
+            sets.append(_address_set(addresses if addresses is not None else ()))
+        self._write(MSG_SUBSCRIBE, _SUBSCRIBE.pack(flags, *sets))
+
+    def unsubscribe(self):
+        """Stop receiving packets."""
+        self._write(MSG_UNSUBSCRIBE)
+
+    def recv(self, timeout=None):
+        """Wait for the next packet matching the subscription.
+
+        :param timeout: maximum waiting time in seconds, None waits forever, 0 does not wait.
+        :return: GatewayPacket (time, network, RFM69Packet), None on time-out.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            item = self.try_recv()
+            if item is not None:
+                return item
+            if not self._armed:
+                self._armed = True
+                self._write(MSG_ARM, _SEQUENCE.pack(self._next))
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            self._notified = False
+            while not self._notified:
+                if not self._process(remaining):
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+    def try_recv(self):
+        """Return the next packet already in the ring without waiting, None if there is none."""
+
+        ring = self.ring
+        end = ring.sequence
+        if end - self._next > ring.slots:
+            self.dropped += end - ring.slots - self._next
+            self._next = end - ring.slots
+        while self._next < end:
+            sequence = self._next
+            self._next += 1
+            item = ring.read(sequence, self._bit)
+            if item:
+                return item
+            if item is False:
+                self.dropped += 1
+        return None
+
+    def __iter__(self):
+        while True:
+            yield self.recv()
+
+    def send_msg(self, target, msg, ack_request=False, network=None):
+        """Send a message through the gateway, see Rfm69SerialDevice.send_msg().
+
+        :param network: network ID of the bridge to send through, None for the gateway's first bridge.
+        :return: True if sent, False otherwise.
+        """
+        return self._request(SEND_ACK_REQUEST if ack_request else 0, target, msg, network, None, None)
+
+    def send_msg_with_retry(self, target, msg, retries=None, time_out=None, network=None):
+        """Send a message through the gateway and wait for its ACK, see Rfm69SerialDevice.send_msg_with_retry().
+
+        :param network: network ID of the bridge to send through, None for the gateway's first bridge.
+        :return: True if acknowledged, False otherwise.
+        """
+        return self._request(SEND_RETRY, target, msg, network, retries, time_out)
+
+    def _request(self, flags, target, msg, network, retries, time_out):
+        payload = _payload_view(msg)
+        if network is not None:
+            flags |= SEND_NETWORK
+        if retries is not None:
+            flags |= SEND_RETRIES
+        if time_out is not None:
+            flags |= SEND_TIMEOUT
+        self._request_id = request_id = (self._request_id + 1) & 0xFFFFFFFF
+        self._write(MSG_SEND, _SEND.pack(request_id, flags, target, network or 0, retries or 0, time_out or 0) +
+                    bytes(payload))
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while request_id not in self._results:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if (remaining is not None and remaining <= 0) or not self._process(remaining):
+                raise TimeoutError("the gateway did not answer in time")
+        status = self._results.pop(request_id)
+        if status == RESULT_REJECTED:
+            raise RuntimeError("the gateway rejected the send: no bridge on network %r, or too many pending sends"
+                               % network)
+        if status == RESULT_ERROR:
+            raise RuntimeError("the bridge failed to send")
+        return status == RESULT_OK
+
+    def _write(self, kind, body=b''):
+        self._sock.sendall(_MESSAGE.pack(len(body), kind) + body)
+
+    def _process(self, timeout):
+        # handle one gateway message, False on time-out
+        message = self._read_message(timeout)
+        if message is None:
+            return False
+        kind, body = message
+        if kind == MSG_NOTIFY:
+            self._armed = False
+            self._notified = True
+        elif kind == MSG_RESULT:
+            request_id, status = _RESULT.unpack(body)
+            self._results[request_id] = status
+        return True
+
+    def _read_message(self, timeout):
+        buffer = self._buffer
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if len(buffer) >= _MESSAGE.size:
+                length, kind = _MESSAGE.unpack_from(buffer)
+                if len(buffer) >= _MESSAGE.size + length:
+                    body = bytes(buffer[_MESSAGE.size:_MESSAGE.size + length])
+                    del buffer[:_MESSAGE.size + length]
+                    return kind, body
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            self._sock.settimeout(remaining)
+            try:
+                data = self._sock.recv(65536)
+            except (socket.timeout, BlockingIOError):
+                # a time-out of 0 (deadline passed) puts the socket in non-blocking mode
+                return None
+            if not data:
+                raise ConnectionError("the gateway closed the connection")
+            buffer += data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m RFM69Serial.gateway", description=__doc__.split("\n\n")[0])
+    parser.add_argument('--port', nargs='+', default=["/dev/ttyACM0"], help="serial ports of the bridges")
+    parser.add_argument('--address', type=int, default=1, help="node address of the bridges")
+    parser.add_argument('--network', type=int, nargs='+', default=[101],
+                        help="network ID of every bridge, or one per port")
+    parser.add_argument('--socket', default="/tmp/rfm69-gateway.sock", help="path of the Unix domain socket")
+    parser.add_argument('--slots', type=int, default=4096, help="packets held by the shared ring")
+    args = parser.parse_args(argv)
+    if len(args.network) not in (1, len(args.port)):
+        parser.error("give one network ID, or one per port")
+
+    networks = args.network * len(args.port) if len(args.network) == 1 else args.network
+    devices = [Rfm69SerialDevice(args.address, network, port=port) for port, network in zip(args.port, networks)]
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        with Gateway(devices, args.socket, slots=args.slots):
+            print("serving %s on %s" % (", ".join(args.port), args.socket))
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in devices:
+            device.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
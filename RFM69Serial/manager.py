@@ -0,0 +1,179 @@
+# RFM69 Serial multi-bridge manager
+
+import asyncio
+from collections import namedtuple
+
+from RFM69Serial.aio import AsyncRfm69SerialDevice
+
+# A received packet and the port of the bridge it came in through
+TaggedPacket = namedtuple('TaggedPacket', 'bridge packet')
+
+_CLOSED = object()      # queued by close() to wake up the consumers of the receive queue
+
+
+class BridgeManager:
+    """Drive several bridges from one asyncio event loop.
+    All bridges are opened and initialized concurrently, so start-up takes as long as the slowest port; a bridge
+    which fails to come up is reported in failed instead of holding up the others, as is a bridge whose port fails
+    later on (it is then no longer routed through). Every bridge is served by the event loop's selector (see
+    AsyncRfm69SerialDevice), one slow bridge delays none of the others.
+
+    Packets received by any bridge are merged into one stream of TaggedPacket tuples. Sending picks the bridge by
+    port, by network ID, or by the bridge which last heard from the target address.
+
+    Example::
+
+        async with BridgeManager([dict(port="/dev/ttyACM0", network=101),
+                                  dict(port="/dev/ttyACM1", network=102)], address=1) as bridges:
+            await bridges.send_msg(2, b'hello', network=102)
+            async for bridge, packet in bridges.packets():
+                print(bridge, packet.sender, packet.payload)
+
+    :param bridges: bridges to open: serial port names, or dicts of AsyncRfm69SerialDevice keyword arguments
+        (which must include port).
+    :param queue_size: capacity of the merged receive queue, the oldest packets are dropped when it is full.
+    :param device_kwargs: AsyncRfm69SerialDevice keyword arguments shared by every bridge (address, network...).
+    """
+
+    def __init__(self, bridges, queue_size=256, **device_kwargs):
+        self._specs = {}
+        for bridge in bridges:
+            spec = dict(device_kwargs)
+            spec.update({'port': bridge} if isinstance(bridge, str) else bridge)
+            self._specs[spec['port']] = spec
+        self.queue_size = queue_size
+
+        self.devices = {}       # port -> opened AsyncRfm69SerialDevice
+        self.failed = {}        # port -> exception which took the bridge down
+        self.dropped = 0        # packets dropped from a full receive queue
+        self._routes = {}       # node address -> port of the bridge which last heard from it
+        self._pumps = []
+        self._queue = None
+
+    @property
+    def is_open(self):
+        return self._queue is not None
+
+    async def open(self):
+        """Open and initialize every bridge concurrently, then start receiving on each.
+
+        :return: the manager itself.
+        """
+
+        self._queue = asyncio.Queue(self.queue_size)
+        devices = [AsyncRfm69SerialDevice(**spec) for spec in self._specs.values()]
+        results = await asyncio.gather(*[device.open() for device in devices], return_exceptions=True)
+        for device, result in zip(devices, results):
+            if isinstance(result, BaseException):
+                device.close()      # open() closes on failure already, make sure nothing is left open
+                self.failed[device.port] = result
+            else:
+                self.devices[device.port] = device
+                self._pumps.append(asyncio.ensure_future(self._pump(device)))
+        return self
+
+    async def close(self):
+        """Stop receiving and close every bridge."""
+
+        for pump in self._pumps:
+            pump.cancel()
+        await asyncio.gather(*self._pumps, return_exceptions=True)
+        self._pumps.clear()
+        for device in self.devices.values():
+            device.close()
+        self.devices.clear()
+        if self._queue is not None:
+            if self._queue.full():
+                self._queue.get_nowait()
+            self._queue.put_nowait(_CLOSED)
+        self._queue = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def recv(self, timeout=None):
+        """Wait for the next packet received by any bridge.
+
+        :param timeout: maximum waiting time in seconds, None to wait forever.
+        :return: TaggedPacket (bridge port, RFM69Packet), None on time-out or once the manager is closed.
+        """
+
+        try:
+            return await self._get(timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def packets(self):
+        """Asynchronous stream of the packets received by every bridge, as TaggedPacket tuples. Ends when the
+        manager is closed."""
+
+        while self.is_open:
+            tagged = await self._get()
+            if tagged is None:
+                return
+            yield tagged
+
+    async def _get(self, timeout=None):
+        queue = self._queue
+        if queue is None:
+            return None
+        tagged = await asyncio.wait_for(queue.get(), timeout)
+        if tagged is _CLOSED:
+            queue.put_nowait(_CLOSED)   # for the other consumers
+            return None
+        return tagged
+
+    def route(self, target=None, network=None, bridge=None):
+        """Pick the bridge to reach a node through.
+
+        :param target: node address, used to find the bridge which last heard from it.
+        :param network: network ID the bridge must be on.
+        :param bridge: port of the bridge, overrides the other criteria.
+        :return: AsyncRfm69SerialDevice of the chosen bridge.
+        """
+
+        if bridge is not None:
+            device = self.devices.get(bridge)
+        elif network is not None:
+            device = next((device for device in self.devices.values() if device.network_id == network), None)
+        elif target in self._routes:
+            device = self.devices.get(self._routes[target])
+        elif len(self.devices) == 1:
+            device = next(iter(self.devices.values()))
+        else:
+            device = None
+        if device is None:
+            raise LookupError("no bridge to reach node %r (network %r, bridge %r)" % (target, network, bridge))
+        return device
+
+    async def send_msg(self, target, msg, ack_request=False, network=None, bridge=None):
+        """Send a message through the bridge picked by route(), see Rfm69SerialDevice.send_msg()."""
+        return await self.route(target, network, bridge).send_msg(target, msg, ack_request)
+
+    async def send_msg_with_retry(self, target, msg, retries=None, time_out=None, network=None, bridge=None):
+        """Send a message through the bridge picked by route(), see Rfm69SerialDevice.send_msg_with_retry()."""
+        return await self.route(target, network, bridge).send_msg_with_retry(target, msg, retries, time_out)
+
+    async def _pump(self, device):
+        # move the packets of one bridge into the merged queue
+        try:
+            async for packet in device.packets():
+                self._routes[packet.sender] = device.port
+                if self._queue.full():
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                self._queue.put_nowait(TaggedPacket(device.port, packet))
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            # the bridge is down: stop routing through it
+            self.failed[device.port] = err
+            if self.devices.get(device.port) is device:
+                del self.devices[device.port]
+            for target, port in list(self._routes.items()):
+                if port == device.port:
+                    del self._routes[target]
+            device.close()
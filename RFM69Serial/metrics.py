@@ -0,0 +1,189 @@
+# RFM69 Serial command metrics
+
+"""Per-opcode counters and latency histograms of bridge commands.
+
+Rfm69SerialDevice and AsyncRfm69SerialDevice record every command they send, pipelined or not, in their metrics
+attribute (a CommandMetrics object); set it to None to turn the instrumentation off. Latency is measured from
+writing the command to receiving the complete reply, so it covers USB latency, the firmware's serial receive delay
+and the radio time of the command (and, for pipelined commands, the replies ahead of it).
+
+Example::
+
+    dev.metrics.add_exporter(PrometheusTextFile("/var/lib/node_exporter/rfm69.prom"))
+    ...
+    dev.metrics.export()
+"""
+
+import os
+from collections import namedtuple
+
+from RFM69Serial.protocol import OK_CODE
+
+# Upper bounds (in seconds) of the latency histogram buckets, a last bucket takes everything slower
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+# Counters of one opcode; buckets holds non-cumulative counts, one per LATENCY_BUCKETS bound plus the overflow one
+OpcodeSnapshot = namedtuple('OpcodeSnapshot', 'calls bytes_out bytes_in ok ko timeouts latency_sum buckets')
+
+
+class _OpcodeStats:
+    """Mutable counters of one opcode"""
+
+    __slots__ = 'calls', 'bytes_out', 'bytes_in', 'ok', 'ko', 'timeouts', 'latency_sum', 'buckets'
+
+    def __init__(self, bucket_count):
+        self.calls = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.ok = 0
+        self.ko = 0
+        self.timeouts = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * bucket_count
+
+
+class CommandMetrics:
+    """Counters and latency histogram of every opcode sent to a bridge.
+
+    :param buckets: ascending upper bounds (in seconds) of the latency histogram buckets.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.exporters = []
+        self._stats = {}
+
+    def record(self, opcode, bytes_out, recv, reply, latency):
+        """Account for one command.
+
+        :param opcode: command opcode.
+        :param bytes_out: size of the command frame written.
+        :param recv: raw reply bytes, incomplete if the reply timed out.
+        :param reply: Reply describing the expected reply frame.
+        :param latency: time (in seconds) from writing the command to receiving its reply.
+        """
+
+        self.record_outcome(opcode, bytes_out, len(recv), None if reply.need(recv) else recv[0] == OK_CODE[0],
+                            latency)
+
+    def record_outcome(self, opcode, bytes_out, bytes_in, ok, latency):
+        """Account for one command whose reply was read piecewise, without the raw reply bytes at hand.
+
+        :param opcode: command opcode.
+        :param bytes_out: size of the command frame written.
+        :param bytes_in: number of reply bytes received.
+        :param ok: True if the reply status is OK, False if it is not, None if the reply timed out.
+        :param latency: time (in seconds) from writing the command to receiving its reply.
+        """
+
+        stats = self._stats.get(opcode)
+        if stats is None:
+            stats = self._stats[opcode] = _OpcodeStats(len(self.buckets) + 1)
+        stats.calls += 1
+        stats.bytes_out += bytes_out
+        stats.bytes_in += bytes_in
+        if ok is None:
+            stats.timeouts += 1
+        elif ok:
+            stats.ok += 1
+        else:
+            stats.ko += 1
+        stats.latency_sum += latency
+
+        # linear scan, the bucket list is short and most commands land in the first few buckets
+        index = 0
+        for bound in self.buckets:
+            if latency <= bound:
+                break
+            index += 1
+        stats.buckets[index] += 1
+
+    def snapshot(self):
+        """Return a copy of the counters.
+
+        :return: dict of opcode (int) -> OpcodeSnapshot.
+        """
+
+        return {opcode: OpcodeSnapshot(stats.calls, stats.bytes_out, stats.bytes_in, stats.ok, stats.ko,
+                                       stats.timeouts, stats.latency_sum, tuple(stats.buckets))
+                for opcode, stats in self._stats.items()}
+
+    def reset(self):
+        """Clear every counter."""
+        self._stats.clear()
+
+    def add_exporter(self, exporter):
+        """Register an exporter, a callable taking (snapshot, buckets) called by export()."""
+        self.exporters.append(exporter)
+
+    def export(self):
+        """Take a snapshot and hand it over to every registered exporter."""
+
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter(snapshot, self.buckets)
+
+
+def prometheus_text(snapshot, buckets=LATENCY_BUCKETS, prefix="rfm69", labels=None):
+    """Format a CommandMetrics snapshot in the Prometheus text exposition format.
+
+    :param snapshot: result of CommandMetrics.snapshot().
+    :param buckets: bucket bounds of the snapshot's histograms.
+    :param prefix: metric name prefix.
+    :param labels: dict of extra labels added to every sample, e.g. {"port": "/dev/ttyACM0"}.
+    :return: str holding the metrics.
+    """
+
+    extra = "".join(',%s="%s"' % (name, value) for name, value in (labels or {}).items())
+    lines = []
+
+    counters = (('commands_total', 'calls', "Commands sent"),
+                ('bytes_out_total', 'bytes_out', "Command bytes written"),
+                ('bytes_in_total', 'bytes_in', "Reply bytes read"))
+    for name, field, help_text in counters:
+        lines.append("# HELP %s_%s %s." % (prefix, name, help_text))
+        lines.append("# TYPE %s_%s counter" % (prefix, name))
+        for opcode, stats in sorted(snapshot.items()):
+            lines.append('%s_%s{opcode="0x%02X"%s} %d' % (prefix, name, opcode, extra, getattr(stats, field)))
+
+    lines.append("# HELP %s_replies_total Replies by outcome." % prefix)
+    lines.append("# TYPE %s_replies_total counter" % prefix)
+    for opcode, stats in sorted(snapshot.items()):
+        for outcome, count in (('ok', stats.ok), ('ko', stats.ko), ('timeout', stats.timeouts)):
+            lines.append('%s_replies_total{opcode="0x%02X",outcome="%s"%s} %d'
+                         % (prefix, opcode, outcome, extra, count))
+
+    lines.append("# HELP %s_command_latency_seconds Time from command to complete reply." % prefix)
+    lines.append("# TYPE %s_command_latency_seconds histogram" % prefix)
+    for opcode, stats in sorted(snapshot.items()):
+        labels_text = 'opcode="0x%02X"%s' % (opcode, extra)
+        cumulative = 0
+        for bound, count in zip(buckets + (float('inf'),), stats.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float('inf') else repr(bound)
+            lines.append('%s_command_latency_seconds_bucket{%s,le="%s"} %d' % (prefix, labels_text, le, cumulative))
+        lines.append('%s_command_latency_seconds_sum{%s} %r' % (prefix, labels_text, stats.latency_sum))
+        lines.append('%s_command_latency_seconds_count{%s} %d' % (prefix, labels_text, stats.calls))
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusTextFile:
+    """Exporter writing the metrics to a file in the Prometheus text format, e.g. for node_exporter's textfile
+    collector. The file is replaced atomically.
+
+    :param path: path of the .prom file.
+    :param prefix: metric name prefix.
+    :param labels: dict of extra labels added to every sample.
+    """
+
+    def __init__(self, path, prefix="rfm69", labels=None):
+        self.path = path
+        self.prefix = prefix
+        self.labels = labels
+
+    def __call__(self, snapshot, buckets):
+        text = prometheus_text(snapshot, buckets, self.prefix, self.labels)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(text)
+        os.replace(tmp_path, self.path)
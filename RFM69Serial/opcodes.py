@@ -0,0 +1,135 @@
+# RFM69 Serial opcode table
+
+"""Declarative table of the bridge commands.
+
+Each entry gives the opcode, the layout of its arguments and the layout of the data bytes following an 'y'
+status, as struct format strings. The layouts are compiled once into struct.Struct objects, so building a command
+frame, in either framing, takes a single pack call:
+
+    '$' command:    '$', opcode, arguments
+    framed command: '#', opcode, length of the arguments, arguments
+
+Commands carrying a payload (a message, register values...) have its length as their last argument; the payload
+bytes follow the packed header.
+"""
+
+import struct
+
+from RFM69Serial.protocol import START_CODE, FRAME_CODE
+
+_START = START_CODE[0]
+_FRAME = FRAME_CODE[0]
+
+
+class Command:
+    """Layout of one bridge command.
+
+    :param name: name of the firmware function the command covers.
+    :param opcode: command opcode.
+    :param request: struct format of the fixed arguments, '' for none.
+    :param response: struct format of the fixed data bytes following an 'y' status, None for a plain status reply
+        (or a reply whose size depends on the arguments).
+    :param payload_unit: bytes per item counted by the last argument, 0 for fixed-size commands.
+    """
+
+    __slots__ = 'name', 'opcode', 'payload_unit', 'request', 'framed_request', 'response'
+
+    def __init__(self, name, opcode, request='', response=None, payload_unit=0):
+        self.name = name
+        self.opcode = opcode
+        self.payload_unit = payload_unit
+        self.request = struct.Struct('<BB' + request)
+        self.framed_request = struct.Struct('<BBB' + request)
+        self.response = struct.Struct('<' + response) if response is not None else None
+
+    def __repr__(self):
+        return "Command(%r, 0x%02X)" % (self.name, self.opcode)
+
+    @property
+    def header_size(self):
+        """Size of the '$' command without its payload."""
+        return self.request.size
+
+    def encode(self, framed, *args, extra=0):
+        """Build the command frame.
+
+        :param framed: True for a framed command, False for a '$' command.
+        :param args: values of the fixed arguments.
+        :param extra: number of payload bytes the caller appends to the frame.
+        :return: command frame (bytes).
+        """
+
+        if framed:
+            return self.framed_request.pack(_FRAME, self.opcode, self.framed_request.size - 3 + extra, *args)
+        return self.request.pack(_START, self.opcode, *args)
+
+    def encode_into(self, buffer, framed, *args, extra=0):
+        """Build the command frame header at the start of @buffer, see encode().
+
+        :return: size of the header written.
+        """
+
+        if framed:
+            layout = self.framed_request
+            layout.pack_into(buffer, 0, _FRAME, self.opcode, layout.size - 3 + extra, *args)
+        else:
+            layout = self.request
+            layout.pack_into(buffer, 0, _START, self.opcode, *args)
+        return layout.size
+
+    def decode(self, buf):
+        """Unpack the fixed data bytes of the 'y' reply @buf.
+
+        :return: tuple of the response fields.
+        """
+        return self.response.unpack_from(buf, 1)
+
+
+INITIALIZE = Command('initialize', 0x00, 'BBBB')                 # address, network, CS pin, IRQ pin
+SET_ADDRESS = Command('setAddress', 0x01, 'B')
+SET_NETWORK = Command('setNetwork', 0x02, 'B')
+SEND = Command('send', 0x03, 'BBB', payload_unit=1)             # target, ACK request, length
+SEND_WITH_RETRY = Command('sendWithRetry', 0x04, 'BBBB', payload_unit=1)     # target, retries, time-out, length
+RECEIVE_BEGIN = Command('receiveBegin', 0x05)
+RECEIVE_DONE = Command('receiveDone', 0x06)
+ACK_RECEIVED = Command('ACKReceived', 0x07, 'B')
+ACK_REQUESTED = Command('ACKRequested', 0x08)
+SEND_ACK = Command('sendACK', 0x09, 'B', payload_unit=1)
+GET_FREQUENCY = Command('getFrequency', 0x0A, response='BBB')   # REG_FRFMSB, REG_FRFMID, REG_FRFLSB
+SET_FREQUENCY = Command('setFrequency', 0x0B, 'I')
+ENCRYPT_OFF = Command('encrypt', 0x0C, 'B')
+ENCRYPT = Command('encrypt', 0x0C, 'B16s')
+SET_CS = Command('setCS', 0x0D, 'B')
+SET_IRQ = Command('setIrq', 0x0E, 'B')
+READ_RSSI = Command('readRSSI', 0x0F, 'B', 'B')                 # force trigger; -RSSI
+SPY_MODE = Command('spyMode', 0x10, 'B')
+SET_HIGH_POWER = Command('setHighPower', 0x11, 'B')
+SET_POWER_LEVEL = Command('setPowerLevel', 0x12, 'B')
+GET_POWER_LEVEL = Command('getPowerLevel', 0x14, response='B')
+SLEEP = Command('sleep', 0x15)
+READ_TEMPERATURE = Command('readTemperature', 0x16, 'b', 'b')   # calibration factor; degrees Celsius
+RC_CALIBRATION = Command('rcCalibration', 0x17)
+SET_300KBPS = Command('set300KBPS', 0x18)
+SET_LNA = Command('setLNA', 0x19, 'B', 'B')                     # new REG_LNA value; previous REG_LNA value
+READ_REG = Command('readReg', 0x1A, 'B', 'B')
+WRITE_REG = Command('writeReg', 0x1B, 'BB')
+READ_REGS = Command('readRegs', 0x1C, 'BB')                     # start, count; count values
+WRITE_REGS = Command('writeRegs', 0x1D, 'BB', payload_unit=1)   # start, count
+GET_RX_DATA = Command('getRxData', 0x1E, response='BB')         # sender, length, then the payload
+WRITE_REG_PAIRS = Command('writeRegPairs', 0x20, 'B', payload_unit=2)
+POLL_PACKET = Command('pollPacket', 0x21, 'BB', 'BBBBB', payload_unit=1)     # flags, ACK length; packet header
+SET_RX_MODE = Command('setRxMode', 0x22, 'B')
+DRAIN_PACKETS = Command('drainPackets', 0x23, 'B', 'BBBH')      # max count; count, left, capacity, overflow
+GET_CAPABILITIES = Command('getCapabilities', 0x24, response='BB')   # protocol version, CAP_* flags
+SEND_WITH_RETRY_TIMED = Command('sendWithRetryTimed', 0x25, 'BBBB', 'BB', payload_unit=1)  # attempt, RTT (ms)
+SET_RX_FILTER = Command('setRxFilter', 0x26, 'BB32s32s')        # FILTER_* flags, -RSSI, senders, targets
+SURVEY = Command('survey', 0x27, 'IIHHB')   # first frequency, spacing (Hz), channels, dwell (us), sweeps; samples
+
+# Every command of the table
+COMMANDS = (
+    INITIALIZE, SET_ADDRESS, SET_NETWORK, SEND, SEND_WITH_RETRY, RECEIVE_BEGIN, RECEIVE_DONE, ACK_RECEIVED,
+    ACK_REQUESTED, SEND_ACK, GET_FREQUENCY, SET_FREQUENCY, ENCRYPT_OFF, ENCRYPT, SET_CS, SET_IRQ, READ_RSSI,
+    SPY_MODE, SET_HIGH_POWER, SET_POWER_LEVEL, GET_POWER_LEVEL, SLEEP, READ_TEMPERATURE, RC_CALIBRATION,
+    SET_300KBPS, SET_LNA, READ_REG, WRITE_REG, READ_REGS, WRITE_REGS, GET_RX_DATA, WRITE_REG_PAIRS, POLL_PACKET,
+    SET_RX_MODE, DRAIN_PACKETS, GET_CAPABILITIES, SEND_WITH_RETRY_TIMED, SET_RX_FILTER, SURVEY,
+)
@@ -3,16 +3,23 @@
 class RFM69Packet:
     """RFM69 packet class to store received message in a defined data structure.
     Currently, each packet object contains information about sender address and received message
-    from the sender. The class also provides a public method to convert data list to string if necessary.
+    from the sender. The message is kept as an immutable bytes object; the class also provides public methods
+    to convert it to other types if necessary.
+    Packets fetched in a single transaction (e.g. pushed in streaming mode) also carry the target address, the RSSI
+    and the ACK-requested and ACK flags; these are None when unknown.
 
     __slots__ is used to reduce memory.
     """
 
-    __slots__ = '_sender_addr', '_message_data'
+    __slots__ = '_sender_addr', '_payload', '_target', '_rssi', '_ack_requested', '_ack_received'
 
-    def __init__(self, addr=0):
+    def __init__(self, addr=0, payload=b'', target=None, rssi=None, ack_requested=None, ack_received=None):
         self._sender_addr = addr
-        self._message_data = []
+        self._payload = bytes(payload)
+        self._target = target
+        self._rssi = rssi
+        self._ack_requested = ack_requested
+        self._ack_received = ack_received
 
     @property
     def sender(self):
@@ -27,24 +34,63 @@ class RFM69Packet:
         else:
             raise ValueError("Sender address must be of type int (0 <= id < 255)")
 
+    @property
+    def target(self):
+        """Address the packet was sent to (0 for broadcast), None if unknown"""
+        return self._target
+
+    @property
+    def rssi(self):
+        """Signal strength (dBm) the packet was received with, None if unknown"""
+        return self._rssi
+
+    @property
+    def ack_requested(self):
+        """True if the sender requested an ACK, None if unknown"""
+        return self._ack_requested
+
+    @property
+    def ack_received(self):
+        """True if the packet is an ACK (whose payload is the ACK payload), None if unknown"""
+        return self._ack_received
+
+    @property
+    def payload(self):
+        """Property payload holds the raw message from the sender as an immutable bytes object"""
+        return self._payload
+
+    @payload.setter
+    def payload(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self._payload = bytes(data)
+        else:
+            raise TypeError("Received data must be a bytes-like object")
+
     @property
     def message(self):
-        """Property message holds the message from the sender which a list of element type bytes()"""
-        return self._message_data
+        """Property message holds the message from the sender which a list of element type bytes().
+        Note: the list is built from the payload on every access and is kept for backward compatibility only,
+        changes to the returned list do not modify the packet. Use payload instead.
+        """
+        return [self._payload[i:i + 1] for i in range(len(self._payload))]
 
     @message.setter
     def message(self, data):
         if type(data) == list:
-            self._message_data = data
+            self._payload = b''.join(data)
         else:
             raise TypeError("Received data must be a list")
 
+    def decode(self, encoding='utf-8', errors='strict'):
+        """Decode the payload to a string, same as bytes.decode()"""
+        return self._payload.decode(encoding, errors)
+
     def message_to_string(self):
         """Convert message data list to string if string type message is required by callers.
         Note: string decode using utf-8
         """
-        return "".join([item.decode('utf-8') for item in self._message_data])
+        return self._payload.decode('utf-8')
 
     def message_to_int(self):
         """Convert message data list to a list of integer number that represents the raw value"""
-        return [ord(item) for item in self._message_data]
+        return list(self._payload)
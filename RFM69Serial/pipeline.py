@@ -0,0 +1,147 @@
+# RFM69 Serial command pipeline
+
+import time
+from collections import deque
+
+# bytes of command data the bridge can hold unread: the serial receive buffer of AVR boards (Arduino UNO...), the
+# smallest among the supported boards
+SERIAL_RX_BUFFER = 64
+
+
+class PendingReply:
+    """Handle to the reply of a command issued through a CommandPipeline.
+    The reply is decoded into the same value that the blocking Rfm69SerialDevice method would have returned.
+    """
+
+    __slots__ = '_pipeline', '_reply', '_value', '_done'
+
+    def __init__(self, pipeline, reply):
+        self._pipeline = pipeline
+        self._reply = reply
+        self._value = None
+        self._done = False
+
+    @classmethod
+    def resolved(cls, value):
+        """Create an already resolved handle, for results served without a serial transaction."""
+
+        pending = cls(None, None)
+        pending._set_result(value)
+        return pending
+
+    def done(self):
+        """Return True if the reply has been received (or timed out)."""
+        return self._done
+
+    def result(self):
+        """Return the decoded reply, reading replies from the serial port until this one is available."""
+
+        if not self._done:
+            self._pipeline.wait(self)
+        return self._value
+
+    def _set_result(self, value):
+        self._value = value
+        self._done = True
+        self._pipeline = None
+
+
+class CommandPipeline:
+    """Keep several bridge commands in flight instead of waiting for each reply in turn.
+    While the pipeline is active (used as a context manager), every Rfm69SerialDevice command method writes its
+    command straight away and returns a PendingReply. Replies are matched to commands in issue order; at most
+    @depth commands and @window bytes of command data are outstanding. A command is only written once the
+    bridge has answered enough of the earlier ones for it to fit in the window, so that the bridge's serial
+    receive buffer does not overrun; a single command longer than the window (e.g. a burst register write) is
+    written alone. Boards with larger receive buffers (Teensy, native USB) can take a larger window.
+
+    Pipelining requires bridge firmware which delimits commands by their length (any firmware from this
+    release on); older firmware merges back-to-back commands into one.
+
+    :param device: Rfm69SerialDevice object the commands are sent through.
+    :param depth: maximum number of commands awaiting a reply.
+    :param window: maximum number of command bytes awaiting a reply, at most the bridge's serial receive buffer.
+    """
+
+    def __init__(self, device, depth=8, window=SERIAL_RX_BUFFER):
+        if type(depth) != int or depth < 1:
+            raise ValueError("pipeline depth must be a positive int")
+        if type(window) != int or window < 1:
+            raise ValueError("pipeline window must be a positive int")
+        self._device = device
+        self.depth = depth
+        self.window = window
+        self._in_flight = deque()
+        self._sent = deque()        # (opcode, length, time written) of the command of each outstanding reply
+        self._in_flight_bytes = 0
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def __enter__(self):
+        # other threads' transactions would interleave with the outstanding replies, lock them out
+        self._device._lock.acquire()
+        if self._device._pipeline is not None:
+            self._device._lock.release()
+            raise RuntimeError("a command pipeline is already active on this device")
+        self._device._pipeline = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        finally:
+            self._device._pipeline = None
+            self._device._lock.release()
+
+    def submit(self, command, reply):
+        """Send a command without waiting for its reply.
+
+        :param command: complete command frame (bytes).
+        :param reply: Reply describing the expected reply frame.
+        :return: PendingReply for the command.
+        """
+
+        while self._in_flight and (len(self._in_flight) >= self.depth or
+                                   self._in_flight_bytes + len(command) > self.window):
+            self._complete_oldest()
+        pending = PendingReply(self, reply)
+        self._device._write_command(command, reply)
+        self._in_flight.append(pending)
+        self._sent.append((command[1], len(command), time.perf_counter()))
+        self._in_flight_bytes += len(command)
+        return pending
+
+    def wait(self, pending):
+        """Read replies until @pending is resolved."""
+
+        while not pending.done() and self._in_flight:
+            self._complete_oldest()
+
+    def flush(self):
+        """Read the replies of all outstanding commands."""
+
+        while self._in_flight:
+            self._complete_oldest()
+
+    def _complete_oldest(self):
+        metrics = self._device.metrics
+        pending = self._in_flight.popleft()
+        opcode, length, written = self._sent.popleft()
+        self._in_flight_bytes -= length
+        reply = pending._reply
+        buf = self._device._read_reply(reply)
+        if metrics is not None:
+            metrics.record(opcode, length, buf, reply, time.perf_counter() - written)
+        pending._set_result(reply.decode(buf))
+        if reply.need(buf):
+            # time-out: the order of later replies is lost, fail them all and resynchronise
+            now = time.perf_counter()
+            while self._in_flight:
+                stale = self._in_flight.popleft()
+                opcode, length, written = self._sent.popleft()
+                if metrics is not None:
+                    metrics.record_outcome(opcode, length, 0, None, now - written)
+                stale._set_result(stale._reply.decode(b''))
+            self._in_flight_bytes = 0
+            self._device._discard_input()
@@ -0,0 +1,203 @@
+# RFM69 Serial bridge protocol
+
+"""Command and reply framing shared by the host library and the bridge emulator.
+
+Every command starts with '$' followed by the opcode and its arguments. Every reply starts with a status byte,
+'y' (ok) or 'n' (ko). Some opcodes append data bytes to an 'y' status, which Reply objects describe.
+
+Firmware reporting CAP_FRAMED also accepts framed commands: '#', opcode, length of the arguments, arguments.
+The firmware reads those at full UART speed instead of pacing every byte of a '$' command.
+
+In streaming mode, the firmware also writes received packets unsolicited, as '!' frames, but only between two
+replies: a '!' where a reply status is expected always starts a pushed packet.
+"""
+
+START_CODE = b'$'
+FRAME_CODE = b'#'
+PUSH_CODE = b'!'
+OK_CODE = b'y'
+KO_CODE = b'n'
+
+# Capability flags reported by the capabilities query (0x24)
+PROTOCOL_VERSION = 2     # 2: packet flags include PACKET_ACK_RECEIVED
+CAP_FRAMED = 0x01
+CAP_BURST_REGISTERS = 0x02
+CAP_STREAMING = 0x04
+CAP_POLL_PACKET = 0x08
+CAP_RX_QUEUE = 0x10
+CAP_TIMED_RETRY = 0x20
+CAP_RX_FILTER = 0x40
+CAP_SURVEY = 0x80
+
+# pollPacket (0x21) flags
+POLL_AUTO_ACK = 0x01
+
+# Background receive mode (0x22) flags
+STREAM_ENABLE = 0x01
+STREAM_AUTO_ACK = 0x02
+STREAM_QUEUE = 0x04
+
+# Receive filter (0x26) flags: which criteria are on. The filter applies to streamed, queued and polled packets.
+FILTER_SENDERS = 0x01
+FILTER_TARGETS = 0x02
+FILTER_RSSI = 0x04
+ADDRESS_SET_LEN = 32    # bytes of an address set bitmap, bit (address % 8) of byte (address // 8)
+
+# Spectrum survey (0x27): first frequency and spacing (Hz, uint32 LE), channels and dwell time (us, uint16 LE),
+# sweeps. The 'y' status is followed by sweeps * channels REG_RSSIVALUE samples (-2 * RSSI), channel by channel.
+SURVEY_COMMAND_LEN = 15
+
+# Pushed packet frame: '!', sender, target, flags, -RSSI, payload length, payload.
+# pollPacket replies have the same layout, with 'y' in place of '!'; queue drain (0x23) records lack the start code.
+PUSH_HEADER_LEN = 6
+PACKET_ACK_REQUESTED = 0x01
+PACKET_ACK_SENT = 0x02
+PACKET_ACK_RECEIVED = 0x04     # the packet is an ACK (protocol version 2)
+
+# Command lengths (including '$' and opcode) for fixed-size commands
+_COMMAND_LENGTHS = {
+    0x00: 6, 0x01: 3, 0x02: 3, 0x05: 2, 0x06: 2, 0x07: 3, 0x08: 2, 0x0A: 2, 0x0B: 6,
+    0x0D: 3, 0x0E: 3, 0x0F: 3, 0x10: 3, 0x11: 3, 0x12: 3, 0x13: 2, 0x14: 2, 0x15: 2,
+    0x16: 3, 0x17: 2, 0x18: 2, 0x19: 3, 0x1A: 3, 0x1B: 4, 0x1C: 4, 0x1E: 2, 0x1F: 2, 0x22: 3, 0x23: 3,
+    0x24: 2, 0x26: 4 + 2 * ADDRESS_SET_LEN, 0x27: SURVEY_COMMAND_LEN,
+}
+
+# Variable-size commands: opcode -> (index of the count byte, header size, bytes per counted item)
+_VARIABLE_COMMANDS = {
+    0x03: (4, 5, 1),
+    0x04: (5, 6, 1),
+    0x09: (2, 3, 1),
+    0x1D: (3, 4, 1),
+    0x20: (2, 3, 2),
+    0x21: (3, 4, 1),
+    0x25: (5, 6, 1),
+}
+
+# Size of the firmware's command buffer, longer commands are truncated
+MAX_COMMAND_LEN = 0x80 + 4
+
+# Most (address, value) pairs in one sparse register write (0x20)
+MAX_REGISTER_PAIRS = 64
+
+
+def command_length(msg, count):
+    """Expected total length of the command being received, as the firmware's commandLength() computes it.
+
+    :param msg: bytes of the command received so far.
+    :param count: number of valid bytes in @msg.
+    :return: total command length in bytes, or 0 if it is not known yet (or not known at all, e.g. the echo
+        command, which is delimited by an idle receive buffer).
+    """
+
+    if count < 2:
+        return 0
+    opcode = msg[1]
+    if opcode in _COMMAND_LENGTHS:
+        return _COMMAND_LENGTHS[opcode]
+    if opcode in _VARIABLE_COMMANDS:
+        index, header, unit = _VARIABLE_COMMANDS[opcode]
+        return min(header + unit * msg[index], MAX_COMMAND_LEN) if count > index else 0
+    if opcode == 0x0C:
+        # encrypt: the 16-byte key only follows if encryption is enabled
+        return (19 if msg[2] else 3) if count > 2 else 0
+    return 0
+
+
+def push_need(buf):
+    """Number of bytes still missing from the pushed packet frame @buf, 0 once the frame is complete."""
+
+    if len(buf) < PUSH_HEADER_LEN:
+        return PUSH_HEADER_LEN - len(buf)
+    return PUSH_HEADER_LEN + buf[5] - len(buf)
+
+
+def frame_command(command):
+    """Turn a '$' command into the equivalent framed command.
+
+    :param command: complete '$' command (bytes-like).
+    :return: framed command (bytes).
+    """
+
+    return b''.join((FRAME_CODE, command[1:2], bytes((len(command) - 2,)), command[2:]))
+
+
+def unframe_command(frame):
+    """Turn a framed command back into the equivalent '$' command, as the firmware's readFrame() does.
+
+    :param frame: complete framed command (bytes-like).
+    :return: '$' command (bytes).
+    """
+
+    return b''.join((START_CODE, frame[1:2], frame[3:3 + frame[2]]))
+
+
+class Reply:
+    """Layout of the reply to a bridge command.
+    A reply is a status byte, followed (on 'y' only) by @size data bytes. If @length_index is given, the byte at
+    that position of the reply holds the number of additional payload bytes that follow the fixed part.
+
+    :param size: number of fixed data bytes following an 'y' status.
+    :param length_index: position of the payload length byte within the reply, None for fixed-size replies.
+    :param decode: callable turning the raw reply bytes into the value returned to the caller. The raw reply
+        may be incomplete if the serial port timed out.
+    """
+
+    __slots__ = 'size', 'length_index', 'decode'
+
+    def __init__(self, size=0, length_index=None, decode=None):
+        self.size = size
+        self.length_index = length_index
+        self.decode = decode if decode is not None else _decode_status
+
+    def need(self, buf):
+        """Number of bytes still missing from reply @buf, 0 once the reply is complete."""
+
+        if not buf:
+            return 1
+        if buf[0] != OK_CODE[0]:
+            return 0
+        total = 1 + self.size
+        if self.length_index is not None:
+            if len(buf) <= self.length_index:
+                return total - len(buf)
+            total += buf[self.length_index]
+        return max(total - len(buf), 0)
+
+
+class RecordReply(Reply):
+    """Layout of a reply carrying a list of variable-size records.
+    The fixed part (@size data bytes after the 'y' status) starts with the number of records. Each record is a
+    @record_header bytes header, whose last byte holds the length of the payload which follows.
+
+    :param size: number of fixed data bytes following an 'y' status, the first one being the record count.
+    :param record_header: size of the fixed part of a record.
+    :param decode: callable turning the raw reply bytes into the value returned to the caller.
+    """
+
+    __slots__ = 'record_header',
+
+    def __init__(self, size, record_header, decode=None):
+        super().__init__(size, None, decode)
+        self.record_header = record_header
+
+    def need(self, buf):
+        if not buf:
+            return 1
+        if buf[0] != OK_CODE[0]:
+            return 0
+        end = 1 + self.size
+        if len(buf) < end:
+            return end - len(buf)
+        for _ in range(buf[1]):
+            if len(buf) < end + self.record_header:
+                return end + self.record_header - len(buf)
+            end += self.record_header + buf[end + self.record_header - 1]
+        return max(end - len(buf), 0)
+
+
+def _decode_status(buf):
+    return buf == OK_CODE
+
+
+# Plain status reply used by all SET-type commands
+ACK_REPLY = Reply()
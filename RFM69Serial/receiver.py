@@ -0,0 +1,232 @@
+# RFM69 background packet receiver
+
+import threading
+import time
+
+from RFM69Serial.protocol import CAP_POLL_PACKET
+
+# Overflow policies of PacketRing
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+
+
+class PacketRing:
+    """Bounded FIFO of received packets backed by a preallocated ring buffer.
+    The ring is safe to share between one producer thread and any number of consumer threads.
+
+    :param capacity: maximum number of queued packets.
+    :param overflow: what put() does when the ring is full: DROP_OLDEST overwrites the oldest packet,
+        DROP_NEWEST discards the new packet, BLOCK waits for a consumer to make room.
+    """
+
+    def __init__(self, capacity=64, overflow=DROP_OLDEST):
+        if type(capacity) != int or capacity < 1:
+            raise ValueError("capacity must be a positive int")
+        if overflow not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError("overflow must be one of DROP_OLDEST, DROP_NEWEST or BLOCK")
+
+        self.capacity = capacity
+        self.overflow = overflow
+        self._slots = [None] * capacity
+        self._head = 0      # index of the oldest packet
+        self._count = 0
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        # statistics
+        self.queued = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def dropped(self):
+        """Total number of packets lost to overflow"""
+        return self.dropped_oldest + self.dropped_newest
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Refuse further packets and wake up every waiting thread. Queued packets can still be taken."""
+
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def open(self):
+        """Accept packets again after close()."""
+
+        with self._lock:
+            self._closed = False
+
+    def put(self, packet, timeout=None):
+        """Queue a packet according to the overflow policy.
+
+        :param packet: packet object to queue.
+        :param timeout: maximum time (in seconds) to wait for room under the BLOCK policy, None waits forever.
+        :return: True if the packet was queued, False if it was dropped (or the ring is closed).
+        """
+
+        with self._lock:
+            if self._closed:
+                return False
+            if self._count == self.capacity:
+                if self.overflow == DROP_NEWEST:
+                    self.dropped_newest += 1
+                    return False
+                elif self.overflow == DROP_OLDEST:
+                    self._slots[self._head] = None
+                    self._head = (self._head + 1) % self.capacity
+                    self._count -= 1
+                    self.dropped_oldest += 1
+                elif not self._not_full.wait_for(lambda: self._count < self.capacity or self._closed, timeout) \
+                        or self._closed:
+                    self.dropped_newest += 1
+                    return False
+
+            self._slots[(self._head + self._count) % self.capacity] = packet
+            self._count += 1
+            self.queued += 1
+            self._not_empty.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Remove and return the oldest packet.
+
+        :param timeout: maximum time (in seconds) to wait for a packet, None waits forever, 0 does not wait.
+        :return: the oldest packet, or None if the ring stayed empty or is closed and empty.
+        """
+
+        with self._lock:
+            if not self._count and timeout != 0:
+                self._not_empty.wait_for(lambda: self._count or self._closed, timeout)
+            if not self._count:
+                return None
+            packet = self._slots[self._head]
+            self._slots[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+            self._count -= 1
+            self._not_full.notify()
+            return packet
+
+
+class PacketReceiver:
+    """Background receiver which owns the poll/fetch/re-arm cycle of an Rfm69SerialDevice.
+    A dedicated thread polls receive_done(), fetches every packet with get_rx_data() and re-arms RX (all in one
+    poll_packet() transaction if the firmware supports it), pushing RFM69Packet objects into a PacketRing. The
+    application keeps using the device for sending meanwhile; the device serializes the two threads' transactions.
+
+    Example::
+
+        with PacketReceiver(dev, capacity=256) as rx:
+            for packet in rx:
+                print(packet.sender, packet.payload)
+
+    :param device: Rfm69SerialDevice object to receive from.
+    :param capacity: size of the packet ring.
+    :param overflow: overflow policy of the ring (DROP_OLDEST, DROP_NEWEST or BLOCK).
+    :param poll_interval: idle time (in seconds) between two receive_done() polls.
+    """
+
+    def __init__(self, device, capacity=64, overflow=DROP_OLDEST, poll_interval=0.002):
+        self._device = device
+        self.poll_interval = poll_interval
+        self.packets = PacketRing(capacity, overflow)
+        self.error = None       # exception which stopped the receiver thread, if any
+
+        self._thread = None
+        self._running = threading.Event()
+
+    @property
+    def is_running(self):
+        return self._running.is_set()
+
+    @property
+    def received(self):
+        """Number of packets fetched from the bridge"""
+        return self.packets.queued + self.packets.dropped_newest
+
+    @property
+    def dropped(self):
+        return self.packets.dropped
+
+    def start(self):
+        """Start the receiver thread."""
+
+        if self.is_running:
+            return self
+        self.error = None
+        # arm RX before returning, so that packets sent from now on are caught
+        self._device.begin_receive()
+        self.packets.open()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="rfm69-receiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the receiver thread. Packets already queued can still be consumed."""
+
+        self._running.clear()
+        self.packets.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def recv(self, timeout=None):
+        """Wait for the next packet.
+
+        :param timeout: maximum waiting time in seconds, None waits until a packet arrives or the receiver stops.
+        :return: RFM69Packet, or None on time-out or if the receiver stopped with an empty queue.
+        """
+        return self.packets.get(timeout)
+
+    def try_recv(self):
+        """Return the next queued packet without waiting, None if the queue is empty."""
+        return self.packets.get(0)
+
+    def __iter__(self):
+        """Yield packets as they arrive until the receiver is stopped and its queue is drained."""
+
+        while True:
+            packet = self.packets.get()
+            if packet is None:
+                return
+            yield packet
+
+    def _run(self):
+        device = self._device
+        poll = device.capabilities & CAP_POLL_PACKET
+        try:
+            while self._running.is_set():
+                if poll:
+                    packet = device.poll_packet()
+                else:
+                    with device._lock:
+                        packet = device.get_rx_data() if device.receive_done() else None
+                        if packet is not None:
+                            device.begin_receive()
+                if packet is None:
+                    time.sleep(self.poll_interval)
+                else:
+                    self.packets.put(packet)
+        except Exception as err:
+            self.error = err
+        finally:
+            self._running.clear()
+            self.packets.close()
@@ -0,0 +1,203 @@
+# RFM69 register map
+# Addresses and power-on values follow RFM69registers.h from LowPowerLab's RFM69 library.
+
+REG_FIFO = 0x00
+REG_OPMODE = 0x01
+REG_DATAMODUL = 0x02
+REG_BITRATEMSB = 0x03
+REG_BITRATELSB = 0x04
+REG_FDEVMSB = 0x05
+REG_FDEVLSB = 0x06
+REG_FRFMSB = 0x07
+REG_FRFMID = 0x08
+REG_FRFLSB = 0x09
+REG_OSC1 = 0x0A
+REG_AFCCTRL = 0x0B
+REG_LOWBAT = 0x0C
+REG_LISTEN1 = 0x0D
+REG_LISTEN2 = 0x0E
+REG_LISTEN3 = 0x0F
+REG_VERSION = 0x10
+REG_PALEVEL = 0x11
+REG_PARAMP = 0x12
+REG_OCP = 0x13
+REG_LNA = 0x18
+REG_RXBW = 0x19
+REG_AFCBW = 0x1A
+REG_OOKPEAK = 0x1B
+REG_OOKAVG = 0x1C
+REG_OOKFIX = 0x1D
+REG_AFCFEI = 0x1E
+REG_AFCMSB = 0x1F
+REG_AFCLSB = 0x20
+REG_FEIMSB = 0x21
+REG_FEILSB = 0x22
+REG_RSSICONFIG = 0x23
+REG_RSSIVALUE = 0x24
+REG_DIOMAPPING1 = 0x25
+REG_DIOMAPPING2 = 0x26
+REG_IRQFLAGS1 = 0x27
+REG_IRQFLAGS2 = 0x28
+REG_RSSITHRESH = 0x29
+REG_RXTIMEOUT1 = 0x2A
+REG_RXTIMEOUT2 = 0x2B
+REG_PREAMBLEMSB = 0x2C
+REG_PREAMBLELSB = 0x2D
+REG_SYNCCONFIG = 0x2E
+REG_SYNCVALUE1 = 0x2F
+REG_SYNCVALUE2 = 0x30
+REG_PACKETCONFIG1 = 0x37
+REG_PAYLOADLENGTH = 0x38
+REG_NODEADRS = 0x39
+REG_BROADCASTADRS = 0x3A
+REG_AUTOMODES = 0x3B
+REG_FIFOTHRESH = 0x3C
+REG_PACKETCONFIG2 = 0x3D
+REG_AESKEY1 = 0x3E
+REG_TEMP1 = 0x4E
+REG_TEMP2 = 0x4F
+REG_TESTLNA = 0x58
+REG_TESTPA1 = 0x5A
+REG_TESTPA2 = 0x5C
+REG_TESTDAGC = 0x6F
+REG_TESTAFC = 0x71
+
+# Size of the register address space exposed by readReg()/writeReg()
+REG_MAP_SIZE = 0x80
+
+# Operating modes (REG_OPMODE bits 4-2)
+RF_OPMODE_SLEEP = 0x00
+RF_OPMODE_STANDBY = 0x04
+RF_OPMODE_SYNTHESIZER = 0x08
+RF_OPMODE_TRANSMITTER = 0x0C
+RF_OPMODE_RECEIVER = 0x10
+RF_OPMODE_MASK = 0x1C
+
+# Register values after RFM69::initialize() on a 915 MHz module, network ID 101.
+# Registers which initialize() leaves untouched keep their power-on reset value.
+RESET_VALUES = {
+    REG_OPMODE: 0x04,
+    REG_DATAMODUL: 0x00,
+    REG_BITRATEMSB: 0x02,
+    REG_BITRATELSB: 0x40,
+    REG_FDEVMSB: 0x03,
+    REG_FDEVLSB: 0x33,
+    REG_FRFMSB: 0xE4,
+    REG_FRFMID: 0xC0,
+    REG_FRFLSB: 0x00,
+    REG_OSC1: 0x41,
+    REG_AFCCTRL: 0x00,
+    REG_LOWBAT: 0x02,
+    REG_LISTEN1: 0x92,
+    REG_LISTEN2: 0xF5,
+    REG_LISTEN3: 0x20,
+    REG_VERSION: 0x24,
+    REG_PALEVEL: 0x9F,
+    REG_PARAMP: 0x09,
+    REG_OCP: 0x1A,
+    REG_LNA: 0x88,
+    REG_RXBW: 0x42,
+    REG_AFCBW: 0x8B,
+    REG_OOKPEAK: 0x40,
+    REG_OOKAVG: 0x80,
+    REG_OOKFIX: 0x06,
+    REG_AFCFEI: 0x10,
+    REG_RSSICONFIG: 0x02,
+    REG_RSSIVALUE: 0xFF,
+    REG_DIOMAPPING1: 0x40,
+    REG_DIOMAPPING2: 0x07,
+    REG_IRQFLAGS1: 0x80,
+    REG_IRQFLAGS2: 0x00,
+    REG_RSSITHRESH: 220,
+    REG_PREAMBLELSB: 0x03,
+    REG_SYNCCONFIG: 0x88,
+    REG_SYNCVALUE1: 0x2D,
+    REG_SYNCVALUE2: 101,
+    0x31: 0x01,
+    0x32: 0x01,
+    0x33: 0x01,
+    0x34: 0x01,
+    0x35: 0x01,
+    0x36: 0x01,
+    REG_PACKETCONFIG1: 0x90,
+    REG_PAYLOADLENGTH: 66,
+    REG_FIFOTHRESH: 0x8F,
+    REG_PACKETCONFIG2: 0x12,
+    REG_TEMP1: 0x01,
+    REG_TESTLNA: 0x1B,
+    REG_TESTPA1: 0x55,
+    REG_TESTPA2: 0x70,
+    REG_TESTDAGC: 0x30,
+}
+
+
+def reset_register_map():
+    """Build a fresh register map holding the post-initialize() values.
+
+    :return: bytearray of REG_MAP_SIZE entries indexed by register address.
+    """
+
+    regs = bytearray(REG_MAP_SIZE)
+    for addr, value in RESET_VALUES.items():
+        regs[addr] = value
+    return regs
+
+
+# Registers whose value changes without a host write (status, measurements, mode and PA switching done by the
+# firmware). Reading REG_FIFO pops data, it is never cached either.
+VOLATILE_REGISTERS = frozenset((
+    REG_FIFO, REG_OPMODE, REG_OSC1, REG_PALEVEL, REG_AFCFEI, REG_AFCMSB, REG_AFCLSB, REG_FEIMSB, REG_FEILSB,
+    REG_RSSICONFIG, REG_RSSIVALUE, REG_DIOMAPPING1, REG_IRQFLAGS1, REG_IRQFLAGS2, REG_TEMP1, REG_TEMP2,
+    REG_TESTPA1, REG_TESTPA2,
+))
+
+
+# Addresses the datasheet marks as reserved (or leaves out of the map): never to be written
+RESERVED_REGISTERS = frozenset(tuple(range(0x14, 0x18)) + tuple(range(0x50, 0x58)) + (0x59, 0x5B) +
+                               tuple(range(0x5D, 0x6F)) + (0x70,))
+
+
+class RegisterShadow:
+    """Host-side copy of the RFM69 configuration registers.
+    Values are recorded as they are read from or written to the module. Volatile registers are never recorded,
+    so get() always misses for them.
+    Replies can be decoded long after their command was issued (pipelines, asyncio), so a recording carries the
+    epoch at which its command was issued and is discarded if the shadow has been invalidated since.
+    """
+
+    __slots__ = '_values', '_valid', 'epoch'
+
+    def __init__(self):
+        self._values = bytearray(REG_MAP_SIZE)
+        self._valid = bytearray(REG_MAP_SIZE)
+        self.epoch = 0
+
+    def get(self, addr):
+        """Return the shadowed value of register @addr, None if it is not known."""
+
+        if self._valid[addr]:
+            return self._values[addr]
+        return None
+
+    def set(self, addr, value, epoch=None):
+        """Record the current value of register @addr.
+
+        :param epoch: value of the epoch attribute when the command which produced @value was issued.
+        """
+
+        if addr not in VOLATILE_REGISTERS and (epoch is None or epoch == self.epoch):
+            self._values[addr] = value
+            self._valid[addr] = 1
+
+    def invalidate(self, *addrs):
+        """Forget the given registers, or all of them if no address is given."""
+
+        self.epoch += 1
+        if not addrs:
+            self._valid[:] = bytes(REG_MAP_SIZE)
+        for addr in addrs:
+            self._valid[addr] = 0
+
+    def snapshot(self):
+        """Return a dict {address: value} of every shadowed register."""
+        return {addr: self._values[addr] for addr in range(REG_MAP_SIZE) if self._valid[addr]}
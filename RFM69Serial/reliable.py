@@ -0,0 +1,291 @@
+# RFM69 Serial selective-repeat transport
+
+"""Reliable in-order transfers with several packets in flight.
+
+send_msg_with_retry() waits for the ACK of every packet in the bridge, so throughput is bound to one packet per
+round trip. This transport numbers segments instead and keeps up to a window of them in flight, sent with plain
+send_msg(). The receiving host answers with ACK segments carrying a cumulative sequence number and a bitmap of
+the segments received beyond it; the sending host retransmits a segment only when its own timer runs out.
+
+Segment layout (payload of one radio packet):
+
+    data: kind | flags, sequence number, up to SEGMENT_DATA_LEN data bytes
+    ACK:  kind, next expected sequence number, bitmap (uint32, little endian) of sequence numbers received
+          after it, bit i standing for (expected + 1 + i)
+
+Sequence numbers are 8 bits wide and carry on from one transfer to the next. The first segment of a transfer
+holds SEGMENT_SYN, which resynchronizes a receiver that lost track (e.g. after the sender restarted); the last one
+holds SEGMENT_FIN.
+"""
+
+import time
+
+from RFM69Serial.device import MAX_MSG_LEN
+
+SEGMENT_HEADER_LEN = 2
+SEGMENT_DATA_LEN = MAX_MSG_LEN - SEGMENT_HEADER_LEN
+SEGMENT_ACK_LEN = 6
+SEGMENT_KIND_MASK = 0xF0
+SEGMENT_DATA = 0xD0
+SEGMENT_ACK = 0xA0
+SEGMENT_SYN = 0x01
+SEGMENT_FIN = 0x02
+MAX_WINDOW = 32         # bits in the selective ACK bitmap
+MAX_BACKOFF = 8         # retransmission timeout grows up to MAX_BACKOFF * rto
+
+
+def _check_window(window):
+    if not 1 <= window <= MAX_WINDOW:
+        raise ValueError("window must be between 1 and %d segments" % MAX_WINDOW)
+
+
+class ReliableSender:
+    """Send data reliably and in order to a node running a ReliableReceiver, keeping up to @window segments in
+    flight.
+
+    Example::
+
+        dev.start_streaming()
+        sender = ReliableSender(dev, window=8)
+        sender.send(2, firmware_image)
+
+    :param device: Rfm69SerialDevice object the segments are sent through.
+    :param recv: callable taking a timeout (in seconds) and returning the next received RFM69Packet or None;
+        defaults to device.recv_packet (streaming mode). Packets other than ACKs of the current transfer are
+        discarded.
+    :param window: maximum number of unacknowledged segments (1-32).
+    :param rto: retransmission timeout (in seconds) of a segment, doubled after every retransmission (up to
+        MAX_BACKOFF times).
+    :param retries: number of retransmissions of a segment before the transfer fails.
+    """
+
+    def __init__(self, device, recv=None, window=8, rto=0.1, retries=5):
+        _check_window(window)
+        self._device = device
+        self._recv = recv if recv is not None else device.recv_packet
+        self.window = window
+        self.rto = rto
+        self.retries = retries
+
+        self._seqs = {}     # next sequence number per target
+        self._frame = bytearray(MAX_MSG_LEN)
+        self._view = memoryview(self._frame)
+
+        # statistics
+        self.segments_sent = 0
+        self.retransmissions = 0
+
+    def send(self, target, data):
+        """Send a message, split into segments.
+
+        :param target: address of the receiving node.
+        :param data: bytes-like object, of any length.
+        :return: True once every segment is acknowledged, False if a segment ran out of retransmissions.
+        """
+
+        view = memoryview(data).cast('B')
+        count = max(1, -(-len(view) // SEGMENT_DATA_LEN))
+        first = self._seqs.get(target, 0)
+        timers = {}     # unacknowledged segment index -> [deadline, retransmissions]
+        base = 0        # oldest unacknowledged segment
+        following = 0   # next segment never sent
+
+        while base < count:
+            while following < count and following < base + self.window:
+                self._send_segment(target, first, following, view, count)
+                timers[following] = [time.monotonic() + self.rto, 0]
+                following += 1
+
+            deadline = min(timer[0] for timer in timers.values())
+            packet = self._recv(max(0.0, deadline - time.monotonic()))
+            if packet is not None:
+                base = self._on_ack(packet, target, first, base, following, timers)
+                continue
+
+            now = time.monotonic()
+            for index, timer in timers.items():
+                if timer[0] > now:
+                    continue
+                if timer[1] == self.retries:
+                    # the receiver re-synchronizes on the SYN of the next transfer
+                    self._seqs[target] = (first + following) & 0xFF
+                    return False
+                timer[1] += 1
+                timer[0] = now + self.rto * min(2 ** timer[1], MAX_BACKOFF)
+                self.retransmissions += 1
+                self._send_segment(target, first, index, view, count)
+
+        self._seqs[target] = (first + count) & 0xFF
+        return True
+
+    def _send_segment(self, target, first, index, view, count):
+        frame = self._frame
+        frame[0] = SEGMENT_DATA | (SEGMENT_SYN if index == 0 else 0) | (SEGMENT_FIN if index == count - 1 else 0)
+        frame[1] = (first + index) & 0xFF
+        chunk = view[index * SEGMENT_DATA_LEN:(index + 1) * SEGMENT_DATA_LEN]
+        end = SEGMENT_HEADER_LEN + len(chunk)
+        frame[SEGMENT_HEADER_LEN:end] = chunk
+        self.segments_sent += 1
+        self._device.send_msg(target, self._view[:end])
+
+    @staticmethod
+    def _on_ack(packet, target, first, base, following, timers):
+        # apply an ACK segment, return the new oldest unacknowledged segment
+        payload = packet.payload
+        if packet.sender != target or len(payload) < SEGMENT_ACK_LEN or payload[0] != SEGMENT_ACK:
+            return base
+        ahead = (payload[1] - first - base) & 0xFF
+        if ahead > following - base:
+            return base     # stale ACK from before the window
+        for index in range(base, base + ahead):
+            timers.pop(index, None)
+        bitmap = int.from_bytes(payload[2:6], 'little')
+        index = base + ahead + 1
+        while bitmap and index < following:
+            if bitmap & 1:
+                timers.pop(index, None)
+            bitmap >>= 1
+            index += 1
+
+        base += ahead
+        while base < following and base not in timers:
+            base += 1
+        return base
+
+
+class _Peer:
+    """Receive state of one sender"""
+
+    __slots__ = 'expected', 'segments', 'unacked'
+
+    def __init__(self, expected):
+        self.expected = expected    # sequence number of the next in-order segment, None before the first SYN
+        self.segments = {}          # out-of-order segments: sequence number -> (flags, data)
+        self.unacked = 0            # in-order segments received since the last ACK
+
+
+class ReliableReceiver:
+    """Receiving side of ReliableSender transfers: acknowledges segments and delivers their data in order.
+    At most @window out-of-order segments are buffered per sender.
+
+    Example::
+
+        dev.start_streaming()
+        receiver = ReliableReceiver(dev, window=8)
+        with open("image.bin", "wb") as sink:
+            receiver.receive(dev.recv_packet, sink)
+
+    :param device: Rfm69SerialDevice object the ACKs are sent through.
+    :param window: receive window, should match the sender's (1-32).
+    :param ack_every: number of in-order segments acknowledged together. Gaps, duplicates and the last segment
+        of a transfer are always acknowledged at once; receive() acknowledges the rest after @ack_delay.
+    :param ack_delay: longest time (in seconds) receive() holds back an ACK.
+    """
+
+    def __init__(self, device, window=8, ack_every=1, ack_delay=0.01):
+        _check_window(window)
+        self._device = device
+        self.window = window
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self._peers = {}
+        self._ack = bytearray(SEGMENT_ACK_LEN)
+        self._ack[0] = SEGMENT_ACK
+
+    def feed(self, packet):
+        """Take a received segment into account, acknowledging it as needed.
+
+        :param packet: RFM69Packet holding a data segment.
+        :return: list of (data, last) tuples delivered in order by this segment, last being True for the final
+            segment of a transfer. Empty if nothing new can be delivered yet.
+        """
+
+        payload = packet.payload
+        if len(payload) < SEGMENT_HEADER_LEN or payload[0] & SEGMENT_KIND_MASK != SEGMENT_DATA:
+            return []
+        flags, seq, data = payload[0], payload[1], payload[SEGMENT_HEADER_LEN:]
+
+        peer = self._peers.get(packet.sender)
+        if peer is None:
+            peer = self._peers[packet.sender] = _Peer(None)
+        if flags & SEGMENT_SYN and peer.expected != seq:
+            # start of a new transfer, unless it is a duplicate of a segment already delivered
+            if peer.expected is None or not 0 < ((peer.expected - seq) & 0xFF) <= self.window:
+                peer.expected = seq
+                peer.segments.clear()
+        if peer.expected is None:
+            return []
+
+        offset = (seq - peer.expected) & 0xFF
+        delivered = []
+        if offset >= self.window:
+            # behind the window: a duplicate whose ACK was lost, acknowledge again
+            self._send_ack(packet.sender, peer)
+            return delivered
+        peer.segments[seq] = (flags, data)
+
+        while peer.expected in peer.segments:
+            flags, data = peer.segments.pop(peer.expected)
+            delivered.append((data, bool(flags & SEGMENT_FIN)))
+            peer.expected = (peer.expected + 1) & 0xFF
+            peer.unacked += 1
+
+        if offset or peer.segments or peer.unacked >= self.ack_every or (delivered and delivered[-1][1]):
+            self._send_ack(packet.sender, peer)
+        return delivered
+
+    def flush(self):
+        """Send the ACKs held back by @ack_every."""
+
+        for sender, peer in self._peers.items():
+            if peer.unacked:
+                self._send_ack(sender, peer)
+
+    def receive(self, recv, sink, sender=None, timeout=2.0):
+        """Receive a single transfer and write its data to @sink in order.
+
+        :param recv: callable taking a timeout (in seconds) and returning the next RFM69Packet or None, e.g.
+            PacketReceiver.recv or Rfm69SerialDevice.recv_packet.
+        :param sink: object with a write() method.
+        :param sender: only accept segments from this address, None to follow the first sender seen. Segments
+            from other senders are still acknowledged, but their data is discarded.
+        :param timeout: maximum time (in seconds) to wait for each segment.
+        :return: number of bytes written if the transfer completed, None on time-out. Should the final ACK get
+            lost, the sender retransmits the last segment: keep feeding packets to the receiver afterwards.
+        """
+
+        written = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return None
+            pending = any(peer.unacked for peer in self._peers.values())
+            packet = recv(min(deadline - now, self.ack_delay) if pending else deadline - now)
+            if packet is None:
+                self.flush()
+                continue
+            if sender is not None and packet.sender != sender:
+                self.feed(packet)
+                continue
+            delivered = self.feed(packet)
+            if not delivered:
+                continue
+            if sender is None:
+                sender = packet.sender
+            deadline = time.monotonic() + timeout
+            for data, last in delivered:
+                sink.write(data)
+                written += len(data)
+                if last:
+                    return written
+
+    def _send_ack(self, sender, peer):
+        ack = self._ack
+        ack[1] = peer.expected
+        bitmap = 0
+        for seq in peer.segments:
+            bitmap |= 1 << (((seq - peer.expected) & 0xFF) - 1)
+        ack[2:6] = bitmap.to_bytes(4, 'little')
+        peer.unacked = 0
+        self._device.send_msg(sender, ack)
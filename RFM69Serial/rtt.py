@@ -0,0 +1,110 @@
+# RFM69 Serial round-trip time estimation
+
+"""Per-node retransmission timeout and retry budget for send_msg_with_retry().
+
+Round-trip time samples are measured by the firmware (timed sendWithRetry, 0x25): the time between sending the
+attempt which got acknowledged and receiving its ACK. Only samples of first attempts are used (Karn's algorithm),
+so an ACK can never be matched to the wrong transmission. The timeout follows RFC 6298: a smoothed RTT and RTT
+variation, RTO = SRTT + 4 * RTTVAR, doubled after every timed-out first attempt until the next sample. The retry
+budget follows the observed first-attempt loss rate of the node.
+"""
+
+import math
+from array import array
+from collections import namedtuple
+
+MIN_RTO = 5             # ms, below the firmware's loop jitter
+MAX_RTO = 255           # ms, the time-out of sendWithRetry() is a single byte
+DEFAULT_RTO = 50        # ms, until the first sample
+DEFAULT_RETRIES = 2     # until the first outcome
+MAX_RETRIES = 8
+DELIVERY_TARGET = 0.999     # probability of delivery the retry budget aims at
+LOSS_GAIN = 1 / 16      # weight of the latest outcome in the loss rate average
+
+# Statistics of one node, times in ms
+NodeStats = namedtuple('NodeStats', 'address srtt rttvar rto retries loss samples sent failed')
+
+
+class RttTable:
+    """Round-trip time estimates of every node address, kept in fixed-size arrays indexed by address.
+
+    :param size: number of node addresses (256 covers every 8-bit RFM69 address).
+    """
+
+    __slots__ = '_srtt', '_rttvar', '_rto', '_loss', '_samples', '_sent', '_failed'
+
+    def __init__(self, size=256):
+        self._srtt = array('f', [0.0]) * size           # smoothed RTT, 0 before the first sample
+        self._rttvar = array('f', [0.0]) * size         # RTT variation
+        self._rto = array('B', [DEFAULT_RTO]) * size    # current time-out
+        self._loss = array('f', [0.0]) * size           # average first-attempt loss rate
+        self._samples = array('L', [0]) * size
+        self._sent = array('L', [0]) * size             # messages sent (with or without success)
+        self._failed = array('L', [0]) * size           # messages never acknowledged
+
+    def timeout(self, address):
+        """Time-out (in ms) to wait for the ACK of each attempt to @address."""
+        return self._rto[address]
+
+    def retries(self, address):
+        """Number of retries which should get a message to @address through with DELIVERY_TARGET probability."""
+
+        if not self._sent[address]:
+            return DEFAULT_RETRIES
+        loss = self._loss[address]
+        if loss <= 1 - DELIVERY_TARGET:
+            return 1
+        if loss >= 1:
+            return MAX_RETRIES
+        return min(max(math.ceil(math.log(1 - DELIVERY_TARGET) / math.log(loss)) - 1, 1), MAX_RETRIES)
+
+    def record(self, address, attempt, rtt):
+        """Account for the outcome of a message to @address.
+
+        :param address: node address.
+        :param attempt: number of the acknowledged attempt (0 for the first one), None if no ACK was received.
+        :param rtt: round-trip time (in ms) of the acknowledged attempt.
+        """
+
+        self._sent[address] += 1
+        if attempt is None:
+            self._failed[address] += 1
+        loss = self._loss[address]
+        if attempt != 0:
+            self._loss[address] = loss + (1 - loss) * LOSS_GAIN
+            self._rto[address] = min(2 * self._rto[address], MAX_RTO)
+            return
+        self._loss[address] = loss - loss * LOSS_GAIN
+
+        # RFC 6298 update
+        if not self._samples[address]:
+            srtt, rttvar = rtt, rtt / 2
+        else:
+            srtt, rttvar = self._srtt[address], self._rttvar[address]
+            rttvar = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+            srtt = 0.875 * srtt + 0.125 * rtt
+        self._srtt[address] = srtt
+        self._rttvar[address] = rttvar
+        self._samples[address] += 1
+        self._rto[address] = min(max(math.ceil(srtt + max(1, 4 * rttvar)), MIN_RTO), MAX_RTO)
+
+    def reset(self, address=None):
+        """Forget what is known of @address, or of every node if @address is None."""
+
+        addresses = range(len(self._rto)) if address is None else (address,)
+        for address in addresses:
+            self._srtt[address] = self._rttvar[address] = self._loss[address] = 0
+            self._rto[address] = DEFAULT_RTO
+            self._samples[address] = self._sent[address] = self._failed[address] = 0
+
+    def stats(self, address):
+        """Statistics of the link to @address, as a NodeStats tuple (srtt and rttvar are None without samples)."""
+
+        sampled = bool(self._samples[address])
+        return NodeStats(address, self._srtt[address] if sampled else None,
+                         self._rttvar[address] if sampled else None, self._rto[address], self.retries(address),
+                         self._loss[address], self._samples[address], self._sent[address], self._failed[address])
+
+    def nodes(self):
+        """Statistics of every node a message was sent to, as a list of NodeStats tuples."""
+        return [self.stats(address) for address in range(len(self._rto)) if self._sent[address]]
@@ -0,0 +1,363 @@
+# RFM69 Serial transmit scheduler
+
+"""Prioritized, coalescing transmission of many small messages.
+
+Every send_msg() call costs one serial transaction and one radio frame, however short the message. TxScheduler
+queues outbound messages per priority class and destination instead, and a background thread sends them: due
+messages of a higher class go first, destinations of the same class take turns. Small messages queued for the same
+destination within @linger seconds are packed into a single frame, which saves both airtime and serial round trips
+when traffic comes in bursts.
+
+A batch frame starts with BATCH_MARKER, followed by the messages, each one prefixed with its length (one byte)::
+
+    BATCH_MARKER | len1 | message1 | len2 | message2 | ...
+
+A message which travels alone is sent as is, unless it starts with BATCH_MARKER itself: it is then wrapped into a
+batch of one, so that receivers can always tell batches apart. On the receiving side, unpack_messages() or
+split_packet() recover the messages of a frame.
+"""
+
+import threading
+import time
+from collections import deque
+
+from RFM69Serial.device import MAX_MSG_LEN, _payload_view
+from RFM69Serial.packet import RFM69Packet
+
+# Priority classes, most urgent first
+PRIORITY_CONTROL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+_PRIORITIES = (PRIORITY_CONTROL, PRIORITY_NORMAL, PRIORITY_BULK)
+
+BATCH_MARKER = 0xB0
+BATCH_HEADER_LEN = 1
+MAX_BATCHED_LEN = MAX_MSG_LEN - BATCH_HEADER_LEN - 1    # longest message which fits in a batch
+
+
+def pack_messages(messages):
+    """Pack messages into a single batch frame.
+
+    :param messages: bytes-like objects of at most MAX_BATCHED_LEN bytes each.
+    :return: the frame payload (bytes).
+    """
+
+    frame = bytearray((BATCH_MARKER,))
+    for message in messages:
+        frame.append(len(message))
+        frame += message
+    if len(frame) > MAX_MSG_LEN:
+        raise ValueError("the messages take %d bytes, a frame holds at most %d bytes" % (len(frame), MAX_MSG_LEN))
+    return bytes(frame)
+
+
+def unpack_messages(payload):
+    """Split a received frame payload into the messages it carries.
+
+    :param payload: payload of the received packet (bytes).
+    :return: list of messages (bytes): those of a batch frame, or the payload itself for any other frame.
+        None if the payload is a malformed batch.
+    """
+
+    if not payload or payload[0] != BATCH_MARKER:
+        return [bytes(payload)]
+    view = memoryview(payload)
+    messages = []
+    offset = BATCH_HEADER_LEN
+    while offset < len(view):
+        end = offset + 1 + view[offset]
+        if end > len(view):
+            return None
+        messages.append(bytes(view[offset + 1:end]))
+        offset = end
+    return messages
+
+
+def split_packet(packet):
+    """Split a received packet into one packet per message it carries, with the sender, target, RSSI and flags of
+    the frame.
+
+    :param packet: RFM69Packet.
+    :return: list of RFM69Packet (@packet itself if it is not a batch), None if it is a malformed batch.
+    """
+
+    payload = packet.payload
+    if not payload or payload[0] != BATCH_MARKER:
+        return [packet]
+    messages = unpack_messages(payload)
+    if messages is None:
+        return None
+    return [RFM69Packet(packet.sender, message, packet.target, packet.rssi, packet.ack_requested,
+                        packet.ack_received) for message in messages]
+
+
+class _Message:
+    """A queued outbound message"""
+
+    __slots__ = 'payload', 'reliable', 'callback', 'queued'
+
+    def __init__(self, payload, reliable, callback, queued):
+        self.payload = payload
+        self.reliable = reliable
+        self.callback = callback
+        self.queued = queued
+
+
+class TxScheduler:
+    """Send messages from a background thread, by priority class and coalesced per destination.
+
+    Messages wait at most @linger seconds for others to the same destination (plus the time it takes to send the
+    frames ahead of them); a destination whose queue already fills a frame is served at once. Control messages
+    never wait: they are sent with whatever other control messages are queued for their destination. Within a
+    frame, messages keep the order they were queued in.
+
+    Example::
+
+        with TxScheduler(dev, linger=0.005) as tx:
+            tx.send(2, b'\\x01' + reading, PRIORITY_BULK)
+            tx.send(2, b'\\x02' + status)
+            tx.send(3, b'stop', PRIORITY_CONTROL, reliable=True)
+
+        # receiving side
+        for message in split_packet(dev.recv_packet()):
+            handle(message.sender, message.payload)
+
+    :param device: Rfm69SerialDevice object the frames are sent through.
+    :param linger: longest time (in seconds) a message is held back waiting for others to coalesce with.
+    :param coalesce: pack messages to the same destination into batch frames; if False every message is sent in
+        its own frame, still in priority order.
+    :param limit: maximum number of queued messages per priority class and destination.
+    :param retries: retries of frames holding a reliable message, see send_msg_with_retry().
+    :param time_out: time-out (in ms) of frames holding a reliable message, see send_msg_with_retry().
+    """
+
+    def __init__(self, device, linger=0.005, coalesce=True, limit=64, retries=None, time_out=None):
+        self._device = device
+        self.linger = linger
+        self.coalesce = coalesce
+        self.limit = limit
+        self.retries = retries
+        self.time_out = time_out
+        self.error = None       # last exception raised by sending a frame or by a callback, if any
+
+        self._queues = {}                               # (priority, target) -> deque of _Message
+        self._turns = [deque() for _ in _PRIORITIES]    # destinations with queued messages, per priority class
+        self._pending = 0       # queued messages
+        self._in_flight = 0     # messages of the frame being sent
+        self._flushing = 0      # flush() calls in progress
+        self._drain = False
+        self._running = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+        # statistics
+        self.messages_sent = 0
+        self.frames_sent = 0
+        self.failed = 0         # messages of frames which could not be sent
+        self.rejected = 0       # messages refused by send() because their queue was full
+
+    def __len__(self):
+        return self._pending
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        """Start the scheduler thread."""
+
+        with self._cond:
+            if self._running:
+                return self
+            self.error = None
+            self._running = True
+            self._drain = False
+        self._thread = threading.Thread(target=self._run, name="rfm69-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush=True):
+        """Stop the scheduler thread.
+
+        :param flush: send the queued messages first; otherwise they are dropped and their callbacks called with
+            False.
+        """
+
+        with self._cond:
+            self._running = False
+            self._drain = flush
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self._discard()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def send(self, target, msg, priority=PRIORITY_NORMAL, reliable=False, callback=None):
+        """Queue a message.
+
+        :param target: address of the receiving node.
+        :param msg: message, see send_msg(). With coalescing, a message starting with BATCH_MARKER must be at most
+            MAX_BATCHED_LEN bytes long.
+        :param priority: PRIORITY_CONTROL, PRIORITY_NORMAL or PRIORITY_BULK.
+        :param reliable: send the frame carrying the message with send_msg_with_retry().
+        :param callback: callable taking the result of the frame carrying the message (True if sent, and
+            acknowledged for reliable frames), called from the scheduler thread. An exception it raises is stored
+            in error.
+        :return: True if the message is queued, False if its queue is full or the scheduler is not running.
+        """
+
+        # check type
+        assert type(target) == int
+        if priority not in _PRIORITIES:
+            raise ValueError("priority must be one of PRIORITY_CONTROL, PRIORITY_NORMAL or PRIORITY_BULK")
+        payload = bytes(_payload_view(msg))
+        if self.coalesce and payload[:1] == bytes((BATCH_MARKER,)) and len(payload) > MAX_BATCHED_LEN:
+            raise ValueError("a message starting with BATCH_MARKER is at most %d bytes long" % MAX_BATCHED_LEN)
+
+        with self._cond:
+            if not self._running:
+                return False
+            key = priority, target
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            elif len(queue) >= self.limit:
+                self.rejected += 1
+                return False
+            if not queue:
+                self._turns[priority].append(target)
+            queue.append(_Message(payload, reliable, callback, time.monotonic()))
+            self._pending += 1
+            self._cond.notify_all()
+            return True
+
+    def flush(self, timeout=None):
+        """Send every queued message without waiting for the linger time to run out.
+
+        :param timeout: maximum waiting time in seconds, None waits until every message is sent.
+        :return: True once the queues are empty, False on time-out or if the scheduler stopped with queued messages.
+        """
+
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not (self._pending or self._in_flight) or not self._running,
+                                           timeout) and not (self._pending or self._in_flight)
+            finally:
+                self._flushing -= 1
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while True:
+                        if not self._running and not (self._drain and self._pending):
+                            return
+                        now = time.monotonic()
+                        hurry = self._flushing or not self._running
+                        target, batch, wake = self._pick(now, hurry)
+                        if batch:
+                            break
+                        self._cond.wait(None if wake is None else wake - now)
+                    self._pending -= len(batch)
+                    self._in_flight = len(batch)
+                self._send(target, batch)
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+        except Exception as err:
+            self.error = err
+        finally:
+            with self._cond:
+                self._running = False
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _pick(self, now, hurry):
+        # take the messages of the next frame: the first destination, by priority class and turn, whose messages
+        # are due; return (target, messages, None), or (None, None, time the first queue becomes due)
+        wake = None
+        for priority, turns in zip(_PRIORITIES, self._turns):
+            for target in turns:
+                queue = self._queues[priority, target]
+                due = queue[0].queued + self.linger
+                if hurry or priority == PRIORITY_CONTROL or not self.coalesce or now >= due or \
+                        not self._fits(queue):
+                    batch = self._take(queue)
+                    turns.remove(target)
+                    if queue:
+                        turns.append(target)
+                    return target, batch, None
+                if wake is None or due < wake:
+                    wake = due
+        return None, None, wake
+
+    @staticmethod
+    def _fits(queue):
+        # True if every message of @queue fits in a single batch frame
+        size = BATCH_HEADER_LEN
+        for message in queue:
+            size += 1 + len(message.payload)
+            if size > MAX_MSG_LEN:
+                return False
+        return True
+
+    def _take(self, queue):
+        batch = [queue.popleft()]
+        if self.coalesce:
+            size = BATCH_HEADER_LEN + 1 + len(batch[0].payload)
+            while queue and size + 1 + len(queue[0].payload) <= MAX_MSG_LEN:
+                size += 1 + len(queue[0].payload)
+                batch.append(queue.popleft())
+        return batch
+
+    def _send(self, target, batch):
+        payload = batch[0].payload
+        if len(batch) > 1 or (self.coalesce and payload[:1] == bytes((BATCH_MARKER,))):
+            payload = pack_messages([message.payload for message in batch])
+        try:
+            if any(message.reliable for message in batch):
+                sent = self._device.send_msg_with_retry(target, payload, self.retries, self.time_out)
+            else:
+                sent = self._device.send_msg(target, payload)
+        except Exception as err:
+            # e.g. a serial write time-out: the frame is lost, the following ones may still go through
+            self.error = err
+            sent = False
+
+        self.frames_sent += 1
+        if sent:
+            self.messages_sent += len(batch)
+        else:
+            self.failed += len(batch)
+        for message in batch:
+            self._notify(message, sent)
+
+    def _discard(self):
+        # drop the messages left after the thread stopped
+        with self._cond:
+            dropped = [message for queue in self._queues.values() for message in queue]
+            self._queues.clear()
+            for turns in self._turns:
+                turns.clear()
+            self._pending = 0
+            self.failed += len(dropped)
+            self._cond.notify_all()
+        for message in dropped:
+            self._notify(message, False)
+
+    def _notify(self, message, sent):
+        if message.callback is None:
+            return
+        try:
+            message.callback(sent)
+        except Exception as err:
+            # a failing callback must not stop the scheduler, nor keep the other callbacks from being called
+            self.error = err
@@ -0,0 +1,202 @@
+# RFM69 Serial network sniffer
+
+"""Round-the-clock monitoring of the traffic of a whole RFM69 network.
+
+sniff() switches a bridge to spy (promiscuous) mode and streaming mode, with the sender, target and RSSI criteria
+pushed to the firmware's receive filter so that only matching packets cross the serial link. The other functions
+are generator stages, each taking a stream and returning a stream, so a monitoring pipeline is a chain of them::
+
+    stop = threading.Event()
+    stream = sniff(dev, senders=range(10, 40), min_rssi=-95, stop=stop)
+    stream = decode(stream, lambda packet: struct.unpack('<hH', packet.payload[:4]))
+    stream = aggregate(stream, interval=60, report=print)
+    with RotatingCaptureWriter("/var/lib/rfm69", max_bytes=16 << 20, keep=100) as writer:
+        drain(write_capture(stream, writer))
+
+Streams carry SniffedPacket tuples, interleaved with None ticks whenever no packet arrived for a while. Every stage
+passes ticks on, so that time-driven stages (batched writes, periodic reports) keep going on a quiet network.
+"""
+
+import time
+from collections import namedtuple
+
+from RFM69Serial.protocol import CAP_STREAMING, CAP_RX_FILTER
+
+# A received packet: reception time (seconds since the epoch), RFM69Packet, packets dropped by the host-side ring
+# since sniffing started, and the value attached by decode() (None until then)
+SniffedPacket = namedtuple('SniffedPacket', 'time packet dropped value')
+
+# Traffic of one sender over a report interval, RSSI in dBm
+NodeTraffic = namedtuple('NodeTraffic', 'packets bytes min_rssi max_rssi mean_rssi')
+
+# Traffic over a report interval: start and end times, packets seen and dropped, dict of sender -> NodeTraffic
+TrafficReport = namedtuple('TrafficReport', 'start end packets dropped nodes')
+
+
+def _matcher(senders, targets, min_rssi):
+    # host-side equivalent of the firmware's receive filter
+    senders = frozenset(senders) if senders is not None else None
+    targets = frozenset(targets) if targets is not None else None
+
+    def match(packet):
+        return (senders is None or packet.sender in senders) and \
+               (targets is None or packet.target in targets) and \
+               (min_rssi is None or packet.rssi >= min_rssi)
+    return match
+
+
+def sniff(device, senders=None, targets=None, min_rssi=None, capacity=4096, tick=0.5, stop=None):
+    """Stream the packets of the whole network, as heard by the bridge.
+    The bridge is left in spy mode with its filter set for as long as the stream runs; closing the stream (or
+    setting @stop) switches streaming, spy mode and the filter back off. Firmware without receive filters forwards
+    every packet, they are filtered on the host instead.
+
+    :param device: Rfm69SerialDevice of the listening bridge, whose firmware must support streaming mode.
+    :param senders: sender addresses to keep, None for any.
+    :param targets: target addresses to keep (0 being broadcast), None for any.
+    :param min_rssi: weakest signal strength (dBm) to keep, None for any.
+    :param capacity: size of the host-side packet ring, which absorbs bursts while later stages are busy.
+    :param tick: idle time (in seconds) after which a None tick is yielded.
+    :param stop: threading.Event ending the stream once set, None to run until the stream is closed.
+    :return: generator of SniffedPacket (and None ticks).
+    """
+
+    if not device.capabilities & CAP_STREAMING:
+        raise RuntimeError("the bridge firmware does not support streaming mode, please update it")
+    filtered = bool(device.capabilities & CAP_RX_FILTER)
+    match = None if filtered else _matcher(senders, targets, min_rssi)
+
+    if filtered:
+        device.set_rx_filter(senders, targets, min_rssi)
+    device.set_spy(True)
+    try:
+        if not device.start_streaming(capacity=capacity):
+            raise RuntimeError("the bridge did not switch to streaming mode")
+        ring = device.stream_packets
+        while stop is None or not stop.is_set():
+            packet = ring.get(tick)
+            if packet is None:
+                if ring.closed and not len(ring):
+                    break
+                yield None
+            elif match is None or match(packet):
+                yield SniffedPacket(time.time(), packet, ring.dropped, None)
+    finally:
+        device.stop_streaming()
+        device.set_spy(False)
+        if filtered:
+            device.set_rx_filter()
+
+
+def filter_packets(stream, senders=None, targets=None, min_rssi=None, predicate=None):
+    """Keep the packets matching every given criterion, e.g. to narrow down a capture being replayed.
+
+    :param stream: stream of SniffedPacket.
+    :param senders: sender addresses to keep, None for any.
+    :param targets: target addresses to keep, None for any.
+    :param min_rssi: weakest signal strength (dBm) to keep, None for any.
+    :param predicate: callable taking a SniffedPacket, returning True to keep it.
+    """
+
+    match = _matcher(senders, targets, min_rssi)
+    for item in stream:
+        if item is None or (match(item.packet) and (predicate is None or predicate(item))):
+            yield item
+
+
+def decode(stream, decoder):
+    """Attach a decoded value to every packet.
+
+    :param stream: stream of SniffedPacket.
+    :param decoder: callable taking an RFM69Packet and returning its value, or a dict of sender address ->
+        callable (packets of other senders get None). A decoder raising an exception leaves the value None.
+    """
+
+    for item in stream:
+        if item is not None:
+            func = decoder.get(item.packet.sender) if isinstance(decoder, dict) else decoder
+            if func is not None:
+                try:
+                    item = item._replace(value=func(item.packet))
+                except Exception:
+                    pass
+        yield item
+
+
+def aggregate(stream, interval=60.0, report=None):
+    """Pass the stream on unchanged while collecting per-sender traffic statistics, handed over to @report as a
+    TrafficReport every @interval seconds (and once more when the stream ends). The dropped count of a report is
+    the number of packets the host-side ring dropped since the previous report, as known from the latest packet.
+
+    :param stream: stream of SniffedPacket.
+    :param interval: report interval in seconds.
+    :param report: callable taking a TrafficReport.
+    """
+
+    nodes = {}      # sender -> [packets, bytes, min RSSI, max RSSI, RSSI sum]
+    start = time.time()
+    packets = 0
+    dropped = reported = 0      # packets dropped since sniffing started, as of the latest packet and last report
+    for item in stream:
+        if item is not None:
+            packet = item.packet
+            rssi = packet.rssi
+            stats = nodes.get(packet.sender)
+            if stats is None:
+                nodes[packet.sender] = [1, len(packet.payload), rssi, rssi, rssi]
+            else:
+                stats[0] += 1
+                stats[1] += len(packet.payload)
+                stats[2] = min(stats[2], rssi)
+                stats[3] = max(stats[3], rssi)
+                stats[4] += rssi
+            packets += 1
+            dropped = item.dropped
+        now = time.time()
+        if now - start >= interval:
+            if report is not None:
+                report(_traffic_report(start, now, packets, dropped - reported, nodes))
+            nodes = {}
+            start = now
+            packets = 0
+            reported = dropped
+        yield item
+    if report is not None and packets:
+        report(_traffic_report(start, time.time(), packets, dropped - reported, nodes))
+
+
+def _traffic_report(start, end, packets, dropped, nodes):
+    return TrafficReport(start, end, packets, dropped,
+                         {sender: NodeTraffic(count, size, low, high, total / count)
+                          for sender, (count, size, low, high, total) in nodes.items()})
+
+
+def write_capture(stream, writer):
+    """Write every packet to a capture, passing the stream on unchanged.
+
+    :param stream: stream of SniffedPacket.
+    :param writer: RotatingCaptureWriter; ticks flush its pending records once they are flush_interval old.
+    """
+
+    try:
+        for item in stream:
+            if item is None:
+                writer.flush(force=False)
+            else:
+                writer.packet(item.packet)
+            yield item
+    finally:
+        writer.flush()
+
+
+def drain(stream):
+    """Run a pipeline to its end, discarding what comes out of it.
+
+    :return: number of packets which went through.
+    """
+
+    count = 0
+    for item in stream:
+        if item is not None:
+            count += 1
+    return count
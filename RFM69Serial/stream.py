@@ -0,0 +1,178 @@
+# RFM69 Serial streaming mode demultiplexer
+
+import threading
+import time
+from collections import deque
+
+from RFM69Serial.packet import RFM69Packet
+from RFM69Serial.protocol import PUSH_CODE, PACKET_ACK_REQUESTED, PACKET_ACK_RECEIVED, push_need
+from RFM69Serial.receiver import PacketRing, DROP_OLDEST, BLOCK
+
+
+_LATE_REPLY_GRACE = 1.0    # seconds an abandoned reply is awaited on a port without time-out
+
+
+class _ExpectedReply:
+    """Reply awaited by a command sent while the demultiplexer runs"""
+
+    __slots__ = 'reply', 'buf', 'done', 'abandoned'
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.buf = bytearray()
+        self.done = False
+        self.abandoned = None       # time.monotonic() at which its command gave up waiting, None while awaited
+
+
+def _frame_to_packet(frame):
+    # pushed packet frame or pollPacket reply: start code, sender, target, flags, -RSSI, length, payload
+    return RFM69Packet(frame[1], frame[6:], target=frame[2], rssi=-frame[4],
+                       ack_requested=bool(frame[3] & PACKET_ACK_REQUESTED),
+                       ack_received=bool(frame[3] & PACKET_ACK_RECEIVED))
+
+
+class StreamDemultiplexer:
+    """Reader of an Rfm69SerialDevice's serial port while the bridge is in streaming mode.
+    In streaming mode the firmware pushes received packets as '!' frames in between command replies. A dedicated
+    thread reads everything the bridge writes: pushed packets go into a PacketRing, replies are handed over to
+    the commands awaiting them, in issue order. Commands register the reply they expect with expect() before
+    being written, which lets the thread tell a reply byte from the start of a pushed packet.
+
+    The demultiplexer is created by Rfm69SerialDevice.start_streaming(), it is not meant to be used directly.
+
+    :param device: Rfm69SerialDevice object whose port is read.
+    :param capacity: size of the packet ring.
+    :param overflow: overflow policy of the ring, DROP_OLDEST or DROP_NEWEST (a blocked reader would hold up
+        command replies as well).
+    """
+
+    def __init__(self, device, capacity=64, overflow=DROP_OLDEST):
+        if overflow == BLOCK:
+            raise ValueError("the streaming packet ring cannot use the BLOCK overflow policy")
+        self._device = device
+        self.packets = PacketRing(capacity, overflow)
+        self.error = None       # exception which stopped the reader thread, if any
+
+        self._cond = threading.Condition()
+        self._unread = deque()      # expected replies not yet taken by read_reply(), oldest first
+        self._pending = deque()     # expected replies whose bytes have not been fully received, oldest first
+        self._push = None           # pushed packet frame being received
+        self._thread = None
+        self._running = threading.Event()
+
+    @property
+    def is_running(self):
+        return self._running.is_set()
+
+    def start(self):
+        """Start the reader thread."""
+
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="rfm69-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader thread. Packets already queued can still be consumed."""
+
+        self._running.clear()
+        self._device.cancel_read()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.packets.close()
+
+    def expect(self, reply):
+        """Register the reply of a command about to be written.
+
+        :param reply: Reply describing the reply frame of the command.
+        """
+
+        expected = _ExpectedReply(reply)
+        with self._cond:
+            self._unread.append(expected)
+            self._pending.append(expected)
+
+    def read_reply(self, timeout):
+        """Wait for the oldest expected reply.
+
+        :param timeout: maximum waiting time in seconds.
+        :return: raw reply bytes, incomplete (possibly empty) on time-out.
+        """
+
+        with self._cond:
+            expected = self._unread.popleft()
+            if not self._cond.wait_for(lambda: expected.done or not self.is_running, timeout):
+                # time-out: keep the reply in the parsing order, so that its late bytes are not taken for the
+                # reply to the next command
+                self._abandon(expected)
+            return bytes(expected.buf)
+
+    def discard(self):
+        """Give up every expected reply, e.g. after a time-out broke the reply order. Their late bytes are still
+        recognised and dropped."""
+
+        with self._cond:
+            self._unread.clear()
+            for expected in self._pending:
+                self._abandon(expected)
+
+    def _abandon(self, expected):
+        if expected.abandoned is None:
+            expected.abandoned = time.monotonic()
+
+    def _run(self):
+        device = self._device
+        try:
+            while self._running.is_set():
+                data = device.read(max(1, device.in_waiting))
+                if data:
+                    for packet in self._feed(data):
+                        self.packets.put(packet)
+        except Exception as err:
+            if self._running.is_set():
+                self.error = err
+        finally:
+            self._running.clear()
+            with self._cond:
+                self._cond.notify_all()
+            self.packets.close()
+
+    def _feed(self, data):
+        # split received bytes into pushed packets and replies, return the completed packets
+        packets = []
+        pos = 0
+        with self._cond:
+            while pos < len(data):
+                if self._push is not None:
+                    chunk = data[pos:pos + push_need(self._push)]
+                    self._push += chunk
+                    pos += len(chunk)
+                    if not push_need(self._push):
+                        packets.append(_frame_to_packet(self._push))
+                        self._push = None
+                elif self._pending and self._lost(self._pending[0]):
+                    self._pending.popleft()
+                elif self._pending and (self._pending[0].buf or data[pos] != PUSH_CODE[0]):
+                    # a '!' can only start a pushed packet where a reply status is expected
+                    expected = self._pending[0]
+                    chunk = data[pos:pos + expected.reply.need(expected.buf)]
+                    expected.buf += chunk
+                    pos += len(chunk)
+                    if not expected.reply.need(expected.buf):
+                        expected.done = True
+                        self._pending.popleft()
+                        self._cond.notify_all()
+                elif data[pos] == PUSH_CODE[0]:
+                    self._push = bytearray()
+                else:
+                    # unsolicited byte, dropped as reset_input_buffer() would
+                    pos += 1
+        return packets
+
+    def _lost(self, expected):
+        # an abandoned reply of which nothing arrived within another reply time-out is taken for lost, so that it
+        # does not swallow the replies to later commands
+        if expected.abandoned is None or expected.buf:
+            return False
+        return time.monotonic() - expected.abandoned > (self._device.timeout or _LATE_REPLY_GRACE)
@@ -0,0 +1,165 @@
+# RFM69 Serial spectrum survey
+
+"""Channel survey results as NumPy arrays, for frequency planning and waterfall monitoring.
+
+The sweep itself runs on the bridge (survey, 0x27): the firmware steps the carrier over evenly spaced channels,
+samples the RSSI after a dwell time on each and writes the samples back as it goes, so a sweep costs one command
+instead of a set_frequency() and a get_rssi() round trip per channel. Rfm69SerialDevice.survey() returns the samples
+as a SpectrumSurvey, a grid of one row per channel and one column per sweep, whose per-channel statistics are
+computed on the whole grid at once::
+
+    grid = dev.survey(902000000, 250000, 104, dwell=2000, sweeps=20)
+    print(grid.clearest(3, threshold=-90))
+
+waterfall() repeats the survey and yields a rolling window of the latest sweeps.
+
+NumPy is an optional dependency (pip install rfm69-serial[survey]), only needed for surveys.
+"""
+
+try:
+    import numpy
+except ImportError:     # surveys are unavailable, the rest of the package works without NumPy
+    numpy = None
+
+RSSI_STEP = 0.5     # dBm per REG_RSSIVALUE unit
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("spectrum surveys need NumPy, please install it (pip install numpy)")
+
+
+class SpectrumSurvey:
+    """RSSI samples of a spectrum survey, one row per channel and one column per sweep (oldest first).
+
+    :param frequencies: channel frequencies in Hz, array of shape (channels,).
+    :param rssi: signal strength samples in dBm, array of shape (channels, sweeps).
+    :param times: start time of every sweep (seconds since the epoch), array of shape (sweeps,).
+    """
+
+    def __init__(self, frequencies, rssi, times):
+        _require_numpy()
+        self.frequencies = numpy.asarray(frequencies)
+        self.rssi = numpy.asarray(rssi)
+        self.times = numpy.asarray(times)
+        if self.rssi.shape != (len(self.frequencies), len(self.times)):
+            raise ValueError("rssi must hold one row per frequency and one column per sweep")
+
+    @classmethod
+    def from_samples(cls, first, spacing, channels, samples, started, finished):
+        """Build the grid from the raw REG_RSSIVALUE samples of a survey reply, channel by channel and sweep
+        after sweep. Sweep start times are spread evenly between @started and @finished.
+
+        :param first: frequency of the first channel (Hz).
+        :param spacing: channel spacing (Hz).
+        :param channels: number of channels.
+        :param samples: bytes-like object of sweeps * channels samples.
+        :param started: time (seconds since the epoch) the survey was requested.
+        :param finished: time the last sample was received.
+        :return: SpectrumSurvey.
+        """
+
+        _require_numpy()
+        raw = numpy.frombuffer(samples, dtype=numpy.uint8)
+        sweeps = len(raw) // channels
+        rssi = raw[:sweeps * channels].reshape(sweeps, channels).T * numpy.float32(-RSSI_STEP)
+        frequencies = first + spacing * numpy.arange(channels, dtype=numpy.int64)
+        times = started + (finished - started) / sweeps * numpy.arange(sweeps)
+        return cls(frequencies, rssi, times)
+
+    def __repr__(self):
+        return "SpectrumSurvey(%d channels, %d sweeps)" % self.rssi.shape
+
+    @property
+    def channels(self):
+        return self.rssi.shape[0]
+
+    @property
+    def sweeps(self):
+        return self.rssi.shape[1]
+
+    @property
+    def min(self):
+        """Weakest signal strength (dBm) of every channel."""
+        return self.rssi.min(axis=1)
+
+    @property
+    def max(self):
+        """Strongest signal strength (dBm) of every channel."""
+        return self.rssi.max(axis=1)
+
+    @property
+    def mean(self):
+        """Mean signal strength (dBm) of every channel."""
+        return self.rssi.mean(axis=1)
+
+    def occupancy(self, threshold=-90.0):
+        """Fraction of the sweeps in which each channel was busy.
+
+        :param threshold: signal strength (dBm) from which a channel counts as busy.
+        :return: array of shape (channels,), 0.0 (always free) to 1.0 (always busy).
+        """
+        return (self.rssi >= threshold).mean(axis=1)
+
+    def clearest(self, count=1, threshold=-90.0):
+        """Pick the channels to operate on: least occupied first, the quietest on average among equals.
+
+        :param count: number of channels to return.
+        :param threshold: signal strength (dBm) from which a channel counts as busy, see occupancy().
+        :return: array of the frequencies (Hz) of the @count clearest channels, best first.
+        """
+
+        order = numpy.lexsort((self.mean, self.occupancy(threshold)))
+        return self.frequencies[order[:count]]
+
+    def extend(self, other):
+        """Append the sweeps of a later survey of the same channels.
+
+        :return: new SpectrumSurvey holding the sweeps of both.
+        """
+
+        if not numpy.array_equal(self.frequencies, other.frequencies):
+            raise ValueError("surveys of different channels cannot be combined")
+        return SpectrumSurvey(self.frequencies, numpy.hstack((self.rssi, other.rssi)),
+                              numpy.concatenate((self.times, other.times)))
+
+
+def waterfall(device, first, spacing, channels, dwell=1000, sweeps=1, history=100, stop=None):
+    """Survey the same channels over and over, for waterfall displays and long-term occupancy statistics.
+
+    :param device: Rfm69SerialDevice (or a pipeline-free device sharing its command set).
+    :param first: frequency of the first channel (Hz).
+    :param spacing: channel spacing (Hz).
+    :param channels: number of channels.
+    :param dwell: time (in microseconds) spent on each channel before sampling its RSSI.
+    :param sweeps: sweeps per survey command; more sweeps per command cost fewer round trips, fewer make the
+        window move more smoothly.
+    :param history: number of sweeps in the window.
+    :param stop: threading.Event ending the generator once set, None to run until it is closed.
+    :return: generator of SpectrumSurvey holding the latest @history sweeps (fewer until the window is full),
+        one per survey command. The grids are views of a shared buffer, valid until the next one is produced.
+    """
+
+    _require_numpy()
+    rssi = times = frequencies = None
+    filled = 0
+    while stop is None or not stop.is_set():
+        survey = device.survey(first, spacing, channels, dwell=dwell, sweeps=sweeps)
+        if survey is None:
+            raise RuntimeError("the bridge did not complete the survey")
+        if rssi is None:
+            # twice the window, so that it only moves back to the start of the buffer every @history sweeps
+            size = 2 * history + survey.sweeps
+            rssi = numpy.empty((channels, size), dtype=survey.rssi.dtype)
+            times = numpy.empty(size)
+            frequencies = survey.frequencies
+        if filled + survey.sweeps > rssi.shape[1]:
+            keep = min(filled, history)
+            rssi[:, :keep] = rssi[:, filled - keep:filled]
+            times[:keep] = times[filled - keep:filled]
+            filled = keep
+        rssi[:, filled:filled + survey.sweeps] = survey.rssi
+        times[filled:filled + survey.sweeps] = survey.times
+        filled += survey.sweeps
+        start = max(filled - history, 0)
+        yield SpectrumSurvey(frequencies, rssi[:, start:filled], times[start:filled])
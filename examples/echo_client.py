@@ -6,7 +6,6 @@ This program takes input from user, then sends it to server side through RFM69 n
 The program expects the same message echoed from the server, then displays the messase and signal strength.
 """
 
-import time
 from RFM69Serial import Rfm69SerialDevice
 
 # Parameter set for physical boards
@@ -36,14 +35,10 @@ try:
         if not dev.send_msg(server_addr, msg, ack_request=False):
             print("Sent failed!")
 
-        t_start = time.perf_counter()
-        dev.begin_receive()
-        while time.perf_counter() - t_start < 1:
-            if dev.receive_done():
-                recv = dev.get_rx_data()
-                if recv.sender == server_addr:
-                    print("echoed: ", recv.message_to_string())
-                    print("RSSI = ", dev.get_rssi())
+        recv = dev.wait_for_packet(1, sender=server_addr)
+        if recv is not None:
+            print("echoed: ", recv.message_to_string())
+            print("RSSI = ", dev.get_rssi())
 
 
 except KeyboardInterrupt:
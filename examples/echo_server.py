@@ -7,7 +7,7 @@ This Python script implements a simple echo server using RFM69 Serial bridge.
 """
 
 import time
-from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial import Rfm69SerialDevice, PacketReceiver
 
 # Parameter set for physical boards
 cs_pin = 10     # Teensy server
@@ -28,18 +28,19 @@ print("--------------------")
 
 msg_counter = 0
 
+# the receiver thread polls the bridge, this loop only wakes up when a packet is queued
+receiver = PacketReceiver(dev)
+
 try:
-    dev.begin_receive()
-    while True:
-        if dev.receive_done():
-            msg_counter += 1
-            recv = dev.get_rx_data()
-            print(f"Message [{msg_counter}]: Sender ID = {recv.sender} | Msg = {recv.message_to_string()} ")
-            time.sleep(0.2)
-            dev.send_msg(recv.sender, recv.message_to_string())
-            dev.begin_receive()
+    receiver.start()
+    for recv in receiver:
+        msg_counter += 1
+        print(f"Message [{msg_counter}]: Sender ID = {recv.sender} | Msg = {recv.message_to_string()} ")
+        time.sleep(0.2)
+        dev.send_msg(recv.sender, recv.payload)
 
 except KeyboardInterrupt:
+    receiver.stop()
     dev.sleep()
     dev.close()
     print("Stopped by user!")
@@ -38,15 +38,9 @@ try:
             sys.exit(0)
         elif cmd == 's':
             t_start = time.perf_counter()
-            dev.send_msg(server_addr, buf, ack_request=False)
-            dev.begin_receive()
-            while (time.perf_counter() - t_start) < 0.1:
-                if dev.receive_done():
-                    delay = (time.perf_counter() - t_start) * 1000
-                    recv = dev.get_rx_data()
-                    if recv.sender == server_addr:
-                        print("Ping(ms) = ", round(delay-5))
-                        break
+            if dev.send_and_wait_reply(server_addr, buf, timeout=0.1) is not None:
+                delay = (time.perf_counter() - t_start) * 1000
+                print("Ping(ms) = ", round(delay-5))
             else:
                 print("Time-out")
 
@@ -54,15 +48,9 @@ try:
             while True:
                 time.sleep(1)
                 t_start = time.perf_counter()
-                dev.send_msg(server_addr, buf, ack_request=False)
-                dev.begin_receive()
-                while (time.perf_counter() - t_start) < 0.5:
-                    if dev.receive_done():
-                        delay = (time.perf_counter() - t_start) * 1000
-                        recv = dev.get_rx_data()
-                        if recv.sender == server_addr:
-                            print("Ping(ms) = ", round(delay - 5))
-                            break
+                if dev.send_and_wait_reply(server_addr, buf, timeout=0.5) is not None:
+                    delay = (time.perf_counter() - t_start) * 1000
+                    print("Ping(ms) = ", round(delay - 5))
                 else:
                     print("Time-out")
 
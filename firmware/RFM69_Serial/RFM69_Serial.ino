@@ -42,13 +42,81 @@
 // Global Variables
 const char ok_code = 'y';
 const char ko_code = 'n';
-
-uint8_t SERIAL_MSG[64];
+const char frame_code = '#';   // start of a framed command: '#', opcode, argument length, arguments
+const char push_code = '!';    // start of a pushed packet in streaming mode
+
+// Capabilities reported by opcode 0x24
+#define PROTOCOL_VERSION     2     // 2: packet flags include PACKET_ACK_RECEIVED
+#define CAP_FRAMED           0x01  // framed commands ('#')
+#define CAP_BURST_REGISTERS  0x02  // burst/sparse register access (0x1C, 0x1D, 0x20)
+#define CAP_STREAMING        0x04  // streaming mode (0x22)
+#define CAP_POLL_PACKET      0x08  // combined poll/fetch/re-arm (0x21)
+#define CAP_RX_QUEUE         0x10  // received packet queue (0x22 with STREAM_QUEUE, drained by 0x23)
+#define CAP_TIMED_RETRY      0x20  // sendWithRetry reporting the acknowledged attempt and its round trip (0x25)
+#define CAP_RX_FILTER        0x40  // receive filter on sender, target and RSSI (0x26)
+#define CAP_SURVEY           0x80  // spectrum survey, RSSI sweeps run on the board (0x27)
+#define FRAME_TIMEOUT        50    // ms to wait for the rest of a framed command
+
+#define MAX_MSG_LEN 60  // longest message accepted by send/sendWithRetry/sendACK
+#define REG_MAP_SIZE 0x80  // register addresses reachable by readReg()/writeReg()
+#define MAX_REG_PAIRS 64   // most (address, value) pairs in a sparse register write
+
+uint8_t SERIAL_MSG[REG_MAP_SIZE + 4];  // room for a whole-map burst write (longer than any message command)
 
 RFM69 radio {CS_PIN, INT_PIN, false};
 
+// Background receive modes: received packets are pushed to the host as they arrive (streaming), or kept in a
+// queue until the host drains it
+#define STREAM_ENABLE    0x01
+#define STREAM_AUTO_ACK  0x02  // answer ACK requests with an empty ACK
+#define STREAM_QUEUE     0x04  // queue received packets instead of pushing them
+#define POLL_AUTO_ACK    0x01  // pollPacket: answer ACK requests with the supplied payload
+
+// Packet flags of pushed, polled and queued packets
+#define PACKET_ACK_REQUESTED  0x01
+#define PACKET_ACK_SENT       0x02
+#define PACKET_ACK_RECEIVED   0x04  // the packet is an ACK
+uint8_t streamMode = 0;
+
+// Receive filter of streamed, queued and polled packets: packets failing it are dropped by the bridge
+#define FILTER_SENDERS  0x01  // sender must be in filterSenders
+#define FILTER_TARGETS  0x02  // target must be in filterTargets
+#define FILTER_RSSI     0x04  // RSSI must be at least -filterRssi dBm
+#define ADDRESS_SET_LEN 32    // address set bitmap, bit (address % 8) of byte (address / 8)
+uint8_t filterFlags = 0;
+uint8_t filterRssi = 0;
+uint8_t filterSenders[ADDRESS_SET_LEN];
+uint8_t filterTargets[ADDRESS_SET_LEN];
+
+// Received packet queue, the oldest packet is at rxHead
+#ifdef ARDUINO_AVR_UNO
+#define RX_QUEUE_LEN 4
+#else
+#define RX_QUEUE_LEN 16
+#endif
+
+struct RxSlot {
+  uint8_t sender;
+  uint8_t target;
+  uint8_t flags;
+  uint8_t rssi;  // -RSSI
+  uint8_t len;
+  uint8_t data[RF69_MAX_DATA_LEN];
+};
+RxSlot rxQueue[RX_QUEUE_LEN];
+uint8_t rxHead = 0;
+uint8_t rxCount = 0;
+uint16_t rxOverflow = 0;  // packets dropped because the queue was full
+
 // Prototype
 void begin_receive();
+uint8_t packetFlags( bool );
+bool acceptPacket();
+void releasePacket( uint8_t );
+void pushPacket();
+void queuePacket();
+bool readFrame();
+uint8_t commandLength( uint8_t );
 void requestHandler( uint8_t, uint8_t );
 
 
@@ -62,7 +130,7 @@ void setup() {
 #elif defined (ARDUINO_SAMD_ZERO)
   Serial.begin(1000000);
 #endif
-
+  Serial.setTimeout(FRAME_TIMEOUT);
 }
 
 // ***** MAIN LOOP *****
@@ -70,11 +138,34 @@ void setup() {
 void loop() {
   // Polling continuously for Serial requests
   uint8_t byteCounter = 0;
+  uint8_t expectedLength = 0;
 
-  while (Serial.available()) {
+  // Streaming mode: push every received packet, between two command replies. Queue mode: keep it for the host.
+  if ((streamMode & (STREAM_ENABLE | STREAM_QUEUE)) && radio.receiveDone()) {
+    if (!acceptPacket())
+      begin_receive();
+    else if (streamMode & STREAM_ENABLE)
+      pushPacket();
+    else
+      queuePacket();
+  }
+
+  // Framed commands carry their length, read them at full UART speed
+  if (Serial.available() && Serial.peek() == frame_code) {
+    if (!readFrame())
+      Serial.write(ko_code);
+    return;
+  }
+
+  // Stop at the end of the command so that back-to-back (pipelined) commands stay separate.
+  // Commands of unknown length are delimited by the receive buffer running empty.
+  while (Serial.available() && (expectedLength == 0 || byteCounter < expectedLength)
+         && byteCounter < sizeof(SERIAL_MSG)) {
     delayMicroseconds(2000); // Hardware delay buffer if Serial port is too slow (typically on UNO)
     SERIAL_MSG[byteCounter] = (uint8_t)Serial.read();
     byteCounter += 1;
+    if (expectedLength == 0)
+      expectedLength = commandLength(byteCounter);
   }
 
   if (byteCounter != 0) {
@@ -101,13 +192,134 @@ void begin_receive() {
   radio.setMode(RF69_MODE_RX);
 }
 
+// PACKET_* flags of the received packet, PACKET_ACK_SENT if it is going to be acknowledged
+uint8_t packetFlags(bool autoAck) {
+  uint8_t flags = radio.ACK_RECEIVED ? PACKET_ACK_RECEIVED : 0;
+  if (!radio.ACKRequested())
+    return flags;
+  return flags | (autoAck ? (PACKET_ACK_REQUESTED | PACKET_ACK_SENT) : PACKET_ACK_REQUESTED);
+}
+
+// true if the received packet passes the receive filter
+bool acceptPacket() {
+  uint8_t sender = (uint8_t)radio.SENDERID;
+  uint8_t target = (uint8_t)radio.TARGETID;
+
+  if ((filterFlags & FILTER_SENDERS) && !(filterSenders[sender >> 3] & (1 << (sender & 7))))
+    return false;
+  if ((filterFlags & FILTER_TARGETS) && !(filterTargets[target >> 3] & (1 << (target & 7))))
+    return false;
+  if ((filterFlags & FILTER_RSSI) && radio.RSSI < -(int16_t)filterRssi)
+    return false;
+  return true;
+}
+
+// done with the received packet: acknowledge it if decided so, then re-arm RX
+void releasePacket(uint8_t flags) {
+  if (flags & PACKET_ACK_SENT)
+    radio.sendACK();
+  begin_receive();
+}
+
+// write the received packet to the host and re-arm RX
+// frame: '!', sender, target, flags, -RSSI, payload length, payload
+void pushPacket() {
+  uint8_t flags = packetFlags(streamMode & STREAM_AUTO_ACK);
+
+  Serial.write(push_code);
+  Serial.write((uint8_t)radio.SENDERID);
+  Serial.write((uint8_t)radio.TARGETID);
+  Serial.write(flags);
+  Serial.write((uint8_t)(-radio.RSSI));
+  Serial.write(radio.DATALEN);
+  Serial.write(radio.DATA, radio.DATALEN);
+  releasePacket(flags);
+}
+
+// store the received packet in the queue and re-arm RX
+// a packet which does not fit is dropped and not acknowledged, so that a retrying sender tries again later
+void queuePacket() {
+  uint8_t flags = 0;
+
+  if (rxCount == RX_QUEUE_LEN) {
+    if (rxOverflow < 0xFFFF)
+      rxOverflow++;
+  }
+  else {
+    flags = packetFlags(streamMode & STREAM_AUTO_ACK);
+    RxSlot *slot = &rxQueue[(rxHead + rxCount) % RX_QUEUE_LEN];
+    slot->sender = radio.SENDERID;
+    slot->target = radio.TARGETID;
+    slot->flags = flags;
+    slot->rssi = (uint8_t)(-radio.RSSI);
+    slot->len = radio.DATALEN;
+    memcpy(slot->data, radio.DATA, radio.DATALEN);
+    rxCount++;
+  }
+  releasePacket(flags);
+}
+
+// read a framed command into SERIAL_MSG, in the same layout as a '$' command, and handle it
+bool readFrame() {
+  uint8_t header[3];  // '#', opcode, argument length
+
+  if (Serial.readBytes(header, 3) != 3 || header[2] > sizeof(SERIAL_MSG) - 2)
+    return false;
+  SERIAL_MSG[0] = '$';
+  SERIAL_MSG[1] = header[1];
+  if (Serial.readBytes(SERIAL_MSG + 2, header[2]) != header[2])
+    return false;
+  requestHandler(SERIAL_MSG[1], header[2] + 2);
+  return true;
+}
+
+// total length of the command in SERIAL_MSG, 0 if not known (yet)
+uint8_t commandLength(uint8_t count) {
+  if (count < 2)
+    return 0;
+
+  switch (SERIAL_MSG[1]) {
+    case 0x05: case 0x06: case 0x08: case 0x0A: case 0x13: case 0x14: case 0x15:
+    case 0x17: case 0x18: case 0x1E: case 0x1F: case 0x24:
+      return 2;
+    case 0x26:
+      return 4 + 2 * ADDRESS_SET_LEN;
+    case 0x27:
+      return 15;
+    case 0x01: case 0x02: case 0x07: case 0x0D: case 0x0E: case 0x0F: case 0x10:
+    case 0x11: case 0x12: case 0x16: case 0x19: case 0x1A: case 0x22: case 0x23:
+      return 3;
+    case 0x1B: case 0x1C:
+      return 4;
+    case 0x00: case 0x0B:
+      return 6;
+    case 0x03:  // send: 5-byte header + msg length
+      return (count > 4) ? 5 + SERIAL_MSG[4] : 0;
+    case 0x04:  // sendWithRetry: 6-byte header + msg length
+    case 0x25:  // timed sendWithRetry: same layout
+      return (count > 5) ? 6 + SERIAL_MSG[5] : 0;
+    case 0x09:  // sendACK: 3-byte header + msg length
+      return (count > 2) ? 3 + SERIAL_MSG[2] : 0;
+    case 0x0C:  // encrypt: key follows only if enabled
+      return (count > 2) ? (SERIAL_MSG[2] ? 19 : 3) : 0;
+    case 0x1D:  // burst write: 4-byte header + register values
+      return (count > 3) ? min(4 + SERIAL_MSG[3], sizeof(SERIAL_MSG)) : 0;
+    case 0x20:  // sparse register write: 3-byte header + (address, value) pairs
+      return (count > 2) ? min(3 + 2 * SERIAL_MSG[2], sizeof(SERIAL_MSG)) : 0;
+    case 0x21:  // pollPacket: 4-byte header + ACK payload length
+      return (count > 3) ? 4 + SERIAL_MSG[3] : 0;
+    default:
+      return 0;
+  }
+}
+
 // request handler
 void requestHandler(uint8_t opcode, uint8_t len) {
   bool ACK_Requested = false;
   int16_t rssi_v = 0;
   char encrypt_key[16];
 
-  uint8_t msg[60];
+  uint8_t msg[MAX_MSG_LEN];
 
   switch (opcode) {
 
@@ -228,7 +440,7 @@ void requestHandler(uint8_t opcode, uint8_t len) {
 
 // virtual void sendACK(const void* buffer = "", uint8_t bufferSize=0);
     case 0x09: {
-      // SERIAL_MSG[2] = msg_length (max 64)
+      // SERIAL_MSG[2] = msg_length (max 60)
       // SERIAL_MSG[3 -> msg_length] = msg
       if (len > 3) {
         for (int i = 0; i < SERIAL_MSG[2]; i++)
@@ -404,7 +616,34 @@ void requestHandler(uint8_t opcode, uint8_t len) {
       break;
     }
 
-    // ... //
+// burst readReg(): read consecutive registers
+    case 0x1C: {
+      // SERIAL_MSG[2] = first register address
+      // SERIAL_MSG[3] = number of registers
+      if (SERIAL_MSG[3] == 0 || SERIAL_MSG[2] + SERIAL_MSG[3] > REG_MAP_SIZE) {
+        Serial.write(ko_code);
+        break;
+      }
+      Serial.write(ok_code);
+      for (int i = 0; i < SERIAL_MSG[3]; i++)
+        Serial.write(radio.readReg(SERIAL_MSG[2] + i));
+      break;
+    }
+
+// burst writeReg(): write consecutive registers
+    case 0x1D: {
+      // SERIAL_MSG[2] = first register address
+      // SERIAL_MSG[3] = number of registers
+      // SERIAL_MSG[4 -> count] = register values
+      if (SERIAL_MSG[3] == 0 || SERIAL_MSG[2] + SERIAL_MSG[3] > REG_MAP_SIZE || len != 4 + SERIAL_MSG[3]) {
+        Serial.write(ko_code);
+        break;
+      }
+      for (int i = 0; i < SERIAL_MSG[3]; i++)
+        radio.writeReg(SERIAL_MSG[2] + i, SERIAL_MSG[i+4]);
+      Serial.write(ok_code);
+      break;
+    }
 
 // get_rx_data()
     case 0x1E: {
@@ -423,6 +662,181 @@ void requestHandler(uint8_t opcode, uint8_t len) {
       break;
     }
 
+// sparse writeReg(): write a list of (address, value) pairs, in order
+    case 0x20: {
+      // SERIAL_MSG[2] = number of pairs (max 64)
+      // SERIAL_MSG[3 + 2i] = register address, SERIAL_MSG[4 + 2i] = register value
+      if (SERIAL_MSG[2] == 0 || SERIAL_MSG[2] > MAX_REG_PAIRS || len != 3 + 2 * SERIAL_MSG[2]) {
+        Serial.write(ko_code);
+        break;
+      }
+      for (int i = 0; i < SERIAL_MSG[2]; i++)
+        radio.writeReg(SERIAL_MSG[3 + 2*i] & 0x7F, SERIAL_MSG[4 + 2*i]);
+      Serial.write(ok_code);
+      break;
+    }
+
+// pollPacket: receiveDone() + get_rx_data() + readRSSI() + ACKRequested() (+ sendACK()) + begin_receive()
+    case 0x21: {
+      // SERIAL_MSG[2] = POLL_* flags
+      // SERIAL_MSG[3] = ACK payload length (max 60)
+      // SERIAL_MSG[4 -> ACK payload length] = ACK payload
+      // reply: ok_code, sender, target, flags, -RSSI, payload length, payload; ko_code if nothing was received
+      if (len < 4 || len != 4 + SERIAL_MSG[3] || !radio.receiveDone()) {
+        Serial.write(ko_code);
+        break;
+      }
+      if (!acceptPacket()) {
+        begin_receive();
+        Serial.write(ko_code);
+        break;
+      }
+      uint8_t flags = packetFlags(SERIAL_MSG[2] & POLL_AUTO_ACK);
+      Serial.write(ok_code);
+      Serial.write((uint8_t)radio.SENDERID);
+      Serial.write((uint8_t)radio.TARGETID);
+      Serial.write(flags);
+      Serial.write((uint8_t)(-radio.RSSI));
+      Serial.write(radio.DATALEN);
+      Serial.write(radio.DATA, radio.DATALEN);
+
+      if (flags & PACKET_ACK_SENT)
+        radio.sendACK(SERIAL_MSG + 4, SERIAL_MSG[3]);
+      begin_receive();
+      break;
+    }
+
+// capabilities: protocol version and supported features
+    case 0x24: {
+      Serial.write(ok_code);
+      Serial.write(PROTOCOL_VERSION);
+      Serial.write(CAP_FRAMED | CAP_BURST_REGISTERS | CAP_STREAMING | CAP_POLL_PACKET | CAP_RX_QUEUE |
+                   CAP_TIMED_RETRY | CAP_RX_FILTER | CAP_SURVEY);
+      break;
+    }
+
+// background receive mode: streaming, queue or off
+    case 0x22: {
+      // SERIAL_MSG[2] = STREAM_* flags, 0 turns background receiving off
+      streamMode = SERIAL_MSG[2];
+      rxHead = 0;
+      rxCount = 0;
+      rxOverflow = 0;
+      if (streamMode & (STREAM_ENABLE | STREAM_QUEUE))
+        begin_receive();
+      Serial.write(ok_code);
+      break;
+    }
+
+// drain the received packet queue
+    case 0x23: {
+      // SERIAL_MSG[2] = maximum number of packets to return
+      // reply: ok_code, n, packets left, queue size, overflow count (uint16 LE), n * (sender, target, flags,
+      //        -RSSI, payload length, payload)
+      uint8_t n = min(SERIAL_MSG[2], rxCount);
+      Serial.write(ok_code);
+      Serial.write(n);
+      Serial.write(rxCount - n);
+      Serial.write(RX_QUEUE_LEN);
+      Serial.write((uint8_t)(rxOverflow & 0xFF));
+      Serial.write((uint8_t)(rxOverflow >> 8));
+      for (uint8_t i = 0; i < n; i++) {
+        RxSlot *slot = &rxQueue[rxHead];
+        Serial.write((uint8_t *)slot, 5);
+        Serial.write(slot->data, slot->len);
+        rxHead = (rxHead + 1) % RX_QUEUE_LEN;
+        rxCount--;
+      }
+      break;
+    }
+
+// sendWithRetry() loop of the library, reporting which attempt got acknowledged and its round-trip time
+    case 0x25: {
+      // same arguments as 0x04
+      // reply: ok_code, number of the acknowledged attempt (0 = first), round-trip time (ms); ko_code if no ACK
+      if (len <= 6) {
+        Serial.write(ko_code);
+        break;
+      }
+      for (int i = 0; i < SERIAL_MSG[5]; i++)
+        msg[i] = SERIAL_MSG[i+6];
+
+      bool acked = false;
+      for (uint8_t attempt = 0; attempt <= SERIAL_MSG[3] && !acked; attempt++) {
+        radio.send(SERIAL_MSG[2], msg, SERIAL_MSG[5], true);
+        uint32_t sentTime = millis();
+        while (millis() - sentTime < SERIAL_MSG[4]) {
+          if (radio.ACKReceived(SERIAL_MSG[2])) {
+            uint32_t rtt = millis() - sentTime;
+            Serial.write(ok_code);
+            Serial.write(attempt);
+            Serial.write((uint8_t)min(rtt, 255UL));
+            acked = true;
+            break;
+          }
+        }
+      }
+      if (!acked)
+        Serial.write(ko_code);
+      break;
+    }
+
+// receive filter of streamed, queued and polled packets
+    case 0x26: {
+      // SERIAL_MSG[2] = FILTER_* flags, 0 lets every packet through
+      // SERIAL_MSG[3] = minimum RSSI, as -RSSI
+      // SERIAL_MSG[4 -> 35] = sender address set, SERIAL_MSG[36 -> 67] = target address set
+      if (len != 4 + 2 * ADDRESS_SET_LEN) {
+        Serial.write(ko_code);
+        break;
+      }
+      filterFlags = SERIAL_MSG[2];
+      filterRssi = SERIAL_MSG[3];
+      memcpy(filterSenders, SERIAL_MSG + 4, ADDRESS_SET_LEN);
+      memcpy(filterTargets, SERIAL_MSG + 4 + ADDRESS_SET_LEN, ADDRESS_SET_LEN);
+      Serial.write(ok_code);
+      break;
+    }
+
+// spectrum survey: RSSI sweeps over evenly spaced channels
+    case 0x27: {
+      // SERIAL_MSG[2 -> 5] = first channel frequency (Hz, LSB first)
+      // SERIAL_MSG[6 -> 9] = channel spacing (Hz, LSB first)
+      // SERIAL_MSG[10 -> 11] = number of channels, SERIAL_MSG[12 -> 13] = dwell time per channel (us)
+      // SERIAL_MSG[14] = number of sweeps
+      // reply: ok_code, then sweeps * channels REG_RSSIVALUE samples (-2 * RSSI), written as they are measured
+      uint32_t first = ((uint32_t)SERIAL_MSG[5] << 24) | ((uint32_t)SERIAL_MSG[4] << 16) |
+                       ((uint32_t)SERIAL_MSG[3] << 8) | SERIAL_MSG[2];
+      uint32_t spacing = ((uint32_t)SERIAL_MSG[9] << 24) | ((uint32_t)SERIAL_MSG[8] << 16) |
+                         ((uint32_t)SERIAL_MSG[7] << 8) | SERIAL_MSG[6];
+      uint16_t channels = SERIAL_MSG[10] | (SERIAL_MSG[11] << 8);
+      uint16_t dwell = SERIAL_MSG[12] | (SERIAL_MSG[13] << 8);
+      if (len != 15 || channels == 0 || SERIAL_MSG[14] == 0) {
+        Serial.write(ko_code);
+        break;
+      }
+      // the carrier is restored register by register, setFrequency() would round it
+      uint8_t frfMsb = radio.readReg(REG_FRFMSB);
+      uint8_t frfMid = radio.readReg(REG_FRFMID);
+      uint8_t frfLsb = radio.readReg(REG_FRFLSB);
+      begin_receive();
+      Serial.write(ok_code);
+      for (uint8_t sweep = 0; sweep < SERIAL_MSG[14]; sweep++) {
+        for (uint16_t i = 0; i < channels; i++) {
+          radio.setFrequency(first + spacing * i);  // restarts RX on the new channel
+          delay(dwell / 1000);  // delayMicroseconds() is only accurate up to 16383 us
+          delayMicroseconds(dwell % 1000);
+          Serial.write(radio.readReg(REG_RSSIVALUE));
+        }
+      }
+      radio.setMode(RF69_MODE_STANDBY);
+      radio.writeReg(REG_FRFMSB, frfMsb);
+      radio.writeReg(REG_FRFMID, frfMid);
+      radio.writeReg(REG_FRFLSB, frfLsb);
+      begin_receive();
+      break;
+    }
+
 // echo message for testing, cmd = '$t + msg'
     case 0x74: {
       Serial.write(ok_code);
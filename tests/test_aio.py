@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+import serial
+from RFM69Serial import AsyncRfm69SerialDevice, Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+
+
+class TestAsyncRfm69SerialDevice(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel()
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.client_bridge = Rfm69SerialEmulator(self.channel).start()
+
+    async def asyncSetUp(self) -> None:
+        self.test_device = await AsyncRfm69SerialDevice(1, 101, 10, 8, port=self.server_bridge.port).open()
+
+    async def test_commands(self):
+        self.assertEqual(1, self.test_device.device_address)
+        self.assertTrue(await self.test_device.is_device_connected())
+        self.assertEqual(915000000, await self.test_device.get_frequency())
+        self.assertTrue(await self.test_device.write_register(b'\x30', b'\x36'))
+        self.assertEqual(b'\x36', await self.test_device.read_register(b'\x30'))
+
+    async def test_concurrent_commands(self):
+        """Commands from many tasks are pipelined and matched in order"""
+        results = await asyncio.gather(*[self.test_device.read_register(bytes([addr]))
+                                         for addr in range(0x30, 0x3A)])
+        self.assertEqual(b'\x65', results[0])
+        self.assertEqual(b'\x42', results[8])
+        self.assertEqual(10, len(results))
+        self.assertEqual(10, self.test_device.metrics.snapshot()[0x1A].calls)
+
+    async def test_timeout(self):
+        # opcode 0x13 is a firmware placeholder which never replies
+        self.test_device.timeout = 0.1
+        self.assertFalse(await self.test_device._serial_transfer(b'$\x13'))
+        self.assertTrue(await self.test_device.begin_receive())
+        self.assertEqual(1, self.test_device.metrics.snapshot()[0x13].timeouts)
+
+    async def test_late_reply(self):
+        """The late reply of a timed-out command must not be taken for the reply to the next one"""
+        power = await self.test_device.get_power_level()
+        rssi = await self.test_device.get_rssi()
+        self.test_device.timeout = 0.1
+        self.server_bridge.command_delay = 0.15
+        self.assertIsNone(await self.test_device.get_power_level())
+        self.server_bridge.command_delay = 0.0
+        self.assertEqual(rssi, await self.test_device.get_rssi())
+        self.assertEqual(power, await self.test_device.get_power_level())
+
+    async def test_disconnected(self):
+        """Unplugging the bridge fails the pending commands and ends the packet stream"""
+        command = asyncio.ensure_future(self.test_device.get_rssi())
+        self.server_bridge.stop()
+        with self.assertRaises(serial.SerialException):
+            await asyncio.wait_for(command, 1)
+        self.assertFalse(self.test_device.is_open)
+        with self.assertRaises(serial.SerialException):
+            async for _ in self.test_device.packets():
+                pass
+
+    async def test_packets(self):
+        client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+        received = []
+
+        async def consume():
+            async for packet in self.test_device.packets():
+                received.append(packet)
+                if len(received) == 3:
+                    return
+
+        consumer = asyncio.create_task(consume())
+        for i in range(3):
+            await asyncio.sleep(0.05)
+            await asyncio.get_running_loop().run_in_executor(None, client.send_msg, 1, b'msg %d' % i)
+        await asyncio.wait_for(consumer, 2)
+        client.close()
+        self.assertEqual([b'msg 0', b'msg 1', b'msg 2'], [packet.payload for packet in received])
+
+    async def test_open_cancelled(self):
+        """A failed open() must not leave the port open"""
+        device = AsyncRfm69SerialDevice(2, 101, port=self.client_bridge.port)
+        task = asyncio.ensure_future(device.open())
+        await asyncio.sleep(0.05)       # the port is open, initialization goes on
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(device.is_open)
+
+    async def asyncTearDown(self) -> None:
+        self.test_device.close()
+
+    def tearDown(self) -> None:
+        self.server_bridge.stop()
+        self.client_bridge.stop()
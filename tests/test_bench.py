@@ -0,0 +1,30 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from RFM69Serial import bench
+
+
+class TestBench(unittest.TestCase):
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(50, bench.percentile(samples, 50))
+        self.assertEqual(99, bench.percentile(samples, 99))
+        self.assertEqual(1, bench.percentile([1], 90))
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(0, bench.main(['--iterations', '3', '--output', path]))
+                bench.main(['--iterations', '3', '--compare', path])
+            with open(path) as file:
+                saved = json.load(file)
+
+        names = {result['name'] for result in saved['results']}
+        self.assertTrue({'set_transfer', 'send_msg', 'get_rx_data', 'packet_decode', 'read_register_loop'} <= names)
+        self.assertEqual('emulator', saved['meta']['port'])
+        self.assertIn('p50 change', out.getvalue())
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import time
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.capture import *
+from RFM69Serial.emulator import Rfm69SerialEmulator
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp(suffix='.cap')
+        os.close(fd)
+        os.unlink(self.path)
+        self.bridge = Rfm69SerialEmulator().start()
+        self.test_device = Rfm69SerialDevice(2, 101, port=self.bridge.port, capture=self.path)
+
+    def test_records(self):
+        self.assertTrue(self.test_device.set_frequency(868000000))
+        self.assertEqual(b'\x42', self.test_device.read_register(b'\x38', cached=False))
+        self.test_device.close()
+
+        with CaptureReader(self.path) as capture:
+            records = list(capture)
+        self.assertEqual(CAPTURE_SESSION, records[0].direction)
+        self.assertEqual(self.bridge.port, records[0].data[8:].decode())
+        # initialize, capabilities, set_frequency, read_register: each command followed by its reply
+        self.assertEqual([0x00, 0x00, 0x24, 0x24, 0x0B, 0x0B, 0x1A, 0x1A], [r.opcode for r in records[1:]])
+        self.assertEqual([CAPTURE_COMMAND, CAPTURE_REPLY] * 4, [r.direction for r in records[1:]])
+        self.assertEqual(b'#\x1A\x01\x38', records[-2].data)
+        self.assertEqual(b'y\x42', records[-1].data)
+        self.assertAlmostEqual(time.time(), records[-1].time, delta=5)
+        self.assertTrue(all(a.timestamp <= b.timestamp for a, b in zip(records, records[1:])))
+
+    def test_filter(self):
+        for _ in range(20):
+            self.test_device.get_rssi()
+        middle = time.time()
+        time.sleep(0.01)
+        for _ in range(20):
+            self.test_device.begin_receive()
+        self.test_device.close()
+
+        with CaptureReader(self.path, index_every=4) as capture:
+            rssi = list(capture.records(opcodes={0x0F}, directions={CAPTURE_REPLY}))
+            self.assertEqual(20, len(rssi))
+            self.assertTrue(all(record.data == b'y\x64' for record in rssi))
+            late = list(capture.records(start=middle))
+            self.assertEqual(40, len(late))
+            self.assertEqual({0x05}, {record.opcode for record in late})
+            early = list(capture.records(end=middle, opcodes={0x05}))
+            self.assertEqual([], early)
+
+    def test_pipeline(self):
+        with self.test_device.pipeline(depth=4):
+            pending = [self.test_device.read_register(bytes((addr,)), cached=False) for addr in range(1, 9)]
+        self.assertTrue(all(p.result() is not None for p in pending))
+        self.test_device.close()
+        with CaptureReader(self.path) as capture:
+            replies = list(capture.records(opcodes={0x1A}, directions={CAPTURE_REPLY}))
+        self.assertEqual(8, len(replies))
+
+    def test_append_and_truncation(self):
+        self.test_device.close()
+        with CaptureWriter(self.path, 'second') as writer:
+            writer.record(CAPTURE_COMMAND, 0x05, b'$\x05')
+        with open(self.path, 'ab') as file:
+            file.write(b'\x00' * 7)     # torn record header
+        with CaptureReader(self.path) as capture:
+            records = list(capture)
+        self.assertEqual(b'second', records[-2].data[8:])
+        self.assertEqual(b'$\x05', records[-1].data)
+
+    def test_periodic_flush(self):
+        self.test_device.close()
+        os.unlink(self.path)
+        writer = CaptureWriter(self.path, flush_interval=0.05)
+        writer.command(0x1A, b'#\x1A\x01\x38')
+        writer.reply(0x1A, b'y\x42')
+        size = os.path.getsize(self.path)
+        time.sleep(0.06)
+        writer.command(0x1A, b'#\x1A\x01\x38')
+        self.assertEqual(size, os.path.getsize(self.path))     # commands wait for their reply
+        writer.reply(0x1A, b'y\x42')
+        # the records are on disk while the writer stays open, e.g. for a process about to be killed
+        with CaptureReader(self.path) as capture:
+            self.assertEqual(4, len([record for record in capture if record.direction != CAPTURE_SESSION]))
+        writer.close()
+
+    def test_not_a_capture(self):
+        self.test_device.close()
+        with open(self.path, 'wb') as file:
+            file.write(b'hello world, not a capture')
+        self.assertRaises(ValueError, CaptureReader, self.path)
+        self.assertRaises(ValueError, CaptureWriter, self.path)
+
+    def test_replay(self):
+        self.test_device.set_frequency(868000000)
+        self.test_device.get_frequency()
+        self.test_device.get_power_level()
+        self.test_device.close()
+
+        with CaptureReader(self.path) as capture:
+            started = time.monotonic()
+            results = list(replay(capture.records(), speed=None))
+            self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([0x00, 0x24, 0x0B, 0x0A, 0x14], [result.opcode for result in results])
+        for result in results:
+            self.assertEqual(result.expected, result.actual)
+
+    def test_replay_timing(self):
+        self.test_device.begin_receive()
+        time.sleep(0.3)
+        self.test_device.begin_receive()
+        self.test_device.close()
+
+        with CaptureReader(self.path) as capture:
+            records = list(capture.records(opcodes={0x05}))
+        started = time.monotonic()
+        self.assertEqual(2, len(list(replay(records, self.bridge.port, speed=2.0))))
+        self.assertAlmostEqual(0.15, time.monotonic() - started, delta=0.1)
+
+    def tearDown(self) -> None:
+        self.test_device.close()
+        self.bridge.stop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,15 +37,9 @@ class TestRfm69SerialDevice(unittest.TestCase):
         test_string = "test"
         target_addr = 2
 
-        self.test_device.send_msg(target_addr, test_string, ack_request=False)
-        t_start = time.perf_counter()
-        self.test_device.begin_receive()
-        while time.perf_counter() - t_start < 0.5:
-            if self.test_device.receive_done():
-                recv_data = self.test_device.get_rx_data()
-                return_string = recv_data.message_to_string()
-                self.assertEqual(test_string, return_string)
-                break
+        recv_data = self.test_device.send_and_wait_reply(target_addr, test_string, timeout=0.5)
+        if recv_data is not None:
+            self.assertEqual(test_string, recv_data.message_to_string())
         else:
             print("Test roundtrip failed because of Time-out, pls check serial connection!")
 
@@ -0,0 +1,181 @@
+import threading
+import time
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+
+
+class TestRfm69SerialEmulator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bridge = Rfm69SerialEmulator().start()
+        self.test_device = Rfm69SerialDevice(2, 101, 10, 8, port=self.bridge.port)
+
+    def test_init_parameters(self):
+        self.assertEqual(2, self.bridge.radio.address)
+        self.assertEqual(101, self.bridge.radio.network_id)
+        self.assertEqual(10, self.bridge.radio.cs_pin)
+        self.assertEqual(8, self.bridge.radio.int_pin)
+
+    def test_device_connected(self):
+        self.assertTrue(self.test_device.is_device_connected())
+        self.assertEqual(b'\x42', self.test_device.read_register(b'\x38'))
+
+    def test_write_register(self):
+        self.assertTrue(self.test_device.write_register(b'\x30', b'\x36'))
+        self.assertEqual(b'\x36', self.test_device.read_register(b'\x30'))
+
+    def test_frequency_setting(self):
+        self.assertEqual(915000000, self.test_device.get_frequency())
+        self.assertTrue(self.test_device.set_frequency(916000000))
+        self.assertAlmostEqual(916000000, self.test_device.get_frequency(), delta=62)
+
+    def test_get_rssi(self):
+        self.assertEqual(-100, self.test_device.get_rssi())
+
+    def test_power_level(self):
+        self.assertEqual(31, self.test_device.get_power_level())
+        self.assertTrue(self.test_device.set_power_level(20))
+        self.assertEqual(20, self.bridge.radio.power_level)
+        self.assertEqual(20, self.test_device.get_power_level())
+        self.assertTrue(self.test_device.set_high_power(True))
+        self.assertEqual(20, self.test_device.get_power_level())
+
+    def test_read_temperature(self):
+        self.assertEqual(25, self.test_device.read_temperature())
+        self.assertEqual(22, self.test_device.read_temperature(-3))
+        self.bridge.radio.temperature = -10
+        self.assertEqual(-10, self.test_device.read_temperature())
+        self.assertRaises(ValueError, self.test_device.read_temperature, 200)
+
+    def test_set_lna(self):
+        self.assertEqual(b'\x88', self.test_device.read_register(b'\x18'))
+        self.assertEqual(0x88, self.test_device.set_lna(0x03))
+        self.assertEqual(b'\x8B', self.test_device.read_register(b'\x18'))
+
+    def test_set_300kbps(self):
+        self.assertEqual(b'\x02', self.test_device.read_register(b'\x03'))
+        self.assertTrue(self.test_device.set_300kbps())
+        self.assertEqual(b'\x00\x6B', self.test_device.read_registers(0x03, 2))
+        self.assertEqual(b'\x00', self.test_device.read_register(b'\x03'))
+
+    def test_echo(self):
+        self.test_device.write(b'$thello')
+        self.assertEqual(b'yhello', self.test_device.read(6))
+
+    def test_invalid_opcode(self):
+        self.assertFalse(self.test_device._serial_transfer(b'$\x7F'))
+
+    def tearDown(self) -> None:
+        self.test_device.close()
+        self.bridge.stop()
+
+
+class TestRadioChannel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel(rssi=-55)
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.client_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+
+    def test_send_receive(self):
+        self.assertTrue(self.server.begin_receive())
+        self.assertTrue(self.client.send_msg(1, "hello"))
+        self.assertTrue(self.server.receive_done())
+        packet = self.server.get_rx_data()
+        self.assertEqual(2, packet.sender)
+        self.assertEqual("hello", packet.message_to_string())
+        self.assertEqual(-55, self.server.get_rssi())
+
+    def test_send_bytes_like(self):
+        payload = bytes(range(60))
+        for msg in (payload, bytearray(payload), memoryview(payload), list(payload)):
+            self.server.begin_receive()
+            self.assertTrue(self.client.send_msg(1, msg))
+            self.assertTrue(self.server.receive_done())
+            self.assertEqual(list(payload), self.server.get_rx_data().message_to_int())
+
+    def test_get_rx_data_into(self):
+        buffer = bytearray(61)
+        self.server.begin_receive()
+        self.client.send_msg(1, b'\x00binary\xff')
+        self.assertTrue(self.server.receive_done())
+        self.assertEqual((2, 8), self.server.get_rx_data_into(buffer))
+        self.assertEqual(b'\x00binary\xff', buffer[:8])
+        with self.assertRaises(ValueError):
+            self.server.get_rx_data_into(bytearray(4))
+
+    def test_send_too_long(self):
+        with self.assertRaises(ValueError):
+            self.client.send_msg(1, bytes(61))
+        with self.assertRaises(ValueError):
+            self.client.send_msg_with_retry(1, "x" * 61)
+        with self.assertRaises(TypeError):
+            self.client.send_ACK(61)
+
+    def test_network_filter(self):
+        self.server.set_network_id(102)
+        self.server.begin_receive()
+        self.client.send_msg(1, "hello")
+        self.assertFalse(self.server.receive_done())
+
+    def test_send_with_retry(self):
+        # nobody acknowledges -> all retries are used up
+        self.server.begin_receive()
+        t_start = time.perf_counter()
+        self.assertFalse(self.client.send_msg_with_retry(1, "hello", retries=1, time_out=20))
+        self.assertGreaterEqual(time.perf_counter() - t_start, 0.04)
+
+    def test_poll_packet(self):
+        self.assertIsNone(self.server.poll_packet())    # arms RX
+        self.assertTrue(self.client.send_msg(1, b'one', ack_request=True))
+        packet = self.server.poll_packet()
+        self.assertEqual(b'one', packet.payload)
+        self.assertEqual((2, 1, -55, True), (packet.sender, packet.target, packet.rssi, packet.ack_requested))
+        # RX has been re-armed by the same transaction
+        self.assertTrue(self.client.send_msg(1, b'two'))
+        self.assertEqual(b'two', self.server.poll_packet().payload)
+        self.assertIsNone(self.server.poll_packet())
+
+    def test_rx_queue(self):
+        self.assertTrue(self.server.enable_rx_queue())
+        for i in range(5):
+            self.assertTrue(self.client.send_msg(1, b'burst %d' % i))
+            time.sleep(0.01)
+        packets = self.server.drain_packets(3)
+        self.assertEqual([b'burst 0', b'burst 1', b'burst 2'], [packet.payload for packet in packets])
+        self.assertEqual((2, 1, -55), (packets[0].sender, packets[0].target, packets[0].rssi))
+        self.assertEqual((2, 16, 0), (self.server.rx_queue_depth, self.server.rx_queue_capacity,
+                                      self.server.rx_queue_overflow))
+        self.assertEqual([b'burst 3', b'burst 4'], [packet.payload for packet in self.server.drain_packets()])
+        self.assertEqual([], self.server.drain_packets())
+
+    def test_rx_queue_overflow(self):
+        self.server_bridge.rx_queue_len = 4
+        self.assertTrue(self.server.enable_rx_queue())
+        for i in range(6):
+            self.assertTrue(self.client.send_msg(1, b'burst %d' % i))
+            time.sleep(0.01)
+        self.assertEqual(4, len(self.server.drain_packets()))
+        self.assertEqual(2, self.server.rx_queue_overflow)
+        self.assertTrue(self.server.enable_rx_queue(False))
+
+    def test_poll_packet_auto_ack(self):
+        result = []
+        sender = threading.Thread(target=lambda: result.append(
+            self.client.send_msg_with_retry(1, b'ping', retries=5, time_out=50)))
+        self.server.poll_packet()
+        sender.start()
+        packet = None
+        t_start = time.perf_counter()
+        while packet is None and time.perf_counter() - t_start < 1:
+            packet = self.server.poll_packet(ack_payload=b'pong')
+        sender.join()
+        self.assertEqual(b'ping', packet.payload)
+        self.assertEqual([True], result)
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
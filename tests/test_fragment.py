@@ -0,0 +1,103 @@
+import io
+import threading
+import unittest
+from RFM69Serial import RFM69Packet, Rfm69SerialDevice, FragmentSender, Reassembler
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.fragment import receive_stream, FRAGMENT_DATA_LEN, FRAGMENT_LAST
+
+
+def fragment(sender, transfer, index, data, last=False):
+    header = bytes((transfer, index >> 8, index & 0xFF, FRAGMENT_LAST if last else 0))
+    return RFM69Packet(sender, header + data)
+
+
+class TestReassembler(unittest.TestCase):
+    def test_interleaved_senders(self):
+        reassembler = Reassembler(max_size=64, max_senders=2)
+        self.assertIsNone(reassembler.feed(fragment(2, 0, 0, b'hello ')))
+        self.assertIsNone(reassembler.feed(fragment(3, 7, 0, b'good')))
+        self.assertIsNone(reassembler.feed(fragment(2, 0, 0, b'hello ')))     # duplicate
+        self.assertEqual(b'hello world', reassembler.feed(fragment(2, 0, 1, b'world', last=True)))
+        self.assertEqual(b'goodbye', reassembler.feed(fragment(3, 7, 1, b'bye', last=True)))
+        self.assertEqual(2, reassembler.completed)
+
+    def test_missing_fragment(self):
+        reassembler = Reassembler()
+        reassembler.feed(fragment(2, 0, 0, b'a'))
+        self.assertIsNone(reassembler.feed(fragment(2, 0, 2, b'c', last=True)))
+        self.assertEqual(1, reassembler.abandoned)
+        self.assertIsNone(reassembler.feed(fragment(2, 0, 3, b'd', last=True)))
+        self.assertEqual(1, reassembler.rejected)
+
+    def test_bounded(self):
+        reassembler = Reassembler(max_size=8, max_senders=1, timeout=1.0)
+        self.assertIsNone(reassembler.feed(fragment(2, 0, 0, b'0123456789')))
+        self.assertEqual(1, reassembler.abandoned)
+        reassembler.feed(fragment(2, 1, 0, b'01'), now=0.0)
+        # no free buffer for a second sender until the first transfer times out
+        self.assertIsNone(reassembler.feed(fragment(3, 0, 0, b'ab'), now=0.5))
+        self.assertEqual(1, reassembler.rejected)
+        self.assertEqual(b'ab', reassembler.feed(fragment(3, 0, 0, b'ab', last=True), now=1.5))
+        self.assertEqual(2, reassembler.abandoned)
+
+
+class TestFragmentTransfer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel()
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.client_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+        self.assertTrue(self.server.start_streaming(auto_ack=True))
+        self.message = bytes(range(256)) * 12
+
+    def send(self, transfer):
+        sender = FragmentSender(self.client)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(transfer(sender)))
+        thread.start()
+        return thread, result
+
+    def test_send(self):
+        thread, result = self.send(lambda sender: sender.send(1, self.message))
+        reassembler = Reassembler(max_size=len(self.message))
+        message = None
+        while message is None:
+            packet = self.server.recv_packet(timeout=2)
+            self.assertIsNotNone(packet)
+            message = reassembler.feed(packet)
+        thread.join()
+        self.assertEqual([True], result)
+        self.assertEqual(self.message, message)
+
+    def test_stream(self):
+        thread, result = self.send(lambda sender: sender.send_stream(1, io.BytesIO(self.message)))
+        sink = io.BytesIO()
+        self.assertEqual(len(self.message), receive_stream(self.server.recv_packet, sink))
+        thread.join()
+        self.assertEqual([True], result)
+        self.assertEqual(self.message, sink.getvalue())
+
+    def test_stream_chunks(self):
+        data = self.message[:3 * FRAGMENT_DATA_LEN]
+        chunks = [data[i:i + 100] for i in range(0, len(data), 100)]
+        thread, result = self.send(lambda sender: sender.send_stream(1, chunks))
+        sink = io.BytesIO()
+        self.assertEqual(len(data), receive_stream(self.server.recv_packet, sink))
+        thread.join()
+        self.assertEqual([True], result)
+        self.assertEqual(data, sink.getvalue())
+
+    def test_rtt_defaults(self):
+        """Unless given, the retries and time-out are left to the device's round-trip time estimates"""
+        calls = []
+        send_msg_with_retry = self.client.send_msg_with_retry
+        self.client.send_msg_with_retry = lambda *args: calls.append(args[2:]) or send_msg_with_retry(*args)
+        self.assertTrue(FragmentSender(self.client).send(1, b'short'))
+        self.assertEqual([(None, None)], calls)
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
@@ -0,0 +1,47 @@
+import time
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator
+from RFM69Serial.protocol import frame_command, unframe_command, CAP_FRAMED
+
+
+class TestFraming(unittest.TestCase):
+    def test_frame_command(self):
+        command = b'$\x03\x02\x00\x05hello'
+        self.assertEqual(b'#\x03\x08\x02\x00\x05hello', frame_command(command))
+        self.assertEqual(command, unframe_command(frame_command(command)))
+        self.assertEqual(b'#\x1E\x00', frame_command(memoryview(b'$\x1E')))
+
+    def test_negotiated(self):
+        with Rfm69SerialEmulator() as bridge:
+            dev = Rfm69SerialDevice(2, 101, port=bridge.port)
+            self.assertTrue(dev.capabilities & CAP_FRAMED)
+            self.assertTrue(dev._framed)
+            self.assertTrue(dev.is_device_connected())
+            self.assertTrue(dev.send_msg(1, b'x' * 60))
+            # opcodes without a fixed length are delimited by the frame as well
+            self.assertTrue(dev._serial_transfer(b'$thello'))
+            dev.close()
+
+    def test_legacy_firmware(self):
+        with Rfm69SerialEmulator(capabilities=None) as bridge:
+            dev = Rfm69SerialDevice(2, 101, port=bridge.port)
+            self.assertEqual(0, dev.capabilities)
+            self.assertFalse(dev._framed)
+            self.assertIsNone(dev.get_capabilities())
+            self.assertTrue(dev.send_msg(1, b'hello'))
+            dev.close()
+
+    def test_no_byte_delay(self):
+        """Framed commands skip the firmware's per-byte receive delay"""
+        elapsed = {}
+        for framed in (False, True):
+            with Rfm69SerialEmulator(byte_delay=0.002) as bridge:
+                dev = Rfm69SerialDevice(2, 101, port=bridge.port, framed=framed)
+                t_start = time.perf_counter()
+                for _ in range(3):
+                    self.assertTrue(dev.send_msg(1, b'x' * 60))
+                elapsed[framed] = time.perf_counter() - t_start
+                dev.close()
+        self.assertGreater(elapsed[False], 3 * 65 * 0.002)
+        self.assertLess(elapsed[True], elapsed[False] / 2)
@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from RFM69Serial import Rfm69SerialDevice, RFM69Packet
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.gateway import *
+
+
+class TestSharedRing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ring")
+
+    def test_publish_read(self):
+        writer = SharedRing(self.path, slots=4)
+        reader = SharedRing(self.path)
+        self.assertEqual(4, reader.slots)
+        packet = RFM69Packet(2, b'hello', target=1, rssi=-200, ack_requested=True)
+        self.assertEqual(0, writer.publish(0b10, 101, packet, timestamp=12.5))
+        self.assertEqual(1, reader.sequence)
+        self.assertIsNone(reader.read(0, 0b01))
+        item = reader.read(0, 0b10)
+        self.assertEqual((12.5, 101), item[:2])
+        self.assertEqual((2, 1, -200, True, b'hello'), (item.packet.sender, item.packet.target, item.packet.rssi,
+                                                         item.packet.ack_requested, item.packet.payload))
+        for _ in range(4):
+            writer.publish(0b10, 101, packet)
+        self.assertIs(False, reader.read(0, 0b10))      # overwritten
+        self.assertTrue(reader.read(4))
+        reader.close()
+        writer.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_not_a_ring(self):
+        with open(self.path, 'wb') as file:
+            file.write(bytes(RING_HEADER_SIZE))
+        self.assertRaises(ValueError, SharedRing, self.path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+
+class TestFairQueue(unittest.TestCase):
+    def test_round_robin(self):
+        queue = FairQueue(limit=3)
+        for i in range(3):
+            self.assertTrue(queue.put('flood', i))
+        self.assertFalse(queue.put('flood', 3))
+        self.assertTrue(queue.put('other', 'a'))
+        self.assertTrue(queue.put('third', 'x'))
+        self.assertEqual([('flood', 0), ('other', 'a'), ('third', 'x'), ('flood', 1), ('flood', 2)],
+                         [queue.get(0) for _ in range(5)])
+        self.assertIsNone(queue.get(0))
+
+        queue.put('flood', 0)
+        queue.put('other', 1)
+        self.assertEqual([0], queue.remove('flood'))
+        self.assertEqual(('other', 1), queue.get(0))
+        queue.close()
+        self.assertIsNone(queue.get())
+        self.assertFalse(queue.put('other', 2))
+
+
+class TestGateway(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "gateway.sock")
+        channel = RadioChannel()
+        self.bridge = Rfm69SerialEmulator(channel).start()
+        self.peer_bridge = Rfm69SerialEmulator(channel).start()
+        self.device = Rfm69SerialDevice(1, 101, port=self.bridge.port)
+        self.peer = Rfm69SerialDevice(2, 101, port=self.peer_bridge.port)
+        self.gateway = Gateway(self.device, self.path, slots=64).start()
+
+    def test_fan_out(self):
+        with GatewayClient(self.path) as logger, GatewayClient(self.path) as other, \
+                GatewayClient(self.path) as silent:
+            self.assertEqual(3, self.gateway.clients)
+            logger.subscribe()
+            other.subscribe(senders=[3])
+            silent.subscribe(networks=[102])
+            time.sleep(0.05)        # subscriptions are asynchronous
+            self.peer.send_msg(1, b'one')
+            time.sleep(0.02)
+            self.peer.send_msg(1, b'two')
+            self.assertEqual(b'one', logger.recv(timeout=2).packet.payload)
+            item = logger.recv(timeout=2)
+            self.assertEqual((101, 2, b'two'), (item.network, item.packet.sender, item.packet.payload))
+            self.assertIsNone(other.recv(timeout=0.1))
+            self.assertIsNone(silent.recv(timeout=0))
+            self.assertEqual(2, self.gateway.published)
+
+    def test_send(self):
+        self.peer.begin_receive()
+        with GatewayClient(self.path, timeout=2) as client:
+            self.assertTrue(client.send_msg(2, b'hello'))
+            self.assertTrue(self.peer.receive_done())
+            self.assertEqual(b'hello', self.peer.get_rx_data().payload)
+            self.assertFalse(client.send_msg_with_retry(7, b'nobody', retries=0, time_out=10))
+            self.assertRaises(RuntimeError, client.send_msg, 2, b'x', network=102)
+            self.assertRaises(ValueError, client.send_msg, 2, bytes(61))
+
+    def test_concurrent_clients(self):
+        # every client's sends go through while the others keep flooding the queue
+        results = {}
+
+        def run(name, count):
+            with GatewayClient(self.path, timeout=5) as client:
+                results[name] = [client.send_msg(9, name.encode()) for _ in range(count)]
+
+        threads = [threading.Thread(target=run, args=(name, 10)) for name in ('a', 'b', 'c')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({name: [True] * 10 for name in 'abc'}, results)
+
+    def test_lagging_client(self):
+        with GatewayClient(self.path) as client:
+            client.subscribe()
+            time.sleep(0.05)
+            ring = self.gateway.ring
+            for i in range(70):
+                ring.publish(1 << client.id, 101, RFM69Packet(5, bytes((i,))))
+            self.assertEqual(bytes((6,)), client.try_recv().packet.payload)
+            self.assertEqual(6, client.dropped)
+
+    def test_deadline(self):
+        """A message not yet (completely) in when the deadline passes is a time-out, not an error"""
+        with GatewayClient(self.path) as client:
+            self.assertIsNone(client._read_message(0))
+            client._buffer += b'\x00'        # the start of a split message
+            self.assertIsNone(client._read_message(0))
+
+    def test_stop(self):
+        client = GatewayClient(self.path)
+        self.gateway.stop()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.gateway.ring_path))
+        self.assertFalse(self.device.streaming)
+        self.assertRaises(ConnectionError, client.recv, 1)
+        client.close()
+
+    def tearDown(self) -> None:
+        self.gateway.stop()
+        self.device.close()
+        self.peer.close()
+        self.bridge.stop()
+        self.peer_bridge.stop()
+        shutil.rmtree(self.directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from RFM69Serial import Rfm69SerialDevice, BridgeManager
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+
+
+class TestBridgeManager(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel()
+        self.bridges = [Rfm69SerialEmulator(self.channel, byte_delay=0.002).start() for _ in range(2)]
+        self.nodes = [Rfm69SerialEmulator(self.channel).start() for _ in range(2)]
+
+    async def asyncSetUp(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.clients = [await loop.run_in_executor(None, lambda n=n: Rfm69SerialDevice(5 + n, 101 + n,
+                                                                                         port=self.nodes[n].port))
+                        for n in range(2)]
+        for client in self.clients:
+            self.assertTrue(client.start_streaming())
+        self.manager = await BridgeManager([dict(port=self.bridges[0].port, network=101),
+                                            dict(port=self.bridges[1].port, network=102),
+                                            "/dev/nonexistent-rfm69"], address=1).open()
+
+    async def test_open(self):
+        self.assertEqual({self.bridges[0].port, self.bridges[1].port}, set(self.manager.devices))
+        self.assertEqual(["/dev/nonexistent-rfm69"], list(self.manager.failed))
+
+    async def test_receive(self):
+        loop = asyncio.get_running_loop()
+        for n, client in enumerate(self.clients):
+            await loop.run_in_executor(None, client.send_msg, 1, b'from %d' % n)
+            tagged = await self.manager.recv(timeout=2)
+            self.assertEqual(self.bridges[n].port, tagged.bridge)
+            self.assertEqual(5 + n, tagged.packet.sender)
+            self.assertEqual(b'from %d' % n, tagged.packet.payload)
+
+    async def test_send(self):
+        self.assertTrue(await self.manager.send_msg(6, b'by network', network=102))
+        packet = await asyncio.get_running_loop().run_in_executor(None, self.clients[1].recv_packet, 2)
+        self.assertEqual(b'by network', packet.payload)
+
+        # the bridge which heard node 5 is used to answer it
+        with self.assertRaises(LookupError):
+            self.manager.route(5)
+        await asyncio.get_running_loop().run_in_executor(None, self.clients[0].send_msg, 1, b'hello')
+        await self.manager.recv(timeout=2)
+        self.assertEqual(self.bridges[0].port, self.manager.route(5).port)
+
+    async def test_packets_end_on_close(self):
+        async def consume():
+            return [tagged async for tagged in self.manager.packets()]
+
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        await self.manager.close()
+        self.assertEqual([], await asyncio.wait_for(consumer, 1))
+        self.assertIsNone(await self.manager.recv(timeout=0.1))
+
+    async def test_bridge_lost(self):
+        """A bridge whose reader died is no longer routable"""
+        port = self.bridges[1].port
+        self.bridges[1].stop()
+        for _ in range(100):
+            if port in self.manager.failed:
+                break
+            await asyncio.sleep(0.01)
+        self.assertIn(port, self.manager.failed)
+        self.assertNotIn(port, self.manager.devices)
+        with self.assertRaises(LookupError):
+            self.manager.route(network=102)
+
+    async def asyncTearDown(self) -> None:
+        await self.manager.close()
+        for client in self.clients:
+            client.close()
+
+    def tearDown(self) -> None:
+        for bridge in self.bridges + self.nodes:
+            bridge.stop()
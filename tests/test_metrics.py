@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator
+from RFM69Serial.metrics import CommandMetrics, PrometheusTextFile, prometheus_text
+from RFM69Serial.protocol import Reply
+
+
+class TestCommandMetrics(unittest.TestCase):
+    def test_record(self):
+        metrics = CommandMetrics(buckets=(0.001, 0.01))
+        metrics.record(0x0A, 2, b'y\x01\x02\x03', Reply(3), 0.0005)
+        metrics.record(0x0A, 2, b'n', Reply(3), 0.005)
+        metrics.record(0x0A, 2, b'y\x01', Reply(3), 1.0)
+        stats = metrics.snapshot()[0x0A]
+        self.assertEqual((3, 6, 7, 1, 1, 1), stats[:6])
+        self.assertEqual((1, 1, 1), stats.buckets)
+
+    def test_prometheus(self):
+        metrics = CommandMetrics(buckets=(0.001, 0.01))
+        metrics.record(0x05, 2, b'y', Reply(), 0.002)
+        text = prometheus_text(metrics.snapshot(), metrics.buckets, labels={'port': 'ttyACM0'})
+        self.assertIn('rfm69_commands_total{opcode="0x05",port="ttyACM0"} 1', text)
+        self.assertIn('rfm69_command_latency_seconds_bucket{opcode="0x05",port="ttyACM0",le="0.001"} 0', text)
+        self.assertIn('rfm69_command_latency_seconds_bucket{opcode="0x05",port="ttyACM0",le="+Inf"} 1', text)
+        self.assertIn('rfm69_replies_total{opcode="0x05",outcome="ok",port="ttyACM0"} 1', text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rfm69.prom")
+            metrics.add_exporter(PrometheusTextFile(path))
+            metrics.export()
+            with open(path) as file:
+                self.assertEqual(prometheus_text(metrics.snapshot(), metrics.buckets), file.read())
+
+
+class TestDeviceMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bridge = Rfm69SerialEmulator().start()
+
+    def test_device(self):
+        device = Rfm69SerialDevice(port=self.bridge.port)
+        device.metrics.reset()
+        device.begin_receive()
+        device.read_register(b'\x30', cached=False)
+        snapshot = device.metrics.snapshot()
+        self.assertEqual(1, snapshot[0x05].ok)
+        self.assertEqual(1, snapshot[0x1A].calls)
+        self.assertEqual(2, snapshot[0x1A].bytes_in)
+        device.close()
+
+    def test_get_rx_data_into(self):
+        device = Rfm69SerialDevice(port=self.bridge.port)
+        device.metrics.reset()
+        self.assertEqual((0, 0), device.get_rx_data_into(bytearray(61)))
+        stats = device.metrics.snapshot()[0x1E]
+        self.assertEqual((1, 1, 3, 0), (stats.calls, stats.ok, stats.bytes_in, stats.timeouts))
+        device.close()
+
+    def test_pipeline(self):
+        device = Rfm69SerialDevice(port=self.bridge.port)
+        device.metrics.reset()
+        with device.pipeline():
+            pending = [device.read_register(bytes((addr,)), cached=False) for addr in (0x30, 0x31, 0x32)]
+        self.assertEqual(b'\x65', pending[0].result())
+        stats = device.metrics.snapshot()[0x1A]
+        self.assertEqual((3, 3, 6), (stats.calls, stats.ok, stats.bytes_in))
+        device.close()
+
+    def test_disabled(self):
+        device = Rfm69SerialDevice(port=self.bridge.port, metrics=False)
+        self.assertIsNone(device.metrics)
+        self.assertTrue(device.begin_receive())
+        device.close()
+
+    def tearDown(self) -> None:
+        self.bridge.stop()
@@ -0,0 +1,52 @@
+import unittest
+from RFM69Serial.opcodes import *
+from RFM69Serial.protocol import _COMMAND_LENGTHS, _VARIABLE_COMMANDS, command_length, frame_command, \
+    unframe_command
+
+
+class TestOpcodeTable(unittest.TestCase):
+    def test_command_lengths(self):
+        """The table agrees with the firmware's commandLength()"""
+        for command in COMMANDS:
+            if command.payload_unit:
+                index, header, unit = _VARIABLE_COMMANDS[command.opcode]
+                self.assertEqual((header - 1, header, command.payload_unit), (index, command.header_size, unit))
+            elif command.opcode in _COMMAND_LENGTHS:
+                self.assertEqual(_COMMAND_LENGTHS[command.opcode], command.header_size, command)
+            else:
+                # encrypt: the key only follows if encryption is enabled
+                frame = command.encode(False, *command.request.unpack(bytes(command.header_size))[2:])
+                frame = frame[:2] + (b'\x01' if command is ENCRYPT else b'\x00') + frame[3:]
+                self.assertEqual(command.header_size, command_length(frame, len(frame)), command)
+
+    def test_encode(self):
+        self.assertEqual(b'$\x00\x02\x65\x0A\x08', INITIALIZE.encode(False, 2, 101, 10, 8))
+        self.assertEqual(b'$\x0B\xC0\xCA\x89\x36', SET_FREQUENCY.encode(False, 915000000))
+        self.assertEqual(b'$\x0C\x01samplekey16bytes', ENCRYPT.encode(False, 1, b'samplekey16bytes'))
+        self.assertEqual(b'$\x12\x1F', SET_POWER_LEVEL.encode(False, 31))
+        self.assertEqual(b'$\x16\xFE', READ_TEMPERATURE.encode(False, -2))
+        self.assertEqual(b'#\x24\x00', GET_CAPABILITIES.encode(True))
+
+    def test_framed_encode(self):
+        self.assertEqual(frame_command(b'$\x1D\x30\x02\x01\x02'), WRITE_REGS.encode(True, 0x30, 2, extra=2) +
+                         b'\x01\x02')
+        for command in COMMANDS:
+            args = command.request.unpack(bytes(command.header_size))[2:]
+            legacy, framed = command.encode(False, *args), command.encode(True, *args)
+            self.assertEqual(frame_command(legacy), framed, command)
+            self.assertEqual(legacy, unframe_command(framed), command)
+
+    def test_encode_into(self):
+        buffer = bytearray(16)
+        size = SEND.encode_into(buffer, True, 2, 0, 5, extra=5)
+        buffer[size:size + 5] = b'hello'
+        self.assertEqual(frame_command(b'$\x03\x02\x00\x05hello'), bytes(buffer[:size + 5]))
+
+    def test_decode(self):
+        self.assertEqual((1, 0x3F), GET_CAPABILITIES.decode(b'y\x01\x3F'))
+        self.assertEqual((-5,), READ_TEMPERATURE.decode(b'y\xFB'))
+        self.assertEqual((2, 0, 16, 300), DRAIN_PACKETS.decode(b'y\x02\x00\x10\x2C\x01'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,3 +15,14 @@ class TestRFM69Packet(unittest.TestCase):
         self.testPacket.message = self.testData
         self.assertIsInstance(self.testPacket.message, list)
         self.assertEqual('hello world', self.testPacket.message_to_string())
+
+    def test_payload(self):
+        packet = RFM69Packet(3, b'hello world')
+        self.assertEqual(b'hello world', packet.payload)
+        self.assertEqual('hello world', packet.decode())
+        self.assertEqual([104, 101], packet.message_to_int()[:2])
+        self.assertEqual(self.testData, packet.message)
+        packet.payload = bytearray(b'\x01\x02')
+        self.assertIsInstance(packet.payload, bytes)
+        with self.assertRaises(TypeError):
+            packet.payload = [1, 2]
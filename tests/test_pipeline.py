@@ -0,0 +1,72 @@
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator
+from RFM69Serial.pipeline import PendingReply
+
+
+class TestCommandPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bridge = Rfm69SerialEmulator().start()
+        self.test_device = Rfm69SerialDevice(2, 101, port=self.bridge.port)
+
+    def test_pending_replies(self):
+        with self.test_device.pipeline(depth=4) as pipe:
+            pending = self.test_device.set_network_id(55)
+            self.assertIsInstance(pending, PendingReply)
+            self.assertLessEqual(len(pipe), 4)
+        self.assertTrue(pending.done())
+        self.assertTrue(pending.result())
+        # back to blocking mode
+        self.assertEqual(b'\x37', self.test_device.read_register(b'\x30'))
+
+    def test_reply_order(self):
+        """Multi-byte replies (0x0A, 0x0F, 0x1A, 0x1E) must be matched to their own commands"""
+        with self.test_device.pipeline(depth=16):
+            results = []
+            for i in range(20):
+                results.append(self.test_device.write_register(b'\x30', bytes([i])))
+                results.append(self.test_device.read_register(b'\x30'))
+                results.append(self.test_device.get_frequency())
+                results.append(self.test_device.get_rssi())
+                results.append(self.test_device.get_rx_data())
+                results.append(self.test_device.send_msg(3, "burst %d" % i))
+            connected = self.test_device.is_device_connected()
+
+        for i in range(20):
+            written, value, freq, rssi, packet, sent = [r.result() for r in results[i * 6:i * 6 + 6]]
+            self.assertTrue(written)
+            self.assertEqual(bytes([i]), value)
+            self.assertEqual(915000000, freq)
+            self.assertEqual(-100, rssi)
+            self.assertEqual(0, packet.sender)
+            self.assertTrue(sent)
+        self.assertTrue(connected.result())
+
+    def test_result_drives_pipeline(self):
+        with self.test_device.pipeline(depth=8):
+            first = self.test_device.read_register(b'\x38')
+            self.assertEqual(b'\x42', first.result())
+            second = self.test_device.read_register(b'\x10')
+        self.assertEqual(b'\x24', second.result())
+
+    def test_byte_window(self):
+        """Outstanding command bytes must fit in the bridge's serial receive buffer"""
+        with self.test_device.pipeline(depth=16, window=64) as pipe:
+            sent = []
+            for i in range(8):
+                sent.append(self.test_device.send_msg(3, bytes(40)))
+                self.assertEqual(1, len(pipe))      # one 40-byte message frame at a time
+            self.test_device.get_rssi()
+            self.test_device.is_device_connected()
+            self.assertEqual(3, len(pipe))
+        self.assertTrue(all(s.result() for s in sent))
+
+    def test_invalid_depth(self):
+        with self.assertRaises(ValueError):
+            self.test_device.pipeline(depth=0)
+        with self.assertRaises(ValueError):
+            self.test_device.pipeline(window=0)
+
+    def tearDown(self) -> None:
+        self.test_device.close()
+        self.bridge.stop()
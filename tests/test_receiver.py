@@ -0,0 +1,83 @@
+import threading
+import unittest
+from RFM69Serial import Rfm69SerialDevice, PacketReceiver, PacketRing
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.receiver import DROP_OLDEST, DROP_NEWEST, BLOCK
+
+
+class TestPacketRing(unittest.TestCase):
+    def test_fifo(self):
+        ring = PacketRing(4)
+        for i in range(3):
+            self.assertTrue(ring.put(i))
+        self.assertEqual([0, 1, 2], [ring.get(0) for _ in range(3)])
+        self.assertIsNone(ring.get(0))
+
+    def test_drop_oldest(self):
+        ring = PacketRing(3, DROP_OLDEST)
+        for i in range(5):
+            ring.put(i)
+        self.assertEqual(2, ring.dropped_oldest)
+        self.assertEqual([2, 3, 4], [ring.get(0) for _ in range(3)])
+
+    def test_drop_newest(self):
+        ring = PacketRing(3, DROP_NEWEST)
+        for i in range(5):
+            ring.put(i)
+        self.assertEqual(2, ring.dropped_newest)
+        self.assertEqual([0, 1, 2], [ring.get(0) for _ in range(3)])
+
+    def test_block(self):
+        ring = PacketRing(1, BLOCK)
+        ring.put(0)
+        self.assertFalse(ring.put(1, timeout=0.01))
+        consumer = threading.Timer(0.05, ring.get)
+        consumer.start()
+        self.assertTrue(ring.put(2, timeout=1))
+        self.assertEqual(2, ring.get(0))
+
+    def test_close(self):
+        ring = PacketRing(2)
+        ring.put(0)
+        ring.close()
+        self.assertFalse(ring.put(1))
+        self.assertEqual(0, ring.get())
+        self.assertIsNone(ring.get())
+
+
+class TestPacketReceiver(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel()
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.client_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+
+    def test_receive(self):
+        with PacketReceiver(self.server, capacity=8) as rx:
+            self.assertIsNone(rx.try_recv())
+            for i in range(5):
+                self.client.send_msg(1, b'packet %d' % i)
+                packet = rx.recv(timeout=1)
+                self.assertIsNotNone(packet)
+                self.assertEqual(2, packet.sender)
+                self.assertEqual(b'packet %d' % i, packet.payload)
+            # the application can use the device while the receiver runs
+            self.assertTrue(self.server.is_device_connected())
+        self.assertFalse(rx.is_running)
+        self.assertIsNone(rx.error)
+        self.assertEqual(5, rx.received)
+
+    def test_iterate(self):
+        rx = PacketReceiver(self.server).start()
+        self.client.send_msg(1, b'one')
+        self.assertEqual(b'one', rx.recv(timeout=1).payload)
+        self.client.send_msg(1, b'two')
+        threading.Timer(0.2, rx.stop).start()
+        self.assertEqual([b'two'], [packet.payload for packet in rx])
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
@@ -0,0 +1,106 @@
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator
+from RFM69Serial.registers import RegisterShadow, RESET_VALUES, REG_IRQFLAGS1, REG_RXBW, REG_SYNCVALUE2, REG_TEMP2
+
+
+class TestRegisterShadow(unittest.TestCase):
+    def test_shadow(self):
+        shadow = RegisterShadow()
+        self.assertIsNone(shadow.get(REG_RXBW))
+        shadow.set(REG_RXBW, 0x55)
+        self.assertEqual(0x55, shadow.get(REG_RXBW))
+        # volatile registers are never recorded
+        shadow.set(REG_IRQFLAGS1, 0x80)
+        self.assertIsNone(shadow.get(REG_IRQFLAGS1))
+        self.assertEqual({REG_RXBW: 0x55}, shadow.snapshot())
+        shadow.invalidate()
+        self.assertEqual({}, shadow.snapshot())
+
+    def test_stale_epoch(self):
+        shadow = RegisterShadow()
+        epoch = shadow.epoch
+        shadow.invalidate(REG_RXBW)
+        shadow.set(REG_RXBW, 0x55, epoch)
+        self.assertIsNone(shadow.get(REG_RXBW))
+
+
+class TestRegisterCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bridge = Rfm69SerialEmulator().start()
+        self.test_device = Rfm69SerialDevice(2, 101, port=self.bridge.port)
+        self.regs = self.bridge.radio.regs
+
+    def test_cached_read(self):
+        self.assertEqual(bytes([RESET_VALUES[REG_RXBW]]), self.test_device.read_register(bytes([REG_RXBW])))
+        # changed behind the host's back: the shadow still answers until asked to go to the module
+        self.regs[REG_RXBW] = 0x44
+        self.assertEqual(bytes([RESET_VALUES[REG_RXBW]]), self.test_device.read_register(bytes([REG_RXBW])))
+        self.assertEqual(b'\x44', self.test_device.read_register(bytes([REG_RXBW]), cached=False))
+        self.regs[REG_RXBW] = 0x45
+        self.test_device.invalidate_registers(REG_RXBW)
+        self.assertEqual(b'\x45', self.test_device.read_register(bytes([REG_RXBW])))
+
+    def test_volatile_read(self):
+        self.assertEqual(b'\x80', self.test_device.read_register(bytes([REG_IRQFLAGS1])))
+        self.regs[REG_IRQFLAGS1] = 0xD8
+        self.assertEqual(b'\xD8', self.test_device.read_register(bytes([REG_IRQFLAGS1])))
+
+    def test_write_through(self):
+        self.assertTrue(self.test_device.write_register(bytes([REG_RXBW]), b'\x55'))
+        self.regs[REG_RXBW] = 0x00
+        self.assertEqual(b'\x55', self.test_device.read_register(bytes([REG_RXBW])))
+
+    def test_frequency(self):
+        self.assertEqual(915000000, self.test_device.get_frequency())
+        self.assertTrue(self.test_device.set_frequency(868000000))
+        self.assertEqual(868000000, self.test_device.get_frequency())
+        self.assertTrue(self.test_device.set_network_id(7))
+        self.assertEqual(b'\x07', self.test_device.read_register(bytes([REG_SYNCVALUE2])))
+
+    def test_dump(self):
+        registers = self.test_device.dump_registers()
+        self.assertEqual(0x71, len(registers))
+        self.assertEqual({addr: self.regs[addr] for addr in range(1, 0x72)}, registers)
+        self.regs[REG_RXBW] = 0x44
+        self.assertEqual(0x44, self.test_device.dump_registers()[REG_RXBW])
+        self.assertEqual(b'\x44', self.test_device.read_register(bytes([REG_RXBW])))
+
+    def test_burst(self):
+        values = self.test_device.read_registers(REG_RXBW, 3)
+        self.assertEqual(bytes(self.regs[REG_RXBW:REG_RXBW + 3]), values)
+        self.assertTrue(self.test_device.write_registers(REG_RXBW, b'\x51\x52\x53'))
+        self.assertEqual(b'\x51\x52\x53', bytes(self.regs[REG_RXBW:REG_RXBW + 3]))
+        self.assertTrue(self.test_device.write_registers({REG_RXBW: 0x61, REG_SYNCVALUE2: 0x62}))
+        self.assertEqual((0x61, 0x62), (self.regs[REG_RXBW], self.regs[REG_SYNCVALUE2]))
+        # the shadow follows burst writes
+        self.regs[REG_RXBW] = 0
+        self.assertEqual(b'\x61', self.test_device.read_register(bytes([REG_RXBW])))
+        self.assertEqual(b'\x52', self.test_device.read_register(bytes([REG_RXBW + 1])))
+
+        with self.assertRaises(ValueError):
+            self.test_device.read_registers(0x70, 0x20)
+        with self.assertRaises(ValueError):
+            self.test_device.write_registers([(addr, 0) for addr in range(65)])
+        with self.assertRaises(TypeError):
+            self.test_device.write_registers(REG_RXBW, [1, 2])
+
+    def test_restore(self):
+        snapshot = self.test_device.dump_registers()
+        self.test_device.write_registers([(REG_RXBW, 0x11), (REG_SYNCVALUE2, 0x22)])
+        self.assertTrue(self.test_device.load_registers(snapshot))
+        self.assertEqual(snapshot, {addr: self.regs[addr] for addr in range(1, 0x72)})
+
+    def test_restore_skips_volatile(self):
+        snapshot = self.test_device.dump_registers()
+        profile = dict(snapshot)
+        profile[REG_TEMP2] = 0x33   # volatile
+        profile[0x50] = 0x44        # reserved
+        self.assertTrue(self.test_device.load_registers(profile))
+        self.assertEqual((snapshot[REG_TEMP2], snapshot[0x50]), (self.regs[REG_TEMP2], self.regs[0x50]))
+        self.assertTrue(self.test_device.load_registers(profile, include_volatile=True))
+        self.assertEqual((0x33, 0x44), (self.regs[REG_TEMP2], self.regs[0x50]))
+
+    def tearDown(self) -> None:
+        self.test_device.close()
+        self.bridge.stop()
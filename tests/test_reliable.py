@@ -0,0 +1,82 @@
+import io
+import threading
+import unittest
+from RFM69Serial import RFM69Packet, Rfm69SerialDevice, ReliableSender, ReliableReceiver
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.reliable import SEGMENT_ACK, SEGMENT_DATA, SEGMENT_SYN, SEGMENT_FIN
+
+
+class RecordingDevice:
+    def __init__(self):
+        self.sent = []
+
+    def send_msg(self, target, msg):
+        self.sent.append((target, bytes(msg)))
+        return True
+
+
+def segment(seq, data, flags=0):
+    return RFM69Packet(2, bytes((SEGMENT_DATA | flags, seq)) + data)
+
+
+class TestReliableReceiver(unittest.TestCase):
+    def setUp(self) -> None:
+        self.device = RecordingDevice()
+        self.receiver = ReliableReceiver(self.device, window=4)
+
+    def test_selective_ack(self):
+        self.assertEqual([(b'a', False)], self.receiver.feed(segment(10, b'a', SEGMENT_SYN)))
+        self.assertEqual([], self.receiver.feed(segment(12, b'c')))
+        self.assertEqual([], self.receiver.feed(segment(13, b'd', SEGMENT_FIN)))
+        # cumulative ACK of 11, with 12 and 13 received beyond it
+        self.assertEqual((2, bytes((SEGMENT_ACK, 11, 0b11, 0, 0, 0))), self.device.sent[-1])
+        self.assertEqual([(b'b', False), (b'c', False), (b'd', True)], self.receiver.feed(segment(11, b'b')))
+        self.assertEqual((2, bytes((SEGMENT_ACK, 14, 0, 0, 0, 0))), self.device.sent[-1])
+
+    def test_duplicate(self):
+        self.receiver.feed(segment(0, b'a', SEGMENT_SYN))
+        self.receiver.feed(segment(1, b'b', SEGMENT_FIN))
+        self.assertEqual([], self.receiver.feed(segment(0, b'a', SEGMENT_SYN)))
+        self.assertEqual((2, bytes((SEGMENT_ACK, 2, 0, 0, 0, 0))), self.device.sent[-1])
+
+    def test_no_syn(self):
+        self.assertEqual([], self.receiver.feed(segment(5, b'x')))
+        self.assertEqual([], self.device.sent)
+
+
+class TestReliableTransfer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel(latency=0.003, loss=0.1, seed=14)     # ~airtime of a short packet
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.client_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+        self.assertTrue(self.server.start_streaming())
+        self.assertTrue(self.client.start_streaming())
+
+    def test_lossy_transfer(self):
+        messages = [bytes(range(256)) * 8, b'second transfer']
+        sender = ReliableSender(self.client, window=8, rto=0.05, retries=10)
+        result = []
+        thread = threading.Thread(target=lambda: result.extend(sender.send(1, m) for m in messages))
+        thread.start()
+
+        receiver = ReliableReceiver(self.server, window=8)
+        for message in messages:
+            sink = io.BytesIO()
+            self.assertEqual(len(message), receiver.receive(self.server.recv_packet, sink, timeout=5))
+            self.assertEqual(message, sink.getvalue())
+        while thread.is_alive():
+            # answer retransmissions of the last segment, should its ACK get lost
+            packet = self.server.recv_packet(timeout=0.05)
+            if packet is not None:
+                receiver.feed(packet)
+        thread.join()
+        self.assertEqual([True, True], result)
+        self.assertGreater(sender.retransmissions, 0)
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
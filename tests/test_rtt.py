@@ -0,0 +1,77 @@
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.protocol import CAP_FRAMED, CAP_STREAMING
+from RFM69Serial.rtt import RttTable, DEFAULT_RTO, DEFAULT_RETRIES, MAX_RTO, MIN_RTO
+
+
+class TestRttTable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = RttTable()
+
+    def test_defaults(self):
+        self.assertEqual(DEFAULT_RTO, self.table.timeout(7))
+        self.assertEqual(DEFAULT_RETRIES, self.table.retries(7))
+        self.assertEqual([], self.table.nodes())
+
+    def test_estimate(self):
+        self.table.record(7, 0, 20)
+        # RFC 6298 first sample: SRTT = R, RTTVAR = R / 2, RTO = SRTT + 4 * RTTVAR
+        self.assertEqual(60, self.table.timeout(7))
+        for _ in range(50):
+            self.table.record(7, 0, 20)
+        self.assertLess(self.table.timeout(7), 25)
+        self.assertGreaterEqual(self.table.timeout(7), MIN_RTO)
+        self.assertEqual(1, self.table.retries(7))
+        stats = self.table.stats(7)
+        self.assertAlmostEqual(20, stats.srtt, places=3)
+        self.assertEqual((51, 51, 0), (stats.samples, stats.sent, stats.failed))
+
+    def test_backoff(self):
+        self.table.record(7, 0, 100)
+        for _ in range(3):
+            self.table.record(7, None, 0)
+        self.assertEqual(MAX_RTO, self.table.timeout(7))
+        self.assertGreater(self.table.retries(7), DEFAULT_RETRIES)
+        # retried attempts yield no sample (Karn's algorithm)
+        self.table.record(7, 1, 10)
+        self.assertEqual(1, self.table.stats(7).samples)
+        self.assertEqual(3, self.table.stats(7).failed)
+        self.table.reset(7)
+        self.assertEqual(DEFAULT_RTO, self.table.timeout(7))
+
+
+class TestAdaptiveRetry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel()
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.assertTrue(self.server.start_streaming(auto_ack=True))
+
+    def connect(self, **kwargs):
+        self.client_bridge = Rfm69SerialEmulator(self.channel, **kwargs).start()
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+
+    def test_adaptive(self):
+        self.connect()
+        for _ in range(5):
+            self.assertTrue(self.client.send_msg_with_retry(1, b'ping'))
+        stats = self.client.rtt.stats(1)
+        self.assertEqual(5, stats.samples)
+        self.assertLess(self.client.rtt.timeout(1), DEFAULT_RTO)
+
+        # pinned values are used as given, the outcome is still recorded
+        self.assertFalse(self.client.send_msg_with_retry(9, b'ping', retries=1, time_out=5))
+        self.assertEqual((1, 1), (self.client.rtt.stats(9).sent, self.client.rtt.stats(9).failed))
+        self.assertEqual(2 * DEFAULT_RTO, self.client.rtt.timeout(9))
+
+    def test_legacy_firmware(self):
+        self.connect(capabilities=CAP_FRAMED | CAP_STREAMING)
+        self.assertTrue(self.client.send_msg_with_retry(1, b'ping'))
+        self.assertEqual([], self.client.rtt.nodes())
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
@@ -0,0 +1,194 @@
+import threading
+import time
+import unittest
+import serial
+from RFM69Serial import RFM69Packet, Rfm69SerialDevice, TxScheduler
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.scheduler import BATCH_MARKER, PRIORITY_BULK, PRIORITY_CONTROL, PRIORITY_NORMAL, \
+    pack_messages, unpack_messages, split_packet
+
+
+class RecordingDevice:
+    def __init__(self):
+        self.sent = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def send_msg(self, target, msg):
+        self.gate.wait()
+        self.sent.append((target, bytes(msg), False))
+        return True
+
+    def send_msg_with_retry(self, target, msg, retries=None, time_out=None):
+        self.sent.append((target, bytes(msg), True))
+        return False
+
+
+class TestBatchFormat(unittest.TestCase):
+    def test_roundtrip(self):
+        frame = pack_messages([b'a', b'', b'xyz'])
+        self.assertEqual(bytes((BATCH_MARKER, 1)) + b'a' + bytes((0, 3)) + b'xyz', frame)
+        self.assertEqual([b'a', b'', b'xyz'], unpack_messages(frame))
+
+    def test_plain_frame(self):
+        self.assertEqual([b'hello'], unpack_messages(b'hello'))
+        self.assertEqual([b''], unpack_messages(b''))
+
+    def test_malformed(self):
+        self.assertIsNone(unpack_messages(bytes((BATCH_MARKER, 5)) + b'abc'))
+        self.assertIsNone(split_packet(RFM69Packet(2, bytes((BATCH_MARKER, 5)))))
+
+    def test_too_long(self):
+        with self.assertRaises(ValueError):
+            pack_messages([bytes(30), bytes(30)])
+
+    def test_split_packet(self):
+        packet = RFM69Packet(2, pack_messages([b'one', b'two']), target=1, rssi=-50, ack_requested=False)
+        parts = split_packet(packet)
+        self.assertEqual([b'one', b'two'], [part.payload for part in parts])
+        self.assertEqual([(2, 1, -50)] * 2, [(part.sender, part.target, part.rssi) for part in parts])
+        plain = RFM69Packet(2, b'plain')
+        self.assertEqual([plain], split_packet(plain))
+
+
+class TestTxScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.device = RecordingDevice()
+
+    def test_coalescing(self):
+        with TxScheduler(self.device, linger=0.05) as tx:
+            for message in (b'one', b'two', b'three'):
+                self.assertTrue(tx.send(2, message))
+            self.assertTrue(tx.send(3, b'other'))
+            self.assertEqual([], self.device.sent)      # lingering
+            time.sleep(0.2)
+        self.assertEqual([(2, pack_messages([b'one', b'two', b'three']), False), (3, b'other', False)],
+                         self.device.sent)
+        self.assertEqual((4, 2), (tx.messages_sent, tx.frames_sent))
+
+    def test_full_frame(self):
+        with TxScheduler(self.device, linger=10) as tx:
+            for index in range(4):
+                tx.send(2, bytes([index]) * 18)
+            self.assertTrue(tx.flush(1))
+        # three 18-byte messages fill a frame, the fourth one goes alone
+        self.assertEqual(2, len(self.device.sent))
+        self.assertEqual([bytes([index]) * 18 for index in range(3)], unpack_messages(self.device.sent[0][1]))
+        self.assertEqual(bytes([3]) * 18, self.device.sent[1][1])
+
+    def test_priorities(self):
+        self.device.gate.clear()
+        with TxScheduler(self.device, linger=0) as tx:
+            tx.send(9, b'first', PRIORITY_CONTROL)
+            time.sleep(0.05)        # the scheduler thread is sending it
+            tx.send(3, b'bulk', PRIORITY_BULK)
+            tx.send(4, b'normal', PRIORITY_NORMAL)
+            tx.send(5, b'control', PRIORITY_CONTROL)
+            self.device.gate.set()
+        self.assertEqual([9, 5, 4, 3], [target for target, _, _ in self.device.sent])
+
+    def test_control_skips_linger(self):
+        with TxScheduler(self.device, linger=10) as tx:
+            tx.send(2, b'stop', PRIORITY_CONTROL)
+            time.sleep(0.1)
+            self.assertEqual([(2, b'stop', False)], self.device.sent)
+
+    def test_marker_message(self):
+        with TxScheduler(self.device, linger=0) as tx:
+            tx.send(2, bytes((BATCH_MARKER, 1)))
+            with self.assertRaises(ValueError):
+                tx.send(2, bytes((BATCH_MARKER,)) * 60)
+        self.assertEqual([bytes((BATCH_MARKER, 1))], unpack_messages(self.device.sent[0][1]))
+
+    def test_reliable_and_callbacks(self):
+        results = []
+        with TxScheduler(self.device, linger=10) as tx:
+            tx.send(2, b'a', callback=results.append)
+            tx.send(2, b'b', reliable=True, callback=results.append)
+        self.assertEqual([(2, pack_messages([b'a', b'b']), True)], self.device.sent)
+        self.assertEqual([False, False], results)
+        self.assertEqual(2, tx.failed)
+
+    def test_stop(self):
+        results = []
+        tx = TxScheduler(self.device, linger=10, limit=2)
+        self.assertFalse(tx.send(2, b'not running'))
+        tx.start()
+        self.assertTrue(tx.send(2, b'a', PRIORITY_BULK, callback=results.append))
+        self.assertTrue(tx.send(2, b'b', PRIORITY_BULK, callback=results.append))
+        self.assertFalse(tx.send(2, b'c', PRIORITY_BULK))
+        self.assertEqual(1, tx.rejected)
+        tx.stop(flush=False)
+        self.assertEqual([], self.device.sent)
+        self.assertEqual([False, False], results)
+        self.assertEqual(0, len(tx))
+
+    def test_send_error(self):
+        results = []
+        send_msg = self.device.send_msg
+
+        def failing(target, msg):
+            self.device.send_msg = send_msg
+            raise serial.SerialTimeoutException("write timeout")
+
+        self.device.send_msg = failing
+        with TxScheduler(self.device, linger=0) as tx:
+            tx.send(2, b'lost', callback=results.append)
+            self.assertTrue(tx.flush(1))
+            self.assertTrue(tx.is_running)      # the next frames still go out
+            tx.send(2, b'sent', callback=results.append)
+        self.assertEqual([False, True], results)
+        self.assertEqual([(2, b'sent', False)], self.device.sent)
+        self.assertEqual(1, tx.failed)
+        self.assertIsInstance(tx.error, serial.SerialTimeoutException)
+
+    def test_callback_error(self):
+        results = []
+
+        def failing(sent):
+            raise RuntimeError("callback bug")
+
+        with TxScheduler(self.device, linger=0) as tx:
+            tx.send(2, b'first', callback=failing)
+            self.assertTrue(tx.flush(1))
+            self.assertTrue(tx.is_running)
+            tx.send(2, b'second', callback=results.append)
+        self.assertEqual([True], results)
+        self.assertEqual(2, tx.messages_sent)
+        self.assertIsInstance(tx.error, RuntimeError)
+
+    def test_no_coalescing(self):
+        with TxScheduler(self.device, coalesce=False) as tx:
+            tx.send(2, b'a')
+            tx.send(2, bytes((BATCH_MARKER,)) * 60)
+        self.assertEqual([b'a', bytes((BATCH_MARKER,)) * 60], [msg for _, msg, _ in self.device.sent])
+
+
+class TestScheduledTransfer(unittest.TestCase):
+    def setUp(self) -> None:
+        channel = RadioChannel()
+        self.server_bridge = Rfm69SerialEmulator(channel).start()
+        self.client_bridge = Rfm69SerialEmulator(channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+        self.assertTrue(self.server.start_streaming())
+
+    def test_burst(self):
+        messages = [b'reading %d' % index for index in range(5)]
+        with TxScheduler(self.client, linger=0.02) as tx:
+            for message in messages:
+                tx.send(1, message)
+        self.assertEqual(1, tx.frames_sent)
+        packet = self.server.recv_packet(1)
+        self.assertEqual(messages, [part.payload for part in split_packet(packet)])
+        self.assertIsNone(self.server.recv_packet(0.05))
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from RFM69Serial import Rfm69SerialDevice, RFM69Packet
+from RFM69Serial.capture import *
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.protocol import CAP_FRAMED, CAP_STREAMING
+from RFM69Serial.sniffer import *
+
+
+def _packets(stream, count, timeout=2.0):
+    # collect @count packets from a stream, skipping ticks
+    items = []
+    deadline = time.monotonic() + timeout
+    for item in stream:
+        if item is not None:
+            items.append(item)
+        if len(items) == count or time.monotonic() > deadline:
+            break
+    return items
+
+
+class TestRxFilter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel(rssi=-60)
+        self.bridges = [Rfm69SerialEmulator(self.channel).start() for _ in range(3)]
+        self.sniffer = Rfm69SerialDevice(9, 101, port=self.bridges[0].port)
+        self.node2 = Rfm69SerialDevice(2, 101, port=self.bridges[1].port)
+        self.node3 = Rfm69SerialDevice(3, 101, port=self.bridges[2].port)
+
+    def test_poll_filter(self):
+        self.assertTrue(self.sniffer.set_spy(True))
+        self.assertTrue(self.sniffer.set_rx_filter(senders=[3]))
+        self.assertIsNone(self.sniffer.poll_packet())
+        self.node2.send_msg(1, b'two')
+        self.assertIsNone(self.sniffer.poll_packet())
+        self.node3.send_msg(1, b'three')
+        packet = self.sniffer.poll_packet()
+        self.assertEqual((3, 1, b'three'), (packet.sender, packet.target, packet.payload))
+
+        self.assertTrue(self.sniffer.set_rx_filter(min_rssi=-50))
+        self.node3.send_msg(1, b'weak')
+        self.assertIsNone(self.sniffer.poll_packet())
+        self.assertTrue(self.sniffer.set_rx_filter())
+        self.node2.send_msg(5, b'any')
+        self.assertEqual(b'any', self.sniffer.poll_packet().payload)
+        self.assertRaises(ValueError, self.sniffer.set_rx_filter, senders=[256])
+
+    def test_sniff(self):
+        stream = sniff(self.sniffer, senders=[2, 3], targets=[1], tick=0.05)
+        self.assertIsNone(next(stream))     # idle tick, the bridge is listening
+        for node, target, payload in ((self.node2, 1, b'a'), (self.node3, 4, b'b'), (self.node3, 1, b'c')):
+            node.send_msg(target, payload)
+            time.sleep(0.02)        # one frame on the air at a time
+        items = _packets(stream, 2)
+        stream.close()
+        self.assertEqual([(2, b'a'), (3, b'c')], [(item.packet.sender, item.packet.payload) for item in items])
+        self.assertEqual(-60, items[0].packet.rssi)
+        self.assertAlmostEqual(time.time(), items[0].time, delta=5)
+        self.assertFalse(self.sniffer.streaming)
+        self.assertFalse(self.bridges[0].radio.promiscuous)
+        self.assertEqual(0, self.bridges[0].filter_flags)
+
+    def test_sniff_host_filter(self):
+        self.sniffer.close()
+        self.bridges[0].capabilities = CAP_FRAMED | CAP_STREAMING
+        self.sniffer = Rfm69SerialDevice(9, 101, port=self.bridges[0].port)
+        self.assertRaises(RuntimeError, self.sniffer.set_rx_filter, senders=[2])
+        stop = threading.Event()
+        stream = sniff(self.sniffer, senders=[3], tick=0.05, stop=stop)
+        next(stream)
+        self.node2.send_msg(1, b'a')
+        time.sleep(0.02)
+        self.node3.send_msg(1, b'b')
+        items = _packets(stream, 1)
+        stop.set()
+        self.assertEqual([], list(stream)[1:])
+        self.assertEqual([b'b'], [item.packet.payload for item in items])
+        self.assertFalse(self.sniffer.streaming)
+
+    def tearDown(self) -> None:
+        for device in (self.sniffer, self.node2, self.node3):
+            device.close()
+        for bridge in self.bridges:
+            bridge.stop()
+
+
+class TestStages(unittest.TestCase):
+    def setUp(self) -> None:
+        self.items = [SniffedPacket(1000.0 + i, RFM69Packet(2 + i % 2, bytes((i,)) * (i + 1), target=1,
+                                                            rssi=-50 - i), 0, None) for i in range(6)]
+
+    def test_filter_and_decode(self):
+        stream = filter_packets(iter(self.items[:3] + [None] + self.items[3:]), senders=[2], min_rssi=-53)
+        stream = decode(stream, {2: lambda packet: len(packet.payload)})
+        out = list(stream)
+        self.assertEqual([1, 3, None], [item.value if item else None for item in out])
+        out = list(decode(iter(self.items[1:2]), lambda packet: 1 // 0))     # failing decoders leave None
+        self.assertIsNone(out[0].value)
+
+    def test_aggregate(self):
+        reports = []
+        self.assertEqual(6, drain(aggregate(iter(self.items), interval=3600, report=reports.append)))
+        self.assertEqual(1, len(reports))
+        report = reports[0]
+        self.assertEqual(6, report.packets)
+        self.assertEqual(NodeTraffic(3, 1 + 3 + 5, -54, -50, -52.0), report.nodes[2])
+        self.assertEqual(3, report.nodes[3].packets)
+
+
+    def test_aggregate_dropped(self):
+        items = [item._replace(dropped=dropped) for item, dropped in zip(self.items, (0, 2, 2, 5, 5, 6))]
+        reports = []
+        drain(aggregate(iter(items), interval=0, report=reports.append))
+        # drops per report interval, not since sniffing started
+        self.assertEqual([0, 2, 0, 3, 0, 1], [report.dropped for report in reports])
+
+
+class TestRotatingCapture(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def test_rotation(self):
+        packets = [RFM69Packet(2, bytes(40), target=1, rssi=-70, ack_requested=True) for _ in range(50)]
+        with RotatingCaptureWriter(self.directory, max_bytes=1000, keep=3, batch_size=4) as writer:
+            for packet in packets:
+                writer.packet(packet)
+        self.assertEqual(3, len(writer.files))
+        self.assertEqual(sorted(writer.files), sorted(os.path.join(self.directory, name)
+                                                      for name in os.listdir(self.directory)))
+        with CaptureReader(writer.files[-1]) as capture:
+            records = list(capture.records(directions={CAPTURE_PACKET}))
+        self.assertTrue(records)
+        packet = record_packet(records[0])
+        self.assertEqual((2, 1, -70, True, bytes(40)),
+                         (packet.sender, packet.target, packet.rssi, packet.ack_requested, packet.payload))
+        self.assertEqual(50, writer.records)
+
+    def test_keep_across_runs(self):
+        packet = RFM69Packet(2, bytes(40), target=1, rssi=-70)
+        for _ in range(5):
+            with RotatingCaptureWriter(self.directory, keep=3) as writer:
+                writer.packet(packet)
+        # files left by the earlier runs count against keep as well
+        self.assertEqual(3, len(os.listdir(self.directory)))
+        self.assertEqual(sorted(writer.files), sorted(os.path.join(self.directory, name)
+                                                      for name in os.listdir(self.directory)))
+        with RotatingCaptureWriter(self.directory, prefix="other") as writer:
+            self.assertEqual([], writer.files)
+
+    def test_batching(self):
+        writer = RotatingCaptureWriter(self.directory, batch_size=10, flush_interval=0.05)
+        writer.packet(RFM69Packet(2, b'x', target=1, rssi=-70))
+        self.assertIsNone(writer.path)      # nothing written yet
+        writer.flush(force=False)
+        self.assertIsNone(writer.path)
+        time.sleep(0.06)
+        writer.flush(force=False)
+        with CaptureReader(writer.path) as capture:
+            self.assertEqual(1, len(list(capture.records(directions={CAPTURE_PACKET}))))
+        writer.close()
+
+    def test_pipeline(self):
+        items = [SniffedPacket(0.0, RFM69Packet(2, b'hello', target=1, rssi=-70), 0, None), None]
+        with RotatingCaptureWriter(self.directory) as writer:
+            self.assertEqual(1, drain(write_capture(iter(items), writer)))
+        with CaptureReader(writer.files[0]) as capture:
+            self.assertEqual([b'hello'], [record_packet(record).payload for record in capture
+                                          if record.direction == CAPTURE_PACKET])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.protocol import CAP_FRAMED
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel(rssi=-48)
+        self.server_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.client_bridge = Rfm69SerialEmulator(self.channel).start()
+        self.server = Rfm69SerialDevice(1, 101, port=self.server_bridge.port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.client_bridge.port)
+
+    def test_push(self):
+        self.assertTrue(self.server.start_streaming())
+        self.assertTrue(self.server.streaming)
+        for i in range(10):
+            self.assertTrue(self.client.send_msg(1, b'packet %d' % i, ack_request=(i % 2 == 1)))
+            # commands keep working while packets are pushed in between their replies
+            self.assertTrue(self.server.is_device_connected())
+            self.assertEqual(b'\x42', self.server.read_register(b'\x38', cached=False))
+        for i in range(10):
+            packet = self.server.recv_packet(timeout=1)
+            self.assertIsNotNone(packet)
+            self.assertEqual(b'packet %d' % i, packet.payload)
+            self.assertEqual((2, 1, -48), (packet.sender, packet.target, packet.rssi))
+            self.assertEqual(i % 2 == 1, packet.ack_requested)
+        self.assertIsNone(self.server.recv_packet(timeout=0.05))
+
+        self.assertTrue(self.server.stop_streaming())
+        self.assertFalse(self.server.streaming)
+        self.assertTrue(self.server.get_frequency())
+
+    def test_pipeline(self):
+        """Reply data bytes equal to the push code must not be taken for pushed packets"""
+        self.assertTrue(self.server.start_streaming())
+        self.assertTrue(self.server.write_register(b'\x19', b'!'))
+        with self.server.pipeline():
+            self.client.send_msg(1, b'!!!!')
+            replies = [self.server.read_register(b'\x19', cached=False) for _ in range(20)]
+        self.assertEqual([b'!'] * 20, [reply.result() for reply in replies])
+        self.assertEqual(b'!!!!', self.server.recv_packet(timeout=1).payload)
+
+    def test_late_reply(self):
+        """The late reply of a timed-out command must not be taken for the reply to the next one"""
+        self.assertTrue(self.server.start_streaming())
+        power = self.server.get_power_level()
+        rssi = self.server.get_rssi()
+        self.server_bridge.command_delay = self.server.timeout * 1.5
+        self.assertIsNone(self.server.get_power_level())
+        self.server_bridge.command_delay = 0.0
+        self.assertEqual(rssi, self.server.get_rssi())
+        self.assertEqual(power, self.server.get_power_level())
+
+    def test_auto_ack(self):
+        self.assertTrue(self.server.start_streaming(auto_ack=True))
+        self.assertTrue(self.client.send_msg_with_retry(1, b'reliable', retries=0, time_out=200))
+        self.assertEqual(b'reliable', self.server.recv_packet(timeout=1).payload)
+
+    def test_not_supported(self):
+        with Rfm69SerialEmulator(capabilities=CAP_FRAMED) as bridge:
+            dev = Rfm69SerialDevice(3, 101, port=bridge.port)
+            self.assertFalse(dev.start_streaming())
+            self.assertFalse(dev.streaming)
+            dev.close()
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.client.close()
+        self.server_bridge.stop()
+        self.client_bridge.stop()
@@ -0,0 +1,91 @@
+import threading
+import unittest
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.protocol import CAP_FRAMED
+from RFM69Serial.registers import REG_FRFMSB, REG_FRFLSB
+from RFM69Serial.survey import SpectrumSurvey, numpy, waterfall
+
+
+def _interference(freq):
+    # a strong transmitter at 915 MHz, a weaker one at 920 MHz
+    if abs(freq - 915000000) < 100000:
+        return -40
+    if abs(freq - 920000000) < 100000:
+        return -75.5
+    return -110
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestSurvey(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bridge = Rfm69SerialEmulator(RadioChannel(interference=_interference)).start()
+        self.device = Rfm69SerialDevice(port=self.bridge.port)
+
+    def test_survey(self):
+        self.device.set_frequency(916000000)
+        frf = bytes(self.bridge.radio.regs[REG_FRFMSB:REG_FRFLSB + 1])
+        grid = self.device.survey(910000000, 1000000, 11, dwell=100, sweeps=3)
+        self.assertEqual((11, 3), grid.rssi.shape)
+        numpy.testing.assert_array_equal(910000000 + 1000000 * numpy.arange(11), grid.frequencies)
+        self.assertEqual(-40, grid.max[5])
+        self.assertEqual(-75.5, grid.mean[10])
+        self.assertEqual(-100, grid.min[0])         # noise floor above the interference
+        self.assertTrue(numpy.all(grid.times[:-1] <= grid.times[1:]))
+        self.assertEqual([0.0, 1.0], sorted(set(grid.occupancy(-80).tolist())))
+        self.assertEqual([910000000, 911000000], grid.clearest(2).tolist())
+        self.assertEqual(frf, bytes(self.bridge.radio.regs[REG_FRFMSB:REG_FRFLSB + 1]))
+        self.assertEqual(916000000, self.device.get_frequency())
+
+    def test_validation(self):
+        self.assertRaises(ValueError, self.device.survey, 910000000, 1000000, 0)
+        self.assertRaises(ValueError, self.device.survey, 910000000, 1000000, 10, sweeps=256)
+        self.assertRaises(ValueError, self.device.survey, 0xFFFFFF00, 1000000, 10)
+        self.assertRaises(TypeError, self.device.survey, 910e6, 1000000, 10)
+        self.bridge.capabilities = CAP_FRAMED
+        self.device.close()
+        self.device = Rfm69SerialDevice(port=self.bridge.port)
+        self.assertRaises(RuntimeError, self.device.survey, 910000000, 1000000, 10)
+
+    def test_pipeline(self):
+        with self.device.pipeline() as pipe:
+            pending = [self.device.survey(914000000 + i * 1000000, 0, 1) for i in range(3)]
+            pipe.flush()
+        self.assertEqual([-100, -40, -100], [reply.result().mean[0] for reply in pending])
+
+    def test_waterfall(self):
+        stop = threading.Event()
+        grids = []
+        for grid in waterfall(self.device, 914000000, 1000000, 3, dwell=0, sweeps=2, history=5, stop=stop):
+            grids.append((grid.sweeps, grid.rssi.copy(), grid.times.copy()))
+            if len(grids) == 6:
+                stop.set()
+        self.assertEqual([2, 4, 5, 5, 5, 5], [sweeps for sweeps, _, _ in grids])
+        for _, rssi, times in grids:
+            numpy.testing.assert_array_equal([-100, -40, -100], rssi[:, -1])
+            self.assertTrue(numpy.all(times[:-1] <= times[1:]))
+
+    def tearDown(self) -> None:
+        self.device.close()
+        self.bridge.stop()
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestSpectrumSurvey(unittest.TestCase):
+    def test_from_samples(self):
+        # 2 sweeps of 3 channels, REG_RSSIVALUE samples
+        grid = SpectrumSurvey.from_samples(868000000, 200000, 3, bytes((200, 180, 160, 202, 100, 161)), 10.0, 12.0)
+        numpy.testing.assert_array_equal([[-100, -101], [-90, -50], [-80, -80.5]], grid.rssi)
+        numpy.testing.assert_array_equal([10.0, 11.0], grid.times)
+        numpy.testing.assert_array_equal([0.0, 0.5, 1.0], grid.occupancy(-85))
+        self.assertEqual([868000000, 868200000], grid.clearest(2, threshold=-85).tolist())
+
+        both = grid.extend(grid)
+        self.assertEqual((3, 4), both.rssi.shape)
+        other = SpectrumSurvey.from_samples(868000000, 100000, 3, bytes(3), 0, 0)
+        self.assertRaises(ValueError, grid.extend, other)
+        self.assertRaises(ValueError, SpectrumSurvey, [1, 2], numpy.zeros((2, 3)), [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
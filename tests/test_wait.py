@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+import serial
+from RFM69Serial import Rfm69SerialDevice
+from RFM69Serial.emulator import Rfm69SerialEmulator, RadioChannel
+from RFM69Serial.protocol import CAP_FRAMED
+
+
+def _calls(device):
+    return sum(stats.calls for stats in device.metrics.snapshot().values())
+
+
+def _later(delay, func, *args):
+    timer = threading.Timer(delay, func, args)
+    timer.start()
+    return timer
+
+
+class TestWait(unittest.TestCase):
+    def setUp(self) -> None:
+        self.channel = RadioChannel()
+        self.bridges = [Rfm69SerialEmulator(self.channel).start() for _ in range(3)]
+        self.server = Rfm69SerialDevice(1, 101, port=self.bridges[0].port)
+        self.client = Rfm69SerialDevice(2, 101, port=self.bridges[1].port)
+        self.other = Rfm69SerialDevice(3, 101, port=self.bridges[2].port)
+
+    def test_wait_for_packet(self):
+        self.assertIsNone(self.server.wait_for_packet(0))      # arms RX
+        _later(0.05, self.client.send_msg, 1, b'hello').join()
+        packet = self.server.wait_for_packet(1)
+        self.assertEqual((2, b'hello'), (packet.sender, packet.payload))
+
+        started = time.monotonic()
+        self.server.metrics.reset()
+        self.assertIsNone(self.server.wait_for_packet(0.3))
+        self.assertAlmostEqual(0.3, time.monotonic() - started, delta=0.05)
+        self.assertLess(_calls(self.server), 60)        # backed off, not a busy loop
+
+    def test_sender_filter(self):
+        self.server.wait_for_packet(0)
+        self.other.send_msg(1, b'first')
+        time.sleep(0.02)
+        _later(0.05, self.client.send_msg, 1, b'second')
+        self.assertEqual(b'second', self.server.wait_for_packet(1, sender=2).payload)
+        self.assertEqual(b'first', self.server.wait_for_packet(0).payload)     # set aside meanwhile
+
+    def test_legacy_firmware(self):
+        self.server.close()
+        self.bridges[0].capabilities = CAP_FRAMED
+        self.server = Rfm69SerialDevice(1, 101, port=self.bridges[0].port)
+        self.server.wait_for_packet(0)
+        _later(0.05, self.client.send_msg, 1, b'hello')
+        self.assertEqual(b'hello', self.server.wait_for_packet(1, sender=2).payload)
+
+    def test_streaming(self):
+        self.assertTrue(self.server.start_streaming())
+        self.server.metrics.reset()
+        self.assertIsNone(self.server.wait_for_packet(0.2))
+        self.assertEqual(0, _calls(self.server))        # no polling at all
+        timer = _later(0.05, self.client.send_msg, 1, b'pushed')
+        started = time.monotonic()
+        self.assertEqual(b'pushed', self.server.wait_for_packet(1).payload)
+        self.assertLess(time.monotonic() - started, 0.5)
+        timer.join()
+
+    def test_bridge_lost(self):
+        self.server.start_streaming()
+        timer = _later(0.1, self.bridges[0].stop)
+        started = time.process_time()
+        with self.assertRaises(serial.SerialException):
+            self.server.wait_for_packet(1)
+        self.assertLess(time.process_time() - started, 0.2)    # no spinning on the closed packet ring
+        self.assertFalse(self.server.streaming)
+        timer.join()
+
+    def test_wait_for_ack(self):
+        self.channel.latency = 0.01     # airtime, so that the ACK arrives after the client listens again
+        self.server.start_streaming(auto_ack=True)
+        self.assertTrue(self.client.send_msg(1, b'ack me', ack_request=True))
+        self.assertTrue(self.client.wait_for_ack(1, 0.5))
+        self.assertFalse(self.client.wait_for_ack(1, 0.05))
+
+        # the same with the client in streaming mode, whose ACKs are pushed
+        self.client.start_streaming()
+        self.other.send_msg(2, b'not an ACK')
+        time.sleep(0.02)
+        self.assertTrue(self.client.send_msg(1, b'ack me', ack_request=True))
+        self.assertTrue(self.client.wait_for_ack(1, 0.5))
+        self.assertEqual(b'not an ACK', self.client.recv_packet(0).payload)
+
+    def test_send_and_wait_reply(self):
+        def echo():
+            request = self.server.wait_for_packet(2)
+            self.server.send_msg(request.sender, request.payload[::-1])
+
+        thread = threading.Thread(target=echo)
+        thread.start()
+        time.sleep(0.05)        # the server is listening
+        reply = self.client.send_and_wait_reply(1, b'ping', timeout=1)
+        thread.join()
+        self.assertEqual((1, b'gnip'), (reply.sender, reply.payload))
+        self.assertIsNone(self.client.send_and_wait_reply(7, b'nobody', timeout=0.05))
+
+    def tearDown(self) -> None:
+        for device in (self.server, self.client, self.other):
+            device.close()
+        for bridge in self.bridges:
+            bridge.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()